@@ -1 +1,66 @@
-from cicero_rest_connection import *
+"""
+python-cicero exposes everything in cicero_rest_connection.py - the
+connection classes, endpoint constants, response classes and errors - as
+attributes of the cicero package.
+
+On Python 3.7 and later these are loaded lazily, the first time each one is
+used, so a short-lived process only imports the modules it needs: importing
+the endpoint constants doesn't load the HTTP client, for example. Earlier
+versions import everything up front.
+"""
+
+import sys
+
+"""
+The module in this package defining each name exported by the package.
+"""
+_EXPORTS = {
+    'cicero_rest_connection': ('CiceroRestABC', 'CiceroRestConnection'),
+    'cicero_endpoint_constants': (
+        'SITE_ROOT', 'VERSION', 'TOKEN_ENDPOINT', 'OFFICIAL_ENDPOINT',
+        'ELECTION_EVENT_ENDPOINT', 'LEGISLATIVE_DISTRICT_ENDPOINT',
+        'NONLEGISLATIVE_DISTRICT_ENDPOINT', 'MAP_ENDPOINT',
+        'DISTRICT_TYPE_ENDPOINT', 'VERSION_ENDPOINT',
+        'ACCOUNT_CREDITS_REMAINING_ENDPOINT', 'ACCOUNT_USAGE_ENDPOINT'),
+    'cicero_response_classes': (
+        'AbstractCiceroObject', 'IdentifierObject', 'CommitteeObject',
+        'CountryObject', 'GovernmentObject', 'ChamberObject',
+        'ElectionEventObject', 'DistrictObject', 'OfficeObject',
+        'AddressObject', 'OfficialObject', 'CountObject', 'GeocodingCandidate',
+        'DistrictGeocodingCandidate', 'OfficialGeocodingCandidate',
+        'ElectionEventGeocodingCandidate',
+        'ElectionEventNonGeocodingResultsObject',
+        'DistrictNonGeocodingResultsObject',
+        'OfficialNonGeocodingResultsObject', 'GeocodingResultsObject',
+        'ExtentObject', 'MapObject', 'MapsResultsObject', 'DistrictTypeObject',
+        'DistrictTypeResultsObject', 'CreditBatchObject',
+        'AccountCreditsRemainingResultsObject', 'ActivityTypeObject',
+        'AccountUsageObject', 'VersionObject', 'ResponseObject',
+        'RootCiceroObject'),
+    'cicero_errors': ('CiceroError', 'NetworkError'),
+    'cicero_instrumentation': ('RequestEvent', 'LoggingHook'),
+    'cicero_cache': ('ResponseCache',),
+}
+
+_MODULE_OF = dict((name, module) for module, names in _EXPORTS.items()
+                  for name in names)
+
+__all__ = sorted(_MODULE_OF)
+
+
+if sys.version_info < (3, 7):
+    from .cicero_rest_connection import *
+else:
+    from importlib import import_module
+
+    def __getattr__(name):
+        module = _MODULE_OF.get(name)
+        if module is None:
+            raise AttributeError('module %r has no attribute %r' %
+                                 (__name__, name))
+        value = getattr(import_module('.' + module, __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
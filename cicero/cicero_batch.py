@@ -0,0 +1,332 @@
+"""
+This file defines batch_request(), which makes many requests to one Cicero API
+endpoint concurrently. It is also available as the batch_request() method of
+CiceroRestConnection.
+
+Requests are sent from a pool of threads, since they spend almost all their
+time waiting on the network. Building the RootCiceroObject trees for large
+responses is CPU work, though, and in a single interpreter it is limited to one
+core at a time. With parse_processes, raw responses are instead decoded and
+parsed in a pool of worker processes, which send back either the parsed
+RootCiceroObjects (they are plain, picklable objects) or, more compactly,
+rows of just the fields asked for, projected straight from the JSON (see
+cicero_projection.py) without building the objects at all.
+"""
+
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer as _timer
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_response_classes import RootCiceroObject
+from .cicero_errors import CiceroError, NetworkError
+from .cicero_instrumentation import RequestEvent
+from .cicero_projection import project
+
+
+"""
+The attributes of each result holding the records flattened into rows: a
+response's officials, districts or election events.
+"""
+_RECORD_LISTS = ('officials', 'districts', 'election_events')
+
+
+def _call(func, arg):
+    try:
+        return func(arg)
+    except (CiceroError, NetworkError) as e:
+        return e
+
+
+def _records(root):
+    results = root.response.results
+    holders = getattr(results, 'candidates', None) or [results]
+    for holder in holders:
+        for name in _RECORD_LISTS:
+            for record in getattr(holder, name, ()):
+                yield record
+
+
+def _field(record, path):
+    # attributes of response objects and keys of dictionaries (like a
+    # district's data) only: never methods, and None through anything else
+    value = record
+    for attr in path:
+        if not isinstance(value, dict):
+            value = getattr(value, '__dict__', None)
+            if value is None:
+                return None
+        value = value.get(attr)
+        if value is None:
+            return None
+    return value
+
+
+def flatten(root, fields):
+    """
+    # flatten(root, fields)
+
+    Returns a list with one tuple per official, district or election event
+    in a RootCiceroObject, holding the values of fields, given as
+    dot.separated attribute paths like "office.district.district_type", or
+    into a dictionary like a district's data ("data.geoid"). Missing values,
+    and paths through anything else, like a list, are None.
+    """
+    paths = [tuple(f.split('.')) for f in fields]
+    return [tuple(_field(record, path) for path in paths)
+            for record in _records(root)]
+
+
+def _parse_blob(args):
+    blob, fields = args
+    if fields is not None:
+        return project(json.loads(blob), fields)
+    return RootCiceroObject(json.loads(blob))
+
+
+def _raw_fetcher(connection, endpoint):
+    if not connection._hooks:
+        return connection._fetch
+
+    def fetch(url):
+        event = RequestEvent(endpoint, url)
+        event.request_bytes = len(url)
+        start = _timer()
+        try:
+            blob = connection._fetch(url, event)
+        except (CiceroError, NetworkError) as e:
+            event.network_time = _timer() - start
+            event.error = e
+            connection._emit(event)
+            raise
+        event.network_time = _timer() - start
+        event.response_bytes = len(blob)
+        connection._emit(event)
+        return blob
+
+    return fetch
+
+
+class _Parsed(object):
+    # a response parsed on a request thread, to keep in the connection's
+    # caches, so not to be parsed again
+
+    __slots__ = ('root',)
+
+    def __init__(self, root):
+        self.root = root
+
+
+def _journaled_fetcher(connection, endpoint, journal, limiter=None,
+                       ceiling=None):
+    # cicero_rest_connection imports this module lazily, so it is loaded
+    # by the time this is called
+    from .cicero_rest_connection import _cache_key
+    from .cicero_journal import url_hash
+    fetch = _raw_fetcher(connection, endpoint)
+    if limiter is not None:
+        # replayed responses don't count
+        fetch = limiter.wrap(fetch, ceiling)
+    cached = connection.cache is not None or (
+        connection.negative_cache is not None)
+
+    def journaled(args):
+        key, query = args
+        ident = _cache_key(endpoint, query, None)
+        url = connection._compose_request_url(endpoint, query)
+        if not cached:
+            return journal.fetch(fetch, ident if key is None else key, url,
+                                 url_hash(ident))
+
+        def request():
+            blob = journal.fetch(fetch, ident if key is None else key, url,
+                                 url_hash(ident))
+            return connection.json_to_cicero_object(json.loads(blob))
+
+        return _Parsed(connection._cached_response(endpoint, ident, request))
+
+    return journaled
+
+
+def batch_request(connection, endpoint, queries, max_workers=8,
+                  parse_processes=None, process_pool=None, fields=None,
+                  journal=None, keys=None, limiter=None):
+    """
+    # batch_request(connection, endpoint, queries, max_workers=8,
+    #               parse_processes=None, process_pool=None, fields=None,
+    #               journal=None, keys=None, limiter=None)
+
+    Requests endpoint once for each dictionary of query arguments in queries
+    (the same keyword arguments the get_*() methods take), with up to
+    max_workers requests in flight at once. Returns a list of results in the
+    same order as queries. A request that fails is not raised: its
+    CiceroError or NetworkError takes its place in the list.
+
+    +   fields (list of strings) - if given, each result is instead a list of
+            rows, as returned by flatten(), with one tuple of these fields
+            per official, district or election event in the response.
+    +   parse_processes (integer) - decode and parse responses in a pool of
+            this many worker processes, rather than in the calling process.
+    +   process_pool (multiprocessing.Pool) - an existing pool to parse
+            responses in, to avoid starting new processes for every batch.
+    +   journal (Journal) - record every request in this journal (see
+            cicero_journal.py), and replay the responses of any already
+            finished there instead of requesting them again.
+    +   keys (list) - with a journal, a key for each query, like the id of
+            the input row it came from: a string, a number, or a tuple of
+            them. By default the query itself is the key.
+    +   limiter (AIMDLimiter or EndpointLimiters) - adapt the number of
+            requests in flight, up to max_workers, to how the API is coping
+            (see cicero_concurrency.py), rather than always sending
+            max_workers at once. The limit is kept at or below
+            max_workers.
+
+    Instrumentation hooks see every request, but when responses are parsed
+    in worker processes or journaled, the events only time the network
+    phase. Without a journal, the connection's cache and negative cache are
+    only used when responses are parsed in this process. With one, they are
+    checked before the journal, and responses are parsed as they arrive to
+    be kept in them.
+    """
+    if limiter is not None and hasattr(limiter, 'for_endpoint'):
+        limiter = limiter.for_endpoint(endpoint)
+    threads = ThreadPool(max(1, min(max_workers, len(queries) or 1)))
+    try:
+        if journal is None and not (parse_processes or process_pool):
+            request = partial(connection._response_from_endpoint, endpoint)
+            if limiter is not None:
+                request = limiter.wrap(request, max_workers)
+            results = threads.map(lambda q: _call(request, q), queries)
+            if fields is not None:
+                results = [r if isinstance(r, Exception) else flatten(r, fields)
+                           for r in results]
+            return results
+
+        if journal is not None:
+            fetch = _journaled_fetcher(connection, endpoint, journal, limiter,
+                                       max_workers)
+            blobs = threads.map(lambda args: _call(fetch, args),
+                                list(zip(keys or [None] * len(queries), queries)))
+        else:
+            urls = [connection._compose_request_url(endpoint, q)
+                    for q in queries]
+            fetch = _raw_fetcher(connection, endpoint)
+            if limiter is not None:
+                fetch = limiter.wrap(fetch, max_workers)
+            blobs = threads.map(lambda url: _call(fetch, url), urls)
+    finally:
+        threads.close()
+        threads.join()
+
+    pending = [(i, (blob, fields)) for i, blob in enumerate(blobs)
+               if not isinstance(blob, (Exception, _Parsed))]
+    if parse_processes or process_pool:
+        pool = process_pool or Pool(parse_processes)
+        try:
+            parsed = pool.map(_parse_blob, [args for _, args in pending])
+        finally:
+            if process_pool is None:
+                pool.close()
+                pool.join()
+    else:
+        parsed = [_parse_with(connection, args) for _, args in pending]
+
+    results = list(blobs)
+    for (i, _), result in zip(pending, parsed):
+        results[i] = result
+    for i, result in enumerate(results):
+        if isinstance(result, _Parsed):
+            results[i] = (result.root if fields is None
+                          else flatten(result.root, fields))
+    return results
+
+
+def _parse_with(connection, args):
+    blob, fields = args
+    if fields is not None:
+        return project(json.loads(blob), fields)
+    return connection.json_to_cicero_object(json.loads(blob))
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def hydrate_by_ids(connection, endpoint, list_name, ids, ids_per_request=20,
+                   max_workers=8, **kwargs):
+    """
+    # hydrate_by_ids(connection, endpoint, list_name, ids, ids_per_request=20,
+    #                max_workers=8, **kwargs)
+
+    Returns a dictionary of id to object (from the response attribute
+    list_name, like "officials") for each of ids found at endpoint. Used by
+    get_officials_by_ids() and get_districts_by_ids() in
+    cicero_rest_connection.py.
+
+    Ids are deduplicated, and any already in the connection's cache (from a
+    call with the same kwargs) are not requested again. The rest are packed up
+    to ids_per_request at a time into OR queries on id, sent concurrently with
+    batch_request(). Ids missing from a packed response, or whose packed
+    request was refused with a CiceroError, are then requested one at a time
+    (as /endpoint/id). Ids that still can't be found are left out of the
+    dictionary. Any other kwargs are passed along as query arguments. A
+    NetworkError, or a CiceroError for a single id, is raised.
+    """
+    from .cicero_rest_connection import _cache_key
+
+    def key(object_id):
+        # a tuple, so it can't be taken for the key of a whole response
+        return (endpoint, _cache_key(endpoint, dict(kwargs, id=object_id),
+                                     None))
+
+    wanted = []
+    seen = set()
+    for object_id in ids:
+        if object_id not in seen:
+            seen.add(object_id)
+            wanted.append(object_id)
+
+    cache = connection.cache
+    found = {}
+    if cache is not None:
+        for object_id in wanted:
+            cached = cache.get(key(object_id))
+            if cached is not None:
+                found[object_id] = cached
+
+    def query(chunk):
+        q = dict(kwargs)
+        if len(chunk) == 1:
+            q['id'] = chunk[0]
+        else:
+            q['id'] = tuple(chunk)
+            q.setdefault('max', len(chunk))
+        return q
+
+    missing = [i for i in wanted if i not in found]
+    queries = [query(chunk) for chunk in _chunks(missing, ids_per_request)]
+    while queries:
+        results = batch_request(connection, endpoint, queries,
+                                max_workers=max_workers)
+        retry = []
+        for q, result in zip(queries, results):
+            packed = isinstance(q['id'], tuple)
+            if isinstance(result, NetworkError) or (
+                    isinstance(result, CiceroError) and not packed):
+                raise result
+            if not isinstance(result, CiceroError):
+                for obj in getattr(result.response.results, list_name, ()):
+                    if obj.id in seen and obj.id not in found:
+                        found[obj.id] = obj
+                        if cache is not None:
+                            cache.set(key(obj.id), obj)
+            if packed:
+                retry.extend(i for i in q['id'] if i not in found)
+        queries = [query([object_id]) for object_id in retry]
+
+    return found
@@ -0,0 +1,67 @@
+"""
+This file defines ResponseCache, a thread-safe, size-bounded cache with an
+optional time-to-live, used by CiceroRestConnection to avoid repeating API
+requests it already has the answer to. See the cache argument of
+CiceroRestConnection.__init__ in cicero_rest_connection.py.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache(object):
+    """
+    # ResponseCache(max_entries=1024, ttl=None)
+
+    A least-recently-used cache holding at most max_entries values. If ttl
+    (in seconds) is given, values expire that long after they were set.
+
+    ## Available Methods:
+
+    +   .get(key, default=None) - the cached value for key, or default if there
+            is none or it has expired
+    +   .set(key, value) - cache value for key, evicting the least recently
+            used value if the cache is full
+    +   .delete(key), .clear()
+    +   len(cache), key in cache
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires is not None and expires <= time.time():
+                return default
+            self._entries[key] = entry  # most recently used goes last
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
@@ -0,0 +1,396 @@
+"""
+This file defines the cicero-batch command, which looks up the officials or
+districts for every address or coordinate pair in a CSV or JSONL file, and
+writes one row per official or district found (the input row's columns plus
+the requested fields) to JSONL, or to Parquet if pyarrow is installed.
+
+    cicero-batch addresses.csv officials.jsonl --address-field address \\
+        --param district_type=STATE_LOWER --workers 16 --retries 3 \\
+        --checkpoint officials.checkpoint
+
+Rows are read, looked up and written a chunk at a time, so memory use doesn't
+grow with the size of the input. Each input row is looked up by its lat and
+lon fields if it has them, and otherwise by its address field, using the
+best (first) geocoding candidate. A row with no officials or districts is
+written once, with empty fields, and so is a row the Cicero API can't
+answer, or with neither an address nor a lat and lon, with the error in the
+"cicero_error" column. A network error (after any retries), or an
+authentication error (401 or 403, such as an expired token), stops the run,
+so the rows after it aren't written off as errors.
+
+With --checkpoint, the number of input rows finished is saved after every
+chunk, and a run with the same checkpoint resumes after them instead of
+spending credits on them again. JSONL output is truncated back to the last
+checkpoint on resume, and Parquet output is written as a directory with one
+file per chunk. With --journal, every request is also journaled as it
+finishes (see cicero_journal.py), so the rows of a chunk cut short are
+replayed from the journal rather than requested again.
+"""
+
+from __future__ import print_function
+
+import argparse
+import csv
+import os
+import sys
+from collections import OrderedDict
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_compat import PY2
+from .cicero_endpoint_constants import OFFICIAL_ENDPOINT, LEGISLATIVE_DISTRICT_ENDPOINT
+from .cicero_errors import CiceroError, NetworkError
+from .cicero_cache import ResponseCache
+from .cicero_batch import _field
+from .cicero_journal import Journal
+from .cicero_concurrency import AIMDLimiter
+
+
+"""
+The endpoints cicero-batch can query, with the list of records in their
+responses and the fields written for each record by default.
+"""
+ENDPOINTS = {
+    'official': (OFFICIAL_ENDPOINT, 'officials',
+                 ('id', 'first_name', 'last_name', 'party', 'office.title',
+                  'office.district.district_type', 'office.district.district_id',
+                  'office.district.state')),
+    'legislative_district': (LEGISLATIVE_DISTRICT_ENDPOINT, 'districts',
+                             ('id', 'district_type', 'district_id', 'label',
+                              'state', 'country')),
+}
+
+
+def read_rows(path, input_format=None):
+    """
+    # read_rows(path, input_format=None)
+
+    Yields each row of a CSV (with a header row) or JSONL file as a
+    dictionary. The format is guessed from the file extension if not given,
+    and path "-" reads standard input.
+    """
+    input_format = input_format or ('csv' if path.endswith('.csv') else 'jsonl')
+    if path == '-':
+        f = sys.stdin
+    elif PY2 or input_format != 'csv':
+        f = open(path, 'rb' if input_format == 'csv' else 'r')
+    else:
+        f = open(path, newline='', encoding='utf-8')
+    try:
+        if input_format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line, object_pairs_hook=OrderedDict)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _import_pyarrow():
+    # pyarrow is slow to import, so only when Parquet is written
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _query(row, address_field, lat_field, lon_field, params):
+    # the query for row, or None if it has nothing to look up
+    query = dict(params)
+    if row.get(lat_field) not in (None, '') and row.get(lon_field) not in (None, ''):
+        query['lat'] = row[lat_field]
+        query['lon'] = row[lon_field]
+    elif row.get(address_field) not in (None, ''):
+        query['search_loc'] = row[address_field]
+    else:
+        return None
+    return query
+
+
+def _enriched(row, root, list_name, fields):
+    results = root.response.results
+    candidates = getattr(results, 'candidates', None)
+    if candidates is not None:
+        records = getattr(candidates[0], list_name, []) if candidates else []
+    else:
+        records = getattr(results, list_name, [])
+
+    rows = []
+    for record in records:
+        out = OrderedDict(row)
+        for name, path in fields:
+            out[name] = _field(record, path)
+        out['cicero_error'] = None
+        rows.append(out)
+    return rows
+
+
+def _blank(row, fields, error=None):
+    out = OrderedDict(row)
+    for name, _ in fields:
+        out[name] = None
+    out['cicero_error'] = error
+    return out
+
+
+class JSONLWriter(object):
+    """
+    Writes rows to a JSONL file, or standard output for "-". On resume, the
+    file is truncated back to its size at the last checkpoint.
+    """
+
+    def __init__(self, path, resume_position=None):
+        self.path = path
+        if path == '-':
+            self.f = sys.stdout
+        elif resume_position is None:
+            self.f = open(path, 'w')
+        else:
+            self.f = open(path, 'r+')
+            self.f.seek(resume_position)
+            self.f.truncate()
+
+    def write(self, rows, first_row):
+        for row in rows:
+            self.f.write(json.dumps(row) + '\n')
+        self.f.flush()
+
+    def position(self):
+        return None if self.f is sys.stdout else self.f.tell()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class ParquetWriter(object):
+    """
+    Writes each chunk of rows to its own Parquet file in the directory path,
+    named for the first input row of the chunk, so a resumed run simply
+    overwrites any chunk it didn't finish.
+    """
+
+    def __init__(self, path, resume_position=None):
+        self.pyarrow = _import_pyarrow()
+        if self.pyarrow is None:
+            raise ImportError('Parquet output requires pyarrow')
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def write(self, rows, first_row):
+        if not rows:
+            return
+        columns = OrderedDict()
+        for row in rows:
+            for name in row:
+                columns.setdefault(name, None)
+        table = self.pyarrow.Table.from_pydict(OrderedDict(
+            (name, [row.get(name) for row in rows]) for name in columns))
+        self.pyarrow.parquet.write_table(
+            table, os.path.join(self.path, 'part-%09d.parquet' % first_row))
+
+    def position(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def _save_checkpoint(path, rows_done, position):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump({'rows_done': rows_done, 'position': position}, f)
+    os.rename(temp, path)
+
+
+def enrich(connection, input_path, output_path, endpoint='official',
+           fields=None, params=None, address_field='search_loc',
+           lat_field='lat', lon_field='lon', input_format=None,
+           output_format=None, chunk_size=256, max_workers=8,
+           checkpoint=None, journal=None, limiter=None):
+    """
+    # enrich(connection, input_path, output_path, endpoint="official",
+    #        fields=None, params=None, address_field="search_loc",
+    #        lat_field="lat", lon_field="lon", input_format=None,
+    #        output_format=None, chunk_size=256, max_workers=8,
+    #        checkpoint=None, journal=None, limiter=None)
+
+    Does the work of cicero-batch with an existing connection, and returns the
+    number of input rows finished (including any from a previous run being
+    resumed). endpoint is a key of ENDPOINTS, fields a list of dot.separated
+    field paths (default: that endpoint's fields), and params a dictionary of
+    extra query arguments for every request. Output is Parquet if
+    output_format is "parquet", or if it is None and output_path ends in
+    .parquet, and JSONL otherwise. journal is a Journal (defined in
+    cicero_journal.py), keyed by input row number, and limiter an
+    AIMDLimiter (defined in cicero_concurrency.py) for batch_request().
+    """
+    endpoint_url, list_name, default_fields = ENDPOINTS[endpoint]
+    fields = [(name, tuple(name.split('.')))
+              for name in (fields or default_fields)]
+    params = params or {}
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') else 'jsonl'
+
+    state = _load_checkpoint(checkpoint)
+    rows_done = state['rows_done'] if state else 0
+    writer_class = ParquetWriter if output_format == 'parquet' else JSONLWriter
+    writer = writer_class(output_path, state['position'] if state else None)
+
+    def process(chunk, first_row):
+        queries = [_query(row, address_field, lat_field, lon_field, params)
+                   for row in chunk]
+        asked = [i for i, query in enumerate(queries) if query is not None]
+        results = [None] * len(chunk)
+        answers = connection.batch_request(
+            endpoint_url, [queries[i] for i in asked], max_workers=max_workers,
+            journal=journal, keys=[first_row + i for i in asked],
+            limiter=limiter)
+        for i, result in zip(asked, answers):
+            results[i] = result
+        rows = []
+        for row, result in zip(chunk, results):
+            if isinstance(result, NetworkError) or (
+                    isinstance(result, CiceroError) and
+                    result.status_code in (401, 403)):
+                raise result
+            if result is None:
+                rows.append(_blank(row, fields, 'no address or lat/lon'))
+            elif isinstance(result, CiceroError):
+                rows.append(_blank(row, fields, ', '.join(
+                    str(e) for e in result.error_list)))
+            else:
+                rows.extend(_enriched(row, result, list_name, fields) or
+                            [_blank(row, fields)])
+        writer.write(rows, first_row)
+        if checkpoint:
+            _save_checkpoint(checkpoint, first_row + len(chunk),
+                             writer.position())
+
+    try:
+        chunk = []
+        first_row = rows_done
+        for i, row in enumerate(read_rows(input_path, input_format)):
+            if i < rows_done:
+                continue
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                process(chunk, first_row)
+                first_row += len(chunk)
+                chunk = []
+        if chunk:
+            process(chunk, first_row)
+            first_row += len(chunk)
+    finally:
+        writer.close()
+    return first_row
+
+
+def _param(text):
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError('expected key=value, not %r' % text)
+    return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='cicero-batch',
+        description='Look up the officials or districts for every address '
+                    'or lat/lon in a CSV or JSONL file.')
+    parser.add_argument('input', help='CSV or JSONL file, or - for stdin')
+    parser.add_argument('output', help='JSONL file (or - for stdout), or a '
+                        'directory for Parquet output')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS),
+                        default='official')
+    parser.add_argument('--fields', help='comma separated fields to write '
+                        'for each record, like first_name,office.title')
+    parser.add_argument('--param', type=_param, action='append', default=[],
+                        help='extra query argument key=value for every '
+                        'request; repeat for more')
+    parser.add_argument('--address-field', default='search_loc')
+    parser.add_argument('--lat-field', default='lat')
+    parser.add_argument('--lon-field', default='lon')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'))
+    parser.add_argument('--output-format', choices=('jsonl', 'parquet'))
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent requests')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adapt the concurrent requests, up to --workers, '
+                        'to how the API copes')
+    parser.add_argument('--chunk-size', type=int, default=256,
+                        help='input rows per chunk (and per checkpoint)')
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='cache this many responses, to avoid paying '
+                        'for repeated addresses')
+    parser.add_argument('--negative-ttl', type=float, default=0,
+                        help='remember addresses with no results, and '
+                        'queries the API rejects, for this many seconds')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--retry-backoff', type=float, default=0.5)
+    parser.add_argument('--checkpoint', help='file to save progress to, and '
+                        'resume from if it exists')
+    parser.add_argument('--journal', help='file to journal every request '
+                        'in, and replay finished requests from')
+    parser.add_argument('--username', default=os.getenv('CICERO_USERNAME'))
+    parser.add_argument('--password', default=os.getenv('CICERO_PASSWORD'))
+    args = parser.parse_args(argv)
+
+    if not (args.username and args.password):
+        parser.error('--username and --password (or the CICERO_USERNAME and '
+                     'CICERO_PASSWORD environment variables) are required')
+    parquet = args.output_format == 'parquet' or (
+        args.output_format is None and args.output.endswith('.parquet'))
+    if parquet and _import_pyarrow() is None:
+        parser.error('Parquet output requires pyarrow')
+
+    from .cicero_rest_connection import CiceroRestConnection
+    journal = Journal(args.journal) if args.journal else None
+    try:
+        connection = CiceroRestConnection(
+            args.username, args.password,
+            cache=ResponseCache(args.cache_size) if args.cache_size else None)
+        if args.negative_ttl:
+            connection.negative_cache = ResponseCache(65536, args.negative_ttl)
+        connection.max_retries = args.retries
+        connection.retry_backoff = args.retry_backoff
+        rows = enrich(connection, args.input, args.output,
+                      endpoint=args.endpoint,
+                      fields=args.fields.split(',') if args.fields else None,
+                      params=dict(args.param),
+                      address_field=args.address_field,
+                      lat_field=args.lat_field, lon_field=args.lon_field,
+                      input_format=args.input_format,
+                      output_format=args.output_format,
+                      chunk_size=args.chunk_size, max_workers=args.workers,
+                      checkpoint=args.checkpoint, journal=journal,
+                      limiter=AIMDLimiter(initial=min(4, args.workers),
+                                          maximum=args.workers)
+                      if args.adaptive else None)
+    except (CiceroError, NetworkError) as e:
+        print('cicero-batch: %s' % e, file=sys.stderr)
+        return 1
+    finally:
+        if journal is not None:
+            journal.close()
+    print('cicero-batch: %d rows done' % rows, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
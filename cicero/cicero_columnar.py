@@ -0,0 +1,273 @@
+"""
+This file defines DistrictColumns, which collects districts column by column
+rather than as DistrictObjects, for working with many districts at once, like
+every CENSUS district of a state.
+
+The keys of a district's data dictionary depend on its type and subtype (a
+CENSUS TRACT has aland, awater, geoid and pop, a WATERSHED HUC6 area_sq_km,
+huc and states), so districts are grouped by (district_type, subtype), and
+each group has its own columns: id, district_id, label and state, plus one
+for each key found in the group's data (named "data." + key for a key
+clashing with those four). Integer and float columns are stored in typed
+arrays (from the array module), and can be taken as NumPy arrays or an Arrow
+table when NumPy or pyarrow is installed:
+
+    columns = DistrictColumns()
+    cicero.add_hook(columns)
+    cicero.get_nonlegislative_district(lat=39.95, lon=-75.16, type='CENSUS')
+    columns.to_numpy('CENSUS', 'TRACT')['pop'].sum()
+
+A district already in its group (by id) is not added again.
+"""
+
+import threading
+from array import array
+
+from .cicero_compat import integer_types, text_type
+
+
+"""
+The DistrictObject attributes every group has a column for, before those of
+the data dictionary.
+"""
+DISTRICT_FIELDS = ('id', 'district_id', 'label', 'state')
+
+# 64 bit integers: 'q' where the array module has it, 'l' on Python 2
+_INT_CODE = 'q' if hasattr(array, 'typecodes') and 'q' in array.typecodes else 'l'
+
+
+def _kind(value):
+    if isinstance(value, bool):
+        return 'object'
+    if isinstance(value, integer_types):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, (str, text_type)):
+        return 'str'
+    return 'object'
+
+
+class _Column(object):
+    # One column of a group. Its kind is set by the first value that isn't
+    # None, and widened if a later value doesn't fit: from int to float, and
+    # from anything else to object. Integers and floats are kept in typed
+    # arrays, with a bytearray marking the missing ones, made when the first
+    # is missing; strings and objects in a list, with None where missing.
+
+    def __init__(self, rows=0):
+        self.kind = None
+        self.values = [None] * rows
+        self.missing = None
+
+    def _set_missing(self, row):
+        if self.missing is None:
+            self.missing = bytearray(row)
+        self.missing.extend(b'\x00' * (row - len(self.missing)))
+        self.missing.append(1)
+
+    def _widen(self, kind):
+        values = self.to_list()
+        self.missing = None
+        if kind in ('int', 'float'):
+            code = _INT_CODE if kind == 'int' else 'd'
+            typed = array(code)
+            for row, value in enumerate(values):
+                if value is None:
+                    self._set_missing(row)
+                    value = 0
+                typed.append(value)
+            values = typed
+        self.kind = kind
+        self.values = values
+
+    def append(self, value):
+        row = len(self.values)
+        if value is None:
+            if self.kind in ('int', 'float'):
+                self._set_missing(row)
+                self.values.append(0)
+            else:
+                self.values.append(None)
+            return
+
+        kind = _kind(value)
+        if kind != self.kind:
+            if self.kind is None:
+                self._widen(kind)
+            elif self.kind == 'float' and kind == 'int':
+                value = float(value)
+            elif self.kind == 'int' and kind == 'float':
+                self._widen('float')
+            elif self.kind != 'object':
+                self._widen('object')
+        self.values.append(value)
+
+    def to_list(self):
+        values = list(self.values)
+        if self.missing is not None:
+            for row, m in enumerate(self.missing):
+                if m:
+                    values[row] = None
+        return values
+
+    def mask(self):
+        # the missing rows as a NumPy boolean array, or None if there are none
+        if self.missing is None or not any(self.missing):
+            return None
+        import numpy
+        mask = numpy.zeros(len(self.values), dtype=bool)
+        mask[:len(self.missing)] = numpy.frombuffer(bytes(self.missing),
+                                                     dtype=numpy.uint8)
+        return mask
+
+    def to_numpy(self):
+        import numpy
+        if self.kind not in ('int', 'float'):
+            return numpy.array(self.values, dtype=object)
+        values = numpy.array(self.values, dtype=self.values.typecode)
+        mask = self.mask()
+        return values if mask is None else numpy.ma.masked_array(values, mask)
+
+    def to_arrow(self):
+        import pyarrow
+        if self.kind in ('int', 'float'):
+            try:
+                import numpy
+            except ImportError:
+                pass
+            else:
+                return pyarrow.array(
+                    numpy.array(self.values, dtype=self.values.typecode),
+                    mask=self.mask())
+        return pyarrow.array(self.to_list())
+
+
+class _DistrictGroup(object):
+
+    def __init__(self):
+        self.columns = dict((name, _Column()) for name in DISTRICT_FIELDS)
+        self.names = list(DISTRICT_FIELDS)
+        self.data_keys = []  # (data key, column name) pairs
+        self.known = set()
+        self.ids = set()
+        self.rows = 0
+
+    def add(self, district, data):
+        if district['id'] in self.ids:
+            return
+        self.ids.add(district['id'])
+        columns = self.columns
+        for name in DISTRICT_FIELDS:
+            columns[name].append(district.get(name))
+
+        data = data or {}
+        for key, name in self.data_keys:
+            columns[name].append(data.get(key))
+        for key in data:
+            if key not in self.known:
+                # a key first seen now: missing from every row before
+                name = key if key not in DISTRICT_FIELDS else 'data.' + key
+                column = columns[name] = _Column(self.rows)
+                column.append(data[key])
+                self.names.append(name)
+                self.data_keys.append((key, name))
+                self.known.add(key)
+        self.rows += 1
+
+
+class DistrictColumns(object):
+    """
+    # DistrictColumns()
+
+    Districts grouped by district_type and subtype, stored as columns. Each
+    group is named by its (district_type, subtype) pair, with "" for the
+    subtype of district types which have none.
+
+    ## Available Methods:
+
+    +   .add(root) - add the districts of a parsed response, or of its
+            officials' offices if it has no districts
+    +   .add_district(district) - add a DistrictObject or the dictionary of a
+            raw district
+    +   .groups() - list of (district_type, subtype) pairs
+    +   .schema(district_type, subtype="") - list of (column name, kind)
+            pairs, where kind is "int", "float", "str", "object", or None for
+            a column with no values yet
+    +   .column(district_type, subtype, name) - list of the column's values,
+            with None where missing
+    +   .to_numpy(district_type, subtype="") - dictionary of column name to
+            NumPy array. Integer and float columns with missing values are
+            masked arrays; string columns are object arrays.
+    +   .to_arrow(district_type, subtype="") - the group as a pyarrow.Table
+    +   len(columns) - number of districts in all groups
+
+    DistrictColumns is also an instrumentation hook (see
+    cicero_instrumentation.py), adding the districts of every response.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()  # hooks run on batch_request's threads
+
+    def __call__(self, event):
+        if event.result is not None:
+            self.add(event.result)
+
+    def add(self, root):
+        results = root.response.results
+        for holder in getattr(results, 'candidates', None) or [results]:
+            districts = getattr(holder, 'districts', None)
+            if districts is None:
+                districts = [o.office.district
+                             for o in getattr(holder, 'officials', ())]
+            for district in districts:
+                self.add_district(district)
+
+    def add_district(self, district):
+        if not isinstance(district, dict):
+            district = district.__dict__
+        key = (district.get('district_type'), district.get('subtype') or '')
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _DistrictGroup()
+            group.add(district, district.get('data'))
+
+    def groups(self):
+        return sorted(self._groups)
+
+    def _group(self, district_type, subtype):
+        try:
+            return self._groups[(district_type, subtype or '')]
+        except KeyError:
+            raise KeyError('no %s %s districts' % (district_type, subtype or ''))
+
+    def schema(self, district_type, subtype=''):
+        group = self._group(district_type, subtype)
+        return [(name, group.columns[name].kind) for name in group.names]
+
+    def column(self, district_type, subtype, name):
+        return self._group(district_type, subtype).columns[name].to_list()
+
+    def to_numpy(self, district_type, subtype=''):
+        try:
+            import numpy  # only when used, as it is slow to import
+        except ImportError:
+            raise ImportError('to_numpy() requires numpy')
+        group = self._group(district_type, subtype)
+        return dict((name, group.columns[name].to_numpy())
+                    for name in group.names)
+
+    def to_arrow(self, district_type, subtype=''):
+        try:
+            import pyarrow  # only when used, as it is slow to import
+        except ImportError:
+            raise ImportError('to_arrow() requires pyarrow')
+        group = self._group(district_type, subtype)
+        return pyarrow.Table.from_arrays(
+            [group.columns[name].to_arrow() for name in group.names],
+            names=list(group.names))
+
+    def __len__(self):
+        return sum(group.rows for group in self._groups.values())
@@ -0,0 +1,56 @@
+"""
+This file collects the differences between Python 2 and Python 3 that
+python-cicero depends on, so that the rest of the package is written once and
+runs on both.
+"""
+
+import sys
+
+PY2 = sys.version_info[0] == 2
+
+if PY2:
+    from urllib import urlencode, quote_plus
+    from urllib2 import Request, urlopen, HTTPError, URLError
+    from urlparse import urlparse, parse_qs
+    integer_types = (int, long)
+    text_type = unicode
+else:
+    from urllib.parse import urlencode, quote_plus, urlparse, parse_qs
+    integer_types = (int,)
+    text_type = str
+
+    if sys.version_info < (3, 7):
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError, URLError
+    else:
+        # urllib.request and urllib.error (with http.client, email, ssl and
+        # tempfile) take longer to import than the rest of python-cicero put
+        # together, so they are only loaded by the first request.
+        _LAZY = {'Request': 'request', 'urlopen': 'request',
+                 'HTTPError': 'error', 'URLError': 'error'}
+
+        def __getattr__(name):
+            if name not in _LAZY:
+                raise AttributeError('module %r has no attribute %r' %
+                                     (__name__, name))
+            from importlib import import_module
+            value = getattr(import_module('urllib.' + _LAZY[name]), name)
+            globals()[name] = value
+            return value
+
+
+def native_str(blob):
+    """
+    Returns blob, the bytes of a response body or file, as a native str:
+    unchanged on Python 2, and decoded from UTF-8 on Python 3.
+    """
+    if PY2 or isinstance(blob, str):
+        return blob
+    return blob.decode('utf-8')
+
+
+def to_bytes(text):
+    """Returns text encoded as UTF-8 bytes, for request and response bodies."""
+    if isinstance(text, text_type):
+        return text.encode('utf-8')
+    return text
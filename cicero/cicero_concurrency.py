@@ -0,0 +1,170 @@
+"""
+This file defines AIMDLimiter, which adapts the number of requests
+batch_request() has in flight to what the Cicero API sustains, instead of a
+fixed max_workers, and EndpointLimiters, which keeps one for each endpoint.
+
+The limit works like TCP congestion control: additive increase,
+multiplicative decrease. Each request that succeeds with the limit reached
+(as many requests in flight as it allows) raises the limit by
+increase / limit, so by about increase per round of requests, and a request
+that shows congestion - a NetworkError (like a timeout), a CiceroError with
+status 429 or 5xx, or, with latency_target, a request slower than that -
+multiplies it by decrease. A request that succeeds below the limit says
+nothing about a higher one, so the limit doesn't grow past the concurrency
+actually reached. Requests already in flight when the limit is cut can't cut
+it again, so a burst of errors counts as one. The limit settles
+just below the point where errors start.
+
+    limiters = EndpointLimiters(maximum=32)
+    results = cicero.batch_request(OFFICIAL_ENDPOINT, queries, max_workers=32,
+                                   limiter=limiters)
+    limiters.limits()
+
+Requests the connection retries (see .max_retries) only count as congested
+if they fail in the end.
+"""
+
+import threading
+from timeit import default_timer as _timer
+
+from .cicero_errors import CiceroError, NetworkError
+
+
+def _congestion(error):
+    return (isinstance(error, NetworkError) or
+            error.status_code == 429 or error.status_code >= 500)
+
+
+class AIMDLimiter(object):
+    """
+    # AIMDLimiter(initial=4, minimum=1, maximum=64, increase=1.0,
+    #             decrease=0.5, latency_target=None)
+
+    A concurrency limit between minimum and maximum, starting at initial,
+    adapted by additive increase and multiplicative decrease. Safe to share
+    between threads.
+
+    ## Available Attributes and Methods:
+
+    +   .limit (integer) - requests allowed in flight at once
+    +   .in_flight (integer) - requests in flight now
+    +   .latency (float) - moving average of request latency in seconds, or
+            None before any request finishes
+    +   .error_rate (float) - moving average of the fraction of requests
+            showing congestion
+    +   .acquire() - wait until a request may be sent, and return a token for
+            release()
+    +   .release(token, congested=False, ceiling=None) - record a finished
+            request, keeping the limit at or below ceiling, if given: the
+            most requests the caller can have in flight, like the
+            max_workers of batch_request()
+    +   .wrap(func, ceiling=None) - func, called under the limit, with a
+            CiceroError or NetworkError it raises recorded as congestion or
+            not
+    """
+
+    # weight of each request in the latency and error rate moving averages
+    smoothing = 0.1
+
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0,
+                 decrease=0.5, latency_target=None):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('AIMDLimiter needs 1 <= minimum <= initial '
+                             '<= maximum')
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self._limit = float(initial)
+        self._last_cut = None
+        self._last_full = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self._limit):
+                self._condition.wait()
+            self.in_flight += 1
+            now = _timer()
+            if self.in_flight >= int(self._limit):
+                self._last_full = now
+        return now
+
+    def release(self, token, congested=False, ceiling=None):
+        now = _timer()
+        latency = now - token
+        maximum = self.maximum if ceiling is None else min(self.maximum,
+                                                           ceiling)
+        with self._condition:
+            # did the limit hold requests back while this one was in flight?
+            limited = self._last_full is not None and self._last_full >= token
+            self.in_flight -= 1
+            a = self.smoothing
+            self.latency = (latency if self.latency is None
+                            else (1 - a) * self.latency + a * latency)
+            if self.latency_target is not None and latency > self.latency_target:
+                congested = True
+            self.error_rate = (1 - a) * self.error_rate + a * congested
+
+            if not congested:
+                if limited:
+                    self._limit = min(maximum,
+                                      self._limit + self.increase / self._limit)
+            elif self._last_cut is None or token > self._last_cut:
+                self._limit = max(self.minimum, self._limit * self.decrease)
+                self._last_cut = now
+            self._limit = max(self.minimum, min(self._limit, maximum))
+            self._condition.notify_all()
+
+    def wrap(self, func, ceiling=None):
+        def limited(*args, **kwargs):
+            token = self.acquire()
+            congested = False
+            try:
+                return func(*args, **kwargs)
+            except (CiceroError, NetworkError) as e:
+                congested = _congestion(e)
+                raise
+            finally:
+                self.release(token, congested, ceiling)
+        return limited
+
+
+class EndpointLimiters(object):
+    """
+    # EndpointLimiters(**options)
+
+    An AIMDLimiter for each endpoint, made with options (the arguments of
+    AIMDLimiter) the first time it is needed. Can be passed as the limiter of
+    batch_request(), which uses the endpoint's limiter.
+
+    ## Available Methods:
+
+    +   .for_endpoint(endpoint) - the endpoint's AIMDLimiter
+    +   .limits() - dictionary of endpoint to current limit
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_endpoint(self, endpoint):
+        with self._lock:
+            limiter = self._limiters.get(endpoint)
+            if limiter is None:
+                limiter = self._limiters[endpoint] = AIMDLimiter(**self.options)
+            return limiter
+
+    def limits(self):
+        with self._lock:
+            return dict((endpoint, limiter.limit)
+                        for endpoint, limiter in self._limiters.items())
@@ -0,0 +1,177 @@
+"""
+This file defines HedgePolicy, which cuts the tail latency of interactive
+lookups by hedging: when a request hasn't been answered within a percentile
+of the recent latency of its endpoint, a duplicate is sent, and whichever
+answers first is used.
+
+    cicero.hedge = HedgePolicy(percentile=0.95)
+    cicero.get_district_type()
+
+Hedging is opt-in, per connection, and by default only for the endpoints
+which consume no credits (FREE_ENDPOINTS). Other endpoints can be added, as
+every Cicero API request is a GET and safe to send twice, but each duplicate
+spends credits, so duplicates are also capped by a budget: each request
+earns budget of a duplicate (0.05 by default, ie at most about one
+duplicate per 20 requests), and a duplicate is only sent if a whole one has
+been earned.
+
+    cicero.hedge = HedgePolicy(endpoints=FREE_ENDPOINTS + (OFFICIAL_ENDPOINT,),
+                               budget=0.02)
+
+No duplicate is sent for an endpoint until min_samples of its requests have
+finished, to know its latency. Duplicates sent, and those which won, are
+counted on the policy and in each RequestEvent (see
+cicero_instrumentation.py), so MetricsRegistry records them too.
+"""
+
+import threading
+from collections import deque
+from timeit import default_timer as _timer
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from .cicero_endpoint_constants import (
+    ELECTION_EVENT_ENDPOINT, DISTRICT_TYPE_ENDPOINT, VERSION_ENDPOINT,
+    ACCOUNT_CREDITS_REMAINING_ENDPOINT, ACCOUNT_USAGE_ENDPOINT)
+
+
+"""
+The endpoints whose requests consume no credits, which are hedged by default.
+"""
+FREE_ENDPOINTS = (ELECTION_EVENT_ENDPOINT, DISTRICT_TYPE_ENDPOINT,
+                  VERSION_ENDPOINT, ACCOUNT_CREDITS_REMAINING_ENDPOINT,
+                  ACCOUNT_USAGE_ENDPOINT)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+class HedgePolicy(object):
+    """
+    # HedgePolicy(percentile=0.95, endpoints=FREE_ENDPOINTS, budget=0.05,
+    #             window=100, min_samples=20, min_delay=0.0)
+
+    Sends a duplicate of a request to one of endpoints once it has waited
+    longer than percentile of the latencies of the last window requests to
+    that endpoint (but at least min_delay seconds), as long as the budget
+    allows. Can be shared by several connections and threads.
+
+    ## Available Attributes and Methods:
+
+    +   .requests (integer) - requests made to hedged endpoints
+    +   .hedges (integer) - duplicates sent
+    +   .hedge_wins (integer) - duplicates answered before the request they
+            duplicated
+    +   .delay(endpoint) - seconds to wait before sending a duplicate for
+            endpoint, or None until min_samples requests have finished
+    +   .call(request_url, request, event=None) - request(), hedged if
+            request_url is for one of endpoints, with any duplicate sent
+            recorded in event
+    """
+
+    def __init__(self, percentile=0.95, endpoints=FREE_ENDPOINTS, budget=0.05,
+                 window=100, min_samples=20, min_delay=0.0):
+        self.percentile = percentile
+        self.endpoints = tuple(endpoints)
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._tokens = 0.0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, request_url):
+        # the longest of endpoints request_url is for, or None
+        path = request_url.split('?', 1)[0]
+        best = None
+        for endpoint in self.endpoints:
+            if ((path == endpoint or path.startswith(endpoint + '/')) and
+                    (best is None or len(endpoint) > len(best))):
+                best = endpoint
+        return best
+
+    def delay(self, endpoint):
+        with self._lock:
+            latencies = self._latencies.get(endpoint, ())
+            if len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return max(self.min_delay,
+                   ordered[int(self.percentile * (len(ordered) - 1))])
+
+    def _record(self, endpoint, latency):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(
+                    maxlen=self.window)
+            latencies.append(latency)
+
+    def _spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def call(self, request_url, request, event=None):
+        endpoint = self._endpoint(request_url)
+        if endpoint is None:
+            return request()
+        with self._lock:
+            self.requests += 1
+            # a little unspent budget is kept for a burst of slow requests
+            self._tokens = min(self._tokens + self.budget, 1 + 10 * self.budget)
+
+        delay = self.delay(endpoint)
+        start = _timer()
+        if delay is None:
+            blob = request()
+            self._record(endpoint, _timer() - start)
+            return blob
+
+        results = Queue()
+
+        def attempt(hedge):
+            try:
+                results.put((hedge, None, request()))
+            except Exception as e:
+                results.put((hedge, e, None))
+
+        _start(attempt, False)
+        sent = 1
+        try:
+            hedge, error, blob = results.get(timeout=delay)
+        except Empty:
+            if self._spend():
+                _start(attempt, True)
+                sent = 2
+                if event is not None:
+                    event.hedged = True
+            hedge, error, blob = results.get()
+
+        if error is not None and sent == 2:
+            # the other may yet succeed
+            other = results.get()
+            if other[1] is None:
+                hedge, error, blob = other
+        if error is not None:
+            raise error
+
+        self._record(endpoint, _timer() - start)
+        if hedge:
+            with self._lock:
+                self.hedge_wins += 1
+            if event is not None:
+                event.hedge_won = True
+        return blob
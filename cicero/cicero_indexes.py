@@ -0,0 +1,174 @@
+"""
+This file defines indexes which collect the officials of every response
+parsed in a session, for lookups across responses rather than within one.
+
+Each index is an instrumentation hook (see cicero_instrumentation.py), so
+attaching it to a connection keeps it up to date as responses arrive:
+
+    identifiers = IdentifierIndex()
+    cicero.add_hook(identifiers)
+    cicero.get_official(search_loc='340 N 12th St, Philadelphia, PA USA')
+    identifiers.get('BIOGUIDE', 'B000444')
+
+Responses can also be added directly with .add(root), which is needed for
+any parsed outside the connection, like batch_request() results parsed in
+worker processes.
+"""
+
+import threading
+
+
+def _officials(root):
+    results = root.response.results
+    for holder in getattr(results, 'candidates', None) or [results]:
+        for official in getattr(holder, 'officials', ()):
+            yield official
+
+
+class IdentifierIndex(object):
+    """
+    # IdentifierIndex()
+
+    A reverse index from external identifiers - (identifier_type,
+    identifier_value) pairs like ('FEC', 'H8PA01153') - to the OfficialObject
+    they belong to. If several officials share an identifier, the one seen
+    most recently is kept. Adding an official again (from a newer response,
+    say) drops the identifiers they no longer have.
+
+    ## Available Methods:
+
+    +   .get(identifier_type, identifier_value, default=None) - the official
+            with this identifier, or default
+    +   .join(identifier_type, values) - yields (value, official) for each
+            of values, with None for values not in the index
+    +   .add(root), .add_official(official)
+    +   len(index), (identifier_type, identifier_value) in index
+    """
+
+    def __init__(self):
+        self._officials = {}
+        self._keys = {}
+        self._lock = threading.Lock()  # hooks run on batch_request's threads
+
+    def __call__(self, event):
+        if event.result is not None:
+            self.add(event.result)
+
+    def add(self, root):
+        for official in _officials(root):
+            self.add_official(official)
+
+    def add_official(self, official):
+        with self._lock:
+            current = set()
+            for identifier in official.identifiers:
+                key = (identifier.identifier_type, identifier.identifier_value)
+                self._officials[key] = official
+                current.add(key)
+
+            for key in self._keys.get(official.id, ()):
+                if key not in current:
+                    held = self._officials.get(key)
+                    if held is not None and held.id == official.id:
+                        del self._officials[key]
+            if current:
+                self._keys[official.id] = current
+            else:
+                self._keys.pop(official.id, None)
+
+    def get(self, identifier_type, identifier_value, default=None):
+        return self._officials.get((identifier_type, identifier_value), default)
+
+    def join(self, identifier_type, values):
+        get = self._officials.get
+        for value in values:
+            yield value, get((identifier_type, value))
+
+    def __len__(self):
+        return len(self._officials)
+
+    def __contains__(self, key):
+        return key in self._officials
+
+
+class CommitteeIndex(object):
+    """
+    # CommitteeIndex()
+
+    Collects the committees of every official added, by committee id, with
+    the officials who sit on each. Adding an official again (from a newer
+    response, say) replaces their old memberships with their current ones,
+    so the index stays right as it is updated.
+
+    ## Available Methods:
+
+    +   .get(committee_id) - the most recently seen CommitteeObject with this
+            id, or None
+    +   .get_by_sk(sk) - the CommitteeObject with this surrogate key, or None
+    +   .members(committee_id) - list of the OfficialObjects on the committee,
+            by official id
+    +   .committees_of(official_id) - list of the CommitteeObjects an
+            official sits on, by committee id
+    +   .sizes() - dictionary of committee id to number of members
+    +   .add(root), .add_official(official)
+    +   len(index), committee_id in index, iterating over committee ids
+    """
+
+    def __init__(self):
+        self._committees = {}
+        self._by_sk = {}
+        self._members = {}
+        self._memberships = {}
+        self._lock = threading.Lock()  # hooks run on batch_request's threads
+
+    def __call__(self, event):
+        if event.result is not None:
+            self.add(event.result)
+
+    def add(self, root):
+        for official in _officials(root):
+            self.add_official(official)
+
+    def add_official(self, official):
+        with self._lock:
+            current = set()
+            for committee in official.committees:
+                self._committees[committee.id] = committee
+                self._by_sk[committee.sk] = committee
+                self._members.setdefault(committee.id, {})[official.id] = official
+                current.add(committee.id)
+
+            for committee_id in self._memberships.get(official.id, ()):
+                if committee_id not in current:
+                    del self._members[committee_id][official.id]
+            if current:
+                self._memberships[official.id] = current
+            else:
+                self._memberships.pop(official.id, None)
+
+    def get(self, committee_id):
+        return self._committees.get(committee_id)
+
+    def get_by_sk(self, sk):
+        return self._by_sk.get(sk)
+
+    def members(self, committee_id):
+        members = self._members.get(committee_id, {})
+        return [members[i] for i in sorted(members)]
+
+    def committees_of(self, official_id):
+        return [self._committees[i]
+                for i in sorted(self._memberships.get(official_id, ()))]
+
+    def sizes(self):
+        return dict((committee_id, len(members))
+                    for committee_id, members in self._members.items())
+
+    def __len__(self):
+        return len(self._committees)
+
+    def __contains__(self, committee_id):
+        return committee_id in self._committees
+
+    def __iter__(self):
+        return iter(list(self._committees))
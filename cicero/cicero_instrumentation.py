@@ -0,0 +1,105 @@
+"""
+This file defines the RequestEvent class passed to instrumentation hooks
+attached to a CiceroRestConnection (see CiceroRestABC.add_hook() in
+cicero_rest_connection.py), and a simple hook that writes those events to the
+standard library logging module.
+
+A hook is any callable taking a single RequestEvent argument. Hooks are called
+once per API request, after the request has finished (successfully or not), so
+a metrics sink - statsd, Prometheus, logging, etc - can observe every request
+without monkey-patching the connection. When no hooks are attached, requests
+skip all timing and no RequestEvent is created.
+"""
+
+
+class RequestEvent(object):
+    """
+    # RequestEvent
+
+    Structured timing and size information for a single Cicero API request.
+    All times are in seconds, measured with timeit.default_timer.
+
+    ## Available Attributes:
+
+    +   .endpoint (string) - the Cicero endpoint (from cicero_endpoint_constants.py)
+            that was requested
+    +   .url (string) - the full request url, including user id and token
+    +   .compose_time (float) - time spent composing the request url
+    +   .network_time (float) - time spent waiting on the network, from opening
+            the request until the whole response body was read
+    +   .decode_time (float) - time spent in json.loads on the response body
+    +   .parse_time (float) - time spent building the RootCiceroObject
+    +   .request_bytes (integer) - length of the request url
+    +   .response_bytes (integer) - length of the response body
+    +   .cache_hit (boolean) - was this request answered without going to the network?
+    +   .revalidated (boolean) - was the response parsed before reused, because
+            the API answered 304 Not Modified or with the same body?
+    +   .retries (integer) - how many times the request was retried
+    +   .hedged (boolean) - was a duplicate of the request sent, because it
+            was slow to be answered? (see cicero_hedging.py)
+    +   .hedge_won (boolean) - was the duplicate answered first?
+    +   .error (Exception) - the CiceroError or NetworkError raised by this
+            request, or None if it succeeded
+    +   .result (RootCiceroObject) - the parsed response, or None if the
+            request failed or was only fetched, not parsed, by this process
+
+    ## Available Property:
+
+    +   .total_time (float) - sum of the compose, network, decode and parse times
+    """
+
+    def __init__(self, endpoint, url=None):
+        self.endpoint = endpoint
+        self.url = url
+        self.compose_time = 0.0
+        self.network_time = 0.0
+        self.decode_time = 0.0
+        self.parse_time = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.cache_hit = False
+        self.revalidated = False
+        self.retries = 0
+        self.hedged = False
+        self.hedge_won = False
+        self.error = None
+        self.result = None
+
+    @property
+    def total_time(self):
+        return (self.compose_time + self.network_time +
+                self.decode_time + self.parse_time)
+
+    def __repr__(self):
+        fields = dict((k, v) for k, v in self.__dict__.items() if k != 'result')
+        return '%s(%s)' % (self.__class__.__name__, fields)
+
+
+class LoggingHook(object):
+    """
+    # LoggingHook(logger=None, level=None)
+
+    A hook which logs one line per request with its endpoint, phase timings
+    (in milliseconds), response size and outcome. By default it logs to the
+    "cicero" logger, at logging.DEBUG level.
+
+        cicero = CiceroRestConnection(username, password)
+        cicero.add_hook(LoggingHook())
+    """
+
+    def __init__(self, logger=None, level=None):
+        import logging  # only loaded when a LoggingHook is used
+        self.logger = logger or logging.getLogger('cicero')
+        self.level = logging.DEBUG if level is None else level
+
+    def __call__(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.logger.log(
+            self.level,
+            '%s compose=%.2fms network=%.2fms decode=%.2fms parse=%.2fms '
+            'bytes=%d cache_hit=%s retries=%d error=%r',
+            event.endpoint, event.compose_time * 1000,
+            event.network_time * 1000, event.decode_time * 1000,
+            event.parse_time * 1000, event.response_bytes, event.cache_hit,
+            event.retries, event.error)
@@ -0,0 +1,190 @@
+"""
+This file defines Journal, a write-ahead journal for long batch jobs, used
+through the journal argument of batch_request() (see cicero_batch.py) and the
+--journal option of cicero-batch (see cicero_cli.py).
+
+Before each request, the journal appends a "pending" entry with the request's
+key and a hash of its url, and after it an "ok" entry pointing at the raw
+response, which is appended to a data file alongside the journal, or an
+"error" entry for a CiceroError the same query will always get again (a 4xx
+other than 401, 403, 408 and 429 - not an expired token, say). When a job is run
+again with the same journal, requests already finished are not sent again:
+their responses are read back from the data file instead. Pending entries
+that never finished are the requests which may have spent credits without
+their response being saved.
+
+    journal = Journal('officials.journal')
+    results = cicero.batch_request(OFFICIAL_ENDPOINT, queries, journal=journal)
+    journal.close()
+
+The journal is a JSON object per line, so it can be inspected with any text
+tool. A line cut short by a crash is dropped when the journal is reopened.
+"""
+
+import hashlib
+import os
+import threading
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_compat import native_str, to_bytes
+from .cicero_errors import CiceroError
+
+
+def _drop_partial_line(path):
+    # a line cut short by a crash would run into the next entry appended
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        f.seek(0)
+        f.truncate(f.read().rfind(b'\n') + 1)
+
+
+def _key(value):
+    # JSON has no tuples, so a tuple key (like a file and row number) is
+    # read back as a list, which can't be a dictionary key
+    if isinstance(value, list):
+        return tuple(_key(v) for v in value)
+    return value
+
+
+def url_hash(url):
+    """Returns the hash of a url (without its user and token) journaled."""
+    return hashlib.sha1(to_bytes(url)).hexdigest()
+
+
+class Journal(object):
+    """
+    # Journal(path, sync=False)
+
+    An append-only journal at path, with responses stored in path + ".data".
+    Both are created if they don't exist, and read back if they do. With
+    sync=True, both files are fsynced after every entry, which is slower but
+    survives the machine, not just the process, going down.
+
+    ## Available Attributes and Methods:
+
+    +   .fetch(fetch, key, url, url_hash) - the raw response for key, read
+            from the journal if it has finished there with the same url_hash,
+            or else fetched with fetch(url) and journaled. A journaled error
+            is raised again.
+    +   .pending() - keys of requests started but never finished
+    +   .completed (integer) - number of keys finished
+    +   .replayed (integer) - responses read back instead of requested
+    +   .close() - also done by using the journal in a with statement
+    """
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.sync = sync
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+
+        data_path = path + '.data'
+        data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        if os.path.exists(path):
+            self._load(data_size)
+            _drop_partial_line(path)
+        self._log = open(path, 'a')
+        self._data = open(data_path, 'ab')
+        self._reader = open(data_path, 'rb')
+
+    def _load(self, data_size):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a partial line from a crash
+                key = entry['key'] = _key(entry['key'])
+                if entry['status'] == 'pending':
+                    self._pending[key] = entry
+                    continue
+                self._pending.pop(key, None)
+                if (entry['status'] == 'ok' and
+                        entry['offset'] + entry['length'] > data_size):
+                    continue  # its response never reached the data file
+                self._entries[key] = entry
+
+    @property
+    def completed(self):
+        return len(self._entries)
+
+    def pending(self):
+        return list(self._pending)
+
+    def _append(self, entry):
+        self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+        if self.sync:
+            os.fsync(self._log.fileno())
+
+    def _replay(self, entry):
+        if entry['status'] == 'error':
+            raise CiceroError({'response': {'errors': entry['errors']},
+                               'status_code': entry['status_code']})
+        with self._lock:
+            self._reader.seek(entry['offset'])
+            blob = self._reader.read(entry['length'])
+            self.replayed += 1
+        return native_str(blob)
+
+    def fetch(self, fetch, key, url, url_hash):
+        entry = self._entries.get(key)
+        if entry is not None and entry['url_hash'] == url_hash:
+            return self._replay(entry)
+
+        with self._lock:
+            pending = {'key': key, 'url_hash': url_hash, 'status': 'pending'}
+            self._pending[key] = pending
+            self._append(pending)
+
+        try:
+            blob = fetch(url)
+        except CiceroError as e:
+            # loaded here, as cicero_rest_connection loads the HTTP client
+            from .cicero_rest_connection import _known_failure
+            if not _known_failure(e):
+                raise
+            entry = {'key': key, 'url_hash': url_hash, 'status': 'error',
+                     'status_code': e.status_code, 'errors': e.error_list}
+            with self._lock:
+                self._pending.pop(key, None)
+                self._entries[key] = entry
+                self._append(entry)
+            raise
+
+        data = to_bytes(blob)
+        with self._lock:
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+            if self.sync:
+                os.fsync(self._data.fileno())
+            entry = {'key': key, 'url_hash': url_hash, 'status': 'ok',
+                     'offset': offset, 'length': len(data)}
+            self._pending.pop(key, None)
+            self._entries[key] = entry
+            self._append(entry)
+        return blob
+
+    def close(self):
+        self._log.close()
+        self._data.close()
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
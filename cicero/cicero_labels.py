@@ -0,0 +1,171 @@
+"""
+This file defines write_labels(), which formats the mailing labels of many
+officials or addresses at once and streams them to a text or CSV file, for
+mail merges too big to build label by label with
+AddressObject.get_formatted_mailing_address().
+
+    root = cicero.get_official(search_loc='340 N 12th St, Philadelphia, PA USA')
+    write_labels(root.response.results.candidates[0].officials, 'labels.csv',
+                 output_format='csv')
+
+Labels are formatted exactly as get_formatted_mailing_address() formats them,
+but with one template per combination of empty and non-empty address parts,
+built the first time it is needed and reused after that, and they are written
+a buffer at a time rather than one by one.
+"""
+
+import csv
+import io
+from operator import itemgetter
+
+from .cicero_compat import PY2, text_type
+
+
+"""
+The parts of a mailing label, in order, with the template for each when it
+isn't empty.
+"""
+_PARTS = (('address_1', u'%s\n'), ('address_2', u'%s\n'),
+          ('address_3', u'%s\n'), ('city', u'%s, '), ('county', u'%s, '),
+          ('state', u'%s '), ('postal_code', u'%s'))
+
+_NAME_PARTS = ('first_name', 'middle_initial', 'last_name', 'name_suffix')
+
+
+class _LabelFormatter(object):
+    # formats labels with or without the county, from AddressObjects or
+    # address dictionaries
+
+    def __init__(self, county):
+        parts = [p for p in _PARTS if county or p[0] != 'county']
+        self.fields = tuple(name for name, _ in parts)
+        self.part_templates = tuple(template for _, template in parts)
+        self.values = itemgetter(*self.fields)
+        self.templates = {}
+
+    def template(self, present):
+        # empty parts are still formatted, as nothing, so every template
+        # takes all the values
+        return u''.join(template if p else u'%.0s'
+                        for template, p in zip(self.part_templates, present))
+
+    def __call__(self, address):
+        if not isinstance(address, dict):
+            address = address.__dict__
+        try:
+            values = self.values(address)
+        except KeyError:
+            values = tuple(map(address.get, self.fields))
+        present = tuple(map(bool, values))
+        template = self.templates.get(present)
+        if template is None:
+            template = self.templates[present] = self.template(present)
+        return template % values
+
+
+_formatters = {False: _LabelFormatter(False), True: _LabelFormatter(True)}
+
+
+def format_label(address, county=False):
+    """
+    # format_label(address, county=False)
+
+    Returns the mailing label for address, an AddressObject or an address
+    dictionary from a raw response, just as
+    AddressObject.get_formatted_mailing_address(county) would.
+    """
+    return _formatters[bool(county)](address)
+
+
+def _name(official):
+    return u' '.join(text_type(official[k]) for k in _NAME_PARTS
+                     if official.get(k))
+
+
+def label_rows(items, county=False):
+    """
+    # label_rows(items, county=False)
+
+    Yields an (official id, name, label) tuple for every address in items,
+    which may mix OfficialObjects, AddressObjects and the dictionaries of
+    raw officials and addresses. An official gives one tuple per address;
+    an address on its own has None for its id and name.
+    """
+    format_address = _formatters[bool(county)]
+    for item in items:
+        if not isinstance(item, dict):
+            item = item.__dict__
+        addresses = item.get('addresses')
+        if addresses is None:
+            yield None, None, format_address(item)
+            continue
+        official_id = item.get('id')
+        name = _name(item)
+        for address in addresses:
+            yield official_id, name, format_address(address)
+
+
+def _open(sink, output_format):
+    if PY2:
+        if output_format == 'csv':
+            return open(sink, 'wb')
+        return io.open(sink, 'w', encoding='utf-8')
+    return io.open(sink, 'w', encoding='utf-8',
+                   newline='' if output_format == 'csv' else None)
+
+
+def _csv_cell(value):
+    if PY2 and isinstance(value, text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def write_labels(items, sink, county=False, output_format='text',
+                 buffer_size=1024):
+    """
+    # write_labels(items, sink, county=False, output_format="text",
+    #              buffer_size=1024)
+
+    Writes the label of every address in items (see label_rows()) to sink, a
+    path or an open file, and returns the number of labels written.
+
+    With output_format="text", each label is written as a block of lines,
+    headed by the official's name if it has one, with a blank line after it.
+    With output_format="csv", each label is a row with columns official_id,
+    name and label. Labels are written buffer_size at a time.
+    """
+    if output_format not in ('text', 'csv'):
+        raise ValueError('unknown output_format %r' % output_format)
+    f = (_open(sink, output_format) if isinstance(sink, (str, text_type))
+         else sink)
+    writer = None
+    count = 0
+    try:
+        if output_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['official_id', 'name', 'label'])
+        buffer = []
+        for official_id, name, label in label_rows(items, county):
+            if writer is not None:
+                buffer.append((official_id, _csv_cell(name), _csv_cell(label)))
+            elif name:
+                buffer.append(u'%s\n%s\n\n' % (name, label))
+            else:
+                buffer.append(label + u'\n\n')
+            if len(buffer) >= buffer_size:
+                count += _flush(f, writer, buffer)
+        count += _flush(f, writer, buffer)
+    finally:
+        if f is not sink:
+            f.close()
+    return count
+
+
+def _flush(f, writer, buffer):
+    n = len(buffer)
+    if writer is not None:
+        writer.writerows(buffer)
+    elif buffer:
+        f.write(u''.join(buffer))
+    del buffer[:]
+    return n
@@ -0,0 +1,316 @@
+"""
+This file defines an in-process metrics registry for python-cicero. A
+MetricsRegistry is an instrumentation hook (see cicero_instrumentation.py):
+attach it to a connection with add_hook() and it will keep, per endpoint,
+
++   request counts,
++   a latency histogram (with p50/p99 estimates),
++   CiceroError counts by HTTP status code and NetworkError counts,
+    (neither of which includes requests answered from .cache or
+    .negative_cache, which are counted as cache hits instead)
++   bytes sent (request url length) and received (response body length),
++   cache hits, retries, and seconds spent in each phase of a request,
++   and, for limiters tracked with track_concurrency(), the current adaptive
+    concurrency limit (see cicero_concurrency.py).
+
+Endpoints are labelled with the name of their constant in
+cicero_endpoint_constants.py, like "OFFICIAL_ENDPOINT".
+
+Metrics can be exported in the Prometheus text exposition format with
+prometheus_text(), or as a plain dictionary with snapshot().
+
+    metrics = MetricsRegistry()
+    cicero.add_hook(metrics)
+    ...
+    metrics.snapshot()['OFFICIAL_ENDPOINT']['latency']['p99']
+"""
+
+import threading
+
+from . import cicero_endpoint_constants
+from .cicero_errors import CiceroError, NetworkError
+
+
+"""
+Default latency histogram bucket upper bounds, in seconds. These are the
+Prometheus client library defaults.
+"""
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_PHASES = ('compose', 'network', 'decode', 'parse')
+
+_ENDPOINT_LABELS = dict(
+    (value, name) for name, value in vars(cicero_endpoint_constants).items()
+    if name.endswith('_ENDPOINT'))
+
+
+def endpoint_label(endpoint):
+    """
+    # endpoint_label(endpoint)
+
+    Returns the name of the constant in cicero_endpoint_constants.py for an
+    endpoint url, like "OFFICIAL_ENDPOINT". Urls with extra path segments
+    (like /official/123 or /account/usage/2013-01) are labelled by the
+    longest endpoint they start with. Unknown urls are returned unchanged.
+    """
+    try:
+        return _ENDPOINT_LABELS[endpoint]
+    except KeyError:
+        pass
+
+    best = None
+    for value in _ENDPOINT_LABELS:
+        if (endpoint.startswith(value + '/') and
+                (best is None or len(value) > len(best))):
+            best = value
+    return _ENDPOINT_LABELS[best] if best else endpoint
+
+
+class LatencyHistogram(object):
+    """
+    # LatencyHistogram(buckets=DEFAULT_BUCKETS)
+
+    A Prometheus-style histogram: a count of observations falling at or
+    below each bucket's upper bound, plus the count and sum of all
+    observations. Quantiles are estimated by linear interpolation within
+    the bucket containing them, as Prometheus' histogram_quantile() does.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        cumulative = []
+        running = 0
+        for c in self.counts:
+            running += c
+            cumulative.append(running)
+        return cumulative
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        lower_bound = 0.0
+        below = 0
+        for i, c in enumerate(self.counts):
+            if below + c >= rank and c:
+                if i == len(self.buckets):
+                    # can't interpolate into +Inf, so report the highest bound
+                    return self.buckets[-1]
+                upper_bound = self.buckets[i]
+                return lower_bound + ((upper_bound - lower_bound) *
+                                      (rank - below) / c)
+            below += c
+            if i < len(self.buckets):
+                lower_bound = self.buckets[i]
+        return self.buckets[-1]
+
+
+class _EndpointMetrics(object):
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.latency = LatencyHistogram(buckets)
+        self.cicero_errors = {}
+        self.network_errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.phase_seconds = dict((phase, 0.0) for phase in _PHASES)
+
+
+class MetricsRegistry(object):
+    """
+    # MetricsRegistry(buckets=DEFAULT_BUCKETS, namespace="cicero")
+
+    Keeps counters and latency histograms per endpoint. Instances are
+    callable with a RequestEvent, so they can be attached to any number of
+    connections with add_hook(). Safe to share between threads.
+
+    ## Available Methods:
+
+    +   .observe(event) - record a RequestEvent (same as calling the registry)
+    +   .snapshot() - returns a dictionary of metrics keyed by endpoint label
+    +   .prometheus_text() - returns all metrics in the Prometheus text format
+    +   .reset() - forget everything recorded so far
+    +   .track_concurrency(limiters) - report the limit of each endpoint's
+            limiter in an EndpointLimiters (see cicero_concurrency.py) as a
+            gauge
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, namespace='cicero'):
+        self.buckets = tuple(sorted(buckets))
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._limiters = None
+
+    def __call__(self, event):
+        self.observe(event)
+
+    def observe(self, event):
+        label = endpoint_label(event.endpoint)
+        with self._lock:
+            m = self._endpoints.get(label)
+            if m is None:
+                m = self._endpoints[label] = _EndpointMetrics(self.buckets)
+
+            m.requests += 1
+            m.request_bytes += event.request_bytes
+            m.response_bytes += event.response_bytes
+            m.retries += event.retries
+            if event.hedged:
+                m.hedges += 1
+            if event.hedge_won:
+                m.hedge_wins += 1
+            for phase in _PHASES:
+                m.phase_seconds[phase] += getattr(event, phase + '_time')
+
+            if event.cache_hit:
+                # answered without a request: neither its latency nor any
+                # error it replays says anything about the API
+                m.cache_hits += 1
+                return
+            m.latency.observe(event.total_time)
+            if isinstance(event.error, CiceroError):
+                code = event.error.status_code
+                m.cicero_errors[code] = m.cicero_errors.get(code, 0) + 1
+            elif isinstance(event.error, NetworkError):
+                m.network_errors += 1
+
+    def track_concurrency(self, limiters):
+        self._limiters = limiters
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self):
+        snapshot = {}
+        limits = {}
+        if self._limiters is not None:
+            limits = dict((endpoint_label(endpoint), limit) for endpoint, limit
+                          in self._limiters.limits().items())
+        with self._lock:
+            for label, m in self._endpoints.items():
+                snapshot[label] = {
+                    'requests': m.requests,
+                    'cicero_errors': dict(m.cicero_errors),
+                    'network_errors': m.network_errors,
+                    'request_bytes': m.request_bytes,
+                    'response_bytes': m.response_bytes,
+                    'cache_hits': m.cache_hits,
+                    'retries': m.retries,
+                    'hedges': m.hedges,
+                    'hedge_wins': m.hedge_wins,
+                    'phase_seconds': dict(m.phase_seconds),
+                    'concurrency_limit': limits.get(label),
+                    'latency': {
+                        'count': m.latency.count,
+                        'sum': m.latency.sum,
+                        'p50': m.latency.quantile(0.5),
+                        'p99': m.latency.quantile(0.99),
+                        'buckets': list(zip(
+                            self.buckets + (float('inf'),),
+                            m.latency.cumulative_counts())),
+                    },
+                }
+        return snapshot
+
+    def prometheus_text(self):
+        ns = self.namespace
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP %s_%s %s' % (ns, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (ns, name, kind))
+
+        def sample(name, labels, value):
+            label_text = ','.join('%s="%s"' % pair for pair in labels)
+            lines.append('%s_%s{%s} %s' % (ns, name, label_text,
+                                           _format_value(value)))
+
+        snapshot = sorted(self.snapshot().items())
+
+        metric('requests_total', 'counter', 'Requests made to the Cicero API.')
+        for label, m in snapshot:
+            sample('requests_total', [('endpoint', label)], m['requests'])
+
+        metric('request_duration_seconds', 'histogram',
+               'Total time spent per request.')
+        for label, m in snapshot:
+            for bound, count in m['latency']['buckets']:
+                sample('request_duration_seconds_bucket',
+                       [('endpoint', label), ('le', _format_value(bound))],
+                       count)
+            sample('request_duration_seconds_sum', [('endpoint', label)],
+                   m['latency']['sum'])
+            sample('request_duration_seconds_count', [('endpoint', label)],
+                   m['latency']['count'])
+
+        metric('phase_seconds_total', 'counter',
+               'Time spent in each phase of a request.')
+        for label, m in snapshot:
+            for phase in _PHASES:
+                sample('phase_seconds_total',
+                       [('endpoint', label), ('phase', phase)],
+                       m['phase_seconds'][phase])
+
+        metric('api_errors_total', 'counter',
+               'CiceroErrors raised, by HTTP status code.')
+        for label, m in snapshot:
+            for code, count in sorted(m['cicero_errors'].items()):
+                sample('api_errors_total',
+                       [('endpoint', label), ('status_code', code)], count)
+
+        for name, key, help_text in (
+                ('network_errors_total', 'network_errors',
+                 'NetworkErrors raised.'),
+                ('request_bytes_total', 'request_bytes',
+                 'Bytes sent in request urls.'),
+                ('response_bytes_total', 'response_bytes',
+                 'Bytes received in response bodies.'),
+                ('cache_hits_total', 'cache_hits',
+                 'Requests answered from a cache.'),
+                ('retries_total', 'retries', 'Requests retried.'),
+                ('hedges_total', 'hedges',
+                 'Duplicate requests sent for slow requests.'),
+                ('hedge_wins_total', 'hedge_wins',
+                 'Duplicate requests answered first.')):
+            metric(name, 'counter', help_text)
+            for label, m in snapshot:
+                sample(name, [('endpoint', label)], m[key])
+
+        metric('concurrency_limit', 'gauge',
+               'Requests allowed in flight at once by the adaptive limiter.')
+        for label, m in snapshot:
+            if m['concurrency_limit'] is not None:
+                sample('concurrency_limit', [('endpoint', label)],
+                       m['concurrency_limit'])
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
@@ -0,0 +1,118 @@
+"""
+This file defines project(), which pulls named fields straight out of the
+decoded JSON of a Cicero API response into rows of tuples, without building
+the RootCiceroObject tree first, and project_array(), which does the same into
+a NumPy structured array when NumPy is installed.
+
+Fields are named as dot.separated paths, exactly as they would be reached on
+the response classes, since those use the JSON keys as attribute names:
+
+    json_dict = json.loads(blob)
+    project(json_dict, ['first_name', 'last_name',
+                        'office.district.district_type', 'office.chamber.name'])
+
+gives the same rows as flatten() in cicero_batch.py on the parsed response,
+for a fraction of the work. batch_request() uses it for the fields option
+whenever it has the raw response in hand.
+"""
+
+from operator import itemgetter
+
+
+"""
+The keys of the records projected: a response's officials, districts or
+election events.
+"""
+_RECORD_LISTS = ('officials', 'districts', 'election_events')
+
+_getters = {}
+
+
+def records(json_dict):
+    """
+    # records(json_dict)
+
+    Yields the dictionary of each official, district or election event in the
+    decoded JSON of a response, across all its geocoding candidates.
+    """
+    results = json_dict['response']['results']
+    for holder in results.get('candidates') or [results]:
+        for name in _RECORD_LISTS:
+            for record in holder.get(name, ()):
+                yield record
+
+
+def _path_getter(path):
+    keys = path.split('.')
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda record: record.get(key)
+
+    def get(record):
+        # None through anything but a dictionary, like a list of addresses,
+        # as flatten() gives
+        value = record
+        for key in keys:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+            if value is None:
+                return None
+        return value
+
+    return get
+
+
+def _getter(fields):
+    # one function returning a row's tuple, cached per list of fields
+    fields = tuple(fields)
+    getter = _getters.get(fields)
+    if getter is None:
+        if all('.' not in f for f in fields) and len(fields) > 1:
+            # every field is top level: itemgetter is fastest, but needs
+            # every key present, so records missing one fall back
+            fast = itemgetter(*fields)
+            slow = [_path_getter(f) for f in fields]
+
+            def getter(record):
+                try:
+                    return fast(record)
+                except KeyError:
+                    return tuple(get(record) for get in slow)
+        else:
+            parts = [_path_getter(f) for f in fields]
+
+            def getter(record):
+                return tuple(get(record) for get in parts)
+        _getters[fields] = getter
+    return getter
+
+
+def project(json_dict, fields):
+    """
+    # project(json_dict, fields)
+
+    Returns a list with one tuple per official, district or election event in
+    json_dict (a decoded Cicero API response), holding the values of fields.
+    Missing values are None.
+    """
+    getter = _getter(fields)
+    return [getter(record) for record in records(json_dict)]
+
+
+def project_array(json_dict, fields, dtypes=None):
+    """
+    # project_array(json_dict, fields, dtypes=None)
+
+    Returns the rows of project() as a NumPy structured array, with a column
+    named for each field. dtypes maps fields to NumPy dtypes, like
+    {'id': 'i8', 'last_name': 'U40'}; other columns hold Python objects.
+    Raises ImportError if NumPy isn't installed.
+    """
+    try:
+        import numpy  # only when used, as it is slow to import
+    except ImportError:
+        raise ImportError('project_array() requires numpy')
+    dtypes = dtypes or {}
+    dtype = [(str(f), dtypes.get(f, object)) for f in fields]
+    return numpy.array(project(json_dict, fields), dtype=dtype)
@@ -17,12 +17,63 @@ containing instances of other classes defined in this file.
 An abstract base class, AbstractCiceroObject, defines __str__ and __repr__
 methods which all classes use. The private function _copy_keys facilitates
 initializing class attributes from JSON values.
+
+Values of the fields in INTERNED_FIELDS, like party and state, repeat across
+thousands of objects in a large response, but the JSON decoder makes a new
+string for every one. _copy_keys keeps one shared copy of each such value
+instead, so a parsed response doesn't hold on to the duplicates once its
+JSON has been discarded. set_interned_fields() changes which fields these are.
+"""
+
+
 """
+The fields whose values are interned by default: ones with few distinct
+values, which are strings (or None) wherever they appear.
+"""
+INTERNED_FIELDS = frozenset([
+    'party', 'state', 'country', 'district_type', 'subtype',
+    'identifier_type', 'locator', 'locator_type', 'geoservice', 'salutation'])
+
+_interned_fields = INTERNED_FIELDS
+_symbols = {}
+_plans = {}
+
+
+def set_interned_fields(fields):
+    """
+    # set_interned_fields(fields)
+
+    Sets the fields whose values are interned when responses are parsed, and
+    returns the fields set before. Pass an empty list to stop interning. Values
+    interned are kept for the life of the process, so only fields with few
+    distinct values should be interned.
+    """
+    global _interned_fields
+    previous = _interned_fields
+    _interned_fields = frozenset(fields)
+    _plans.clear()
+    return previous
+
+
+def _plan(keys):
+    # each class copies the same tuple of keys every time, so which of them
+    # are interned is worked out once per tuple; the tuple is kept in the
+    # plan so that its id can't be reused by another
+    plan = (keys, tuple(k for k in keys if k not in _interned_fields),
+            tuple(k for k in keys if k in _interned_fields))
+    _plans[id(keys)] = plan
+    return plan
 
 
 def _copy_keys(lhs, rhs, keys):
-    for k in keys:
+    plan = _plans.get(id(keys))
+    if plan is None or plan[0] is not keys:
+        plan = _plan(keys)
+    for k in plan[1]:
         lhs[k] = rhs[k]
+    for k in plan[2]:
+        v = rhs[k]
+        lhs[k] = _symbols.setdefault(v, v)
 
 
 class AbstractCiceroObject(object):
@@ -551,6 +602,7 @@ class AddressObject(AbstractCiceroObject):
             County is false by default, but if set to true, this method will
             add it (if not empty) to the formatted mailing address string
             that is returned.
+            For many labels at once, see write_labels() in cicero_labels.py.
 
     ### Geocoded response structure:
     +   response
@@ -626,6 +678,8 @@ class OfficialObject(AbstractCiceroObject):
     +   .notes (list of strings) - general notes
     +   .identifiers (list of IdentifierObjects) - external identifiers belonging
             to this official
+    +   .identifiers_by_type (dictionary) - identifier_type to the list of this
+            official's IdentifierObjects of that type
     +   .name_suffix (string) - formal suffix after official's name
     +   .valid_to (string) - datetime this official is valid until
     +   .sk (integer) - Cicero surrogate key for historical queries
@@ -665,11 +719,14 @@ class OfficialObject(AbstractCiceroObject):
         self.committees = [CommitteeObject(c) for c in official_dict['committees']]
         self.identifiers = [IdentifierObject(i) for i in official_dict['identifiers']]
 
+        self.identifiers_by_type = {}
+        for identifier in self.identifiers:
+            self.identifiers_by_type.setdefault(
+                identifier.identifier_type, []).append(identifier)
+
     def find_identifier(self, identifier_type):
-        #iterate through self.identifiers and search on type
         #If one or more of same type, return all those IdentifierObjects in a list
-        return [identifier for identifier in self.identifiers
-                if identifier.identifier_type == identifier_type]
+        return list(self.identifiers_by_type.get(identifier_type, ()))
 
 
 class CountObject(AbstractCiceroObject):
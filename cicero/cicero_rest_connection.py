@@ -5,16 +5,77 @@ to all the endpoints in the Cicero API. These methods use the API request
 methods in CiceroRestABC to wrap the API and get data back.
 """
 
-import urllib
-import urllib2
+import hashlib
+import time
+from timeit import default_timer as _timer
 try:
     import json
 except ImportError:
     import simplejson as json
 
-from cicero_endpoint_constants import *
-from cicero_response_classes import *
-from cicero_errors import *
+from . import cicero_compat
+from .cicero_compat import (urlencode, quote_plus, integer_types, native_str,
+                            to_bytes)
+from .cicero_endpoint_constants import *
+from .cicero_response_classes import *
+from .cicero_errors import *
+from .cicero_instrumentation import *
+from .cicero_cache import *
+
+
+_SCALAR_TYPES = (str, float, bool) + integer_types
+_quoted_keys = {}
+_quote_plus = quote_plus
+
+
+def _urlencode(kwargs, skip=None):
+    """
+    Equivalent to urlencode(kwargs, True), but skipping the skip key
+    (an "id" which is added to the url path instead) and fast-pathing the
+    common case of string and number values. As with urlencode(), a sequence
+    value is encoded as the same key repeated once for each of its items,
+    which the Cicero API treats as an OR query.
+    """
+    parts = []
+    for key, value in kwargs.items():
+        if key == skip:
+            continue
+
+        quoted_key = _quoted_keys.get(key)
+        if quoted_key is None:
+            quoted_key = _quoted_keys.setdefault(
+                key, _quote_plus(str(key)) + '=')
+
+        if type(value) in _SCALAR_TYPES:
+            parts.append(quoted_key + _quote_plus(str(value)))
+            continue
+
+        if type(value) in (list, tuple):
+            encoded = [quoted_key + _quote_plus(str(v)) for v in value
+                       if type(v) in _SCALAR_TYPES]
+            if len(encoded) == len(value):
+                parts.extend(encoded)
+                continue
+
+        # unicode, other sequences, etc are left to urlencode()
+        parts.append(urlencode({key: value}, True))
+    return '&'.join(parts)
+
+
+def _id_path(kwargs, path):
+    # a single "id" goes in the url path; a sequence of ids is left in the
+    # query as an OR query
+    object_id = kwargs.get('id')
+    if object_id is not None and type(object_id) not in (list, tuple):
+        return str(object_id), 'id'
+    return path, None
+
+
+def _cache_key(endpoint, kwargs, path):
+    path, skip = _id_path(kwargs, path)
+    query = _urlencode(kwargs, skip)
+    return (endpoint + ('/' + path if path else '') + '?' +
+            '&'.join(sorted(query.split('&'))))
 
 
 _NETWORK_ERROR = """
@@ -24,6 +85,60 @@ Unable to communicate with the Cicero API.\n
  Reason: """
 
 
+def _retryable(error):
+    # Network trouble, rate limiting and server errors may well succeed if
+    # tried again; anything else the Cicero API objects to will not.
+    return (isinstance(error, NetworkError) or
+            error.status_code == 429 or error.status_code >= 500)
+
+
+def _known_failure(error):
+    # Client errors the same query will get again, unlike authentication
+    # errors (which a new token fixes), timeouts and rate limiting.
+    return (400 <= error.status_code < 500 and
+            error.status_code not in (401, 403, 408, 429))
+
+
+"""
+The endpoints never answered from .cache or .negative_cache: the account's
+credits and usage change with every request, and the version with every
+release of the API.
+"""
+_UNCACHED_ENDPOINTS = (ACCOUNT_CREDITS_REMAINING_ENDPOINT,
+                       ACCOUNT_USAGE_ENDPOINT, VERSION_ENDPOINT)
+
+
+"""
+The lists of records a response may have, any of which being non-empty makes
+it not empty for the negative cache.
+"""
+_RECORD_LISTS = ('officials', 'districts', 'election_events')
+
+
+def _is_empty(root):
+    # Does root have no geocoding candidates, or no officials, districts or
+    # election events? Responses without such lists are never empty.
+    results = root.response.results
+    candidates = getattr(results, 'candidates', None)
+    if candidates is not None and not candidates:
+        return True
+    lists = [getattr(holder, name) for holder in candidates or [results]
+             for name in _RECORD_LISTS if hasattr(holder, name)]
+    return bool(lists) and not any(lists)
+
+
+def _cicero_error(http_error):
+    # The Cicero API explains its errors in a JSON body. A body that isn't
+    # JSON (from a proxy, say) is passed along as the only error message.
+    error_blob = native_str(http_error.read())
+    try:
+        error_dict = json.loads(error_blob)
+    except ValueError:
+        error_dict = {'response': {'errors': [error_blob]}}
+    error_dict['status_code'] = http_error.code
+    return CiceroError(error_dict)
+
+
 class CiceroRestABC(object):
     """
     # CiceroRestABC
@@ -33,9 +148,127 @@ class CiceroRestABC(object):
     _compose_request_url() and _submit_request() methods defined here to perform
     the mechanics of composing a Cicero API url, requesting it, and parsing
     a JSON response.
+
+    ## Instrumentation hooks
+
+    Any callable can be attached with add_hook(hook). After every request,
+    each hook is called with a RequestEvent (defined in
+    cicero_instrumentation.py) holding the time spent composing the url,
+    waiting on the network, decoding the JSON and parsing it into a
+    RootCiceroObject, along with the endpoint, response size, and any error
+    raised. When no hooks are attached, nothing is timed.
+
+    ## Caching
+
+    If .cache is set to a ResponseCache (defined in cicero_cache.py), or any
+    object with the same get() and set() methods, responses are cached and
+    repeated queries are answered from it. Responses from the account and
+    version endpoints, which change without the query changing, are never
+    cached.
+
+    ## Negative caching
+
+    If .negative_cache is set to a ResponseCache, responses with no results
+    (no geocoding candidates, like an address that can't be geocoded, or no
+    officials, districts or election events) are kept there instead of in
+    .cache, and so are CiceroErrors with a 4xx status other than 401, 403,
+    408 and 429, such as an invalid query parameter. A query kept there is
+    answered from it, or its error raised again, without a request. Give it a
+    short ttl, so that results which do turn up aren't missed for long:
+
+        cicero.negative_cache = ResponseCache(max_entries=10000, ttl=600)
+
+    ## Conditional requests
+
+    If .revalidate is set to a ResponseCache (or any object with the same
+    get() and set() methods), the validators (ETag and Last-Modified headers)
+    and a hash of the body of each response are kept in it, along with the
+    parsed response, by endpoint and query. A query made again is sent as a
+    conditional GET, and if the Cicero API answers 304 Not Modified, or with
+    a body identical to the one before, the response parsed before is
+    returned without decoding or parsing anything. Unlike .cache, which
+    answers without any request, this always asks the API, so responses are
+    never stale; the two can be used together, with .cache (given a ttl)
+    answering first.
+
+    ## Retries
+
+    If .max_retries is set, a request which fails with a NetworkError, or a
+    CiceroError with HTTP status 429 (too many requests) or 5xx, is retried up
+    to that many times, waiting .retry_backoff seconds before the first retry
+    and twice as long before each one after that.
+
+    ## Hedged requests
+
+    If .hedge is set to a HedgePolicy (defined in cicero_hedging.py), a
+    request to one of its endpoints (by default those which consume no
+    credits) which hasn't been answered within a percentile of the recent
+    latency of the endpoint is sent again, within the policy's budget, and
+    the first answer is used. Each attempt of a retried request may be
+    hedged.
+
+        cicero.hedge = HedgePolicy(percentile=0.95)
     """
 
-    def _compose_request_url(self, endpoint, kwargs):
+    _hooks = ()
+    cache = None
+    negative_cache = None
+    revalidate = None
+    max_retries = 0
+    retry_backoff = 0.5
+    hedge = None
+
+    def add_hook(self, hook):
+        """
+        # add_hook(hook)
+
+        Attach a callable to be called with a RequestEvent after every request
+        made with this connection. Exceptions raised by a hook are not caught.
+        """
+        self._hooks = self._hooks + (hook,)
+
+    def remove_hook(self, hook):
+        """
+        # remove_hook(hook)
+
+        Detach a hook previously attached with add_hook().
+        """
+        self._hooks = tuple(h for h in self._hooks if h != hook)
+
+    def _emit(self, event):
+        for hook in self._hooks:
+            hook(event)
+
+    _auth_key = None
+
+    def _url_template(self, endpoint, path=None):
+        """
+        # _url_template()
+
+        Returns the start of every request url for endpoint (and path, if
+        any), up to and including the user id and token. The authentication
+        query string is only rebuilt when the user id or token changes (ie,
+        when __init__ is re-executed to refresh the token), and the url for
+        each endpoint is cached until then.
+        """
+        auth_key = (self.user_id, self.token)
+        if auth_key != self._auth_key:
+            self._auth_query = ('?user=' + str(self.user_id) + '&token=' +
+                                str(self.token) + '&f=json')
+            self._url_templates = {}
+            self._auth_key = auth_key
+
+        if path:
+            return endpoint + '/' + path + self._auth_query
+
+        template = self._url_templates.get(endpoint)
+        if template is None:
+            template = self._url_templates[endpoint] = (
+                endpoint + self._auth_query)
+        return template
+
+    def _compose_request_url(self, endpoint, kwargs, path=None,
+                             authenticate=True):
         """
         # _compose_request_url()
 
@@ -44,25 +277,28 @@ class CiceroRestABC(object):
         enumerated in the Cicero documentation), this method encodes those
         arguments/parameters and composes an API request url with endpoint,
         user id, token, and parameters.
+
+        An "id" argument, or the path argument, is added to the url as a path
+        segment after the endpoint instead (like /official/1234), unless the
+        id is a sequence, which is queried like any other OR query. The
+        version endpoint is the only one not to be requested with
+        authenticate=True.
         """
 
         #save id if present and add to the base URL, it is treated differently
-        if 'id' in kwargs:
-            object_id = kwargs.pop('id')
-
-            request_url = (endpoint + '/' + str(object_id) + '?user=' +
-                           str(self.user_id) + '&token=' + str(self.token) +
-                           '&f=json&')
+        path, skip = _id_path(kwargs, path)
 
+        if authenticate:
+            request_url = self._url_template(endpoint, path)
         else:
-            request_url = (endpoint + '?user=' + str(self.user_id) + '&token=' +
-                           str(self.token) + '&f=json&')
+            request_url = endpoint + ('/' + path if path else '') + '?f=json'
 
-        query_params = urllib.urlencode(kwargs, True)
-        request_url += query_params
+        query_params = _urlencode(kwargs, skip)
+        if query_params:
+            request_url += '&' + query_params
 
         return request_url
-    
+
     def json_to_cicero_object(self, json_response):
         """
         # json_to_cicero_object()
@@ -77,51 +313,276 @@ class CiceroRestABC(object):
         """
         return RootCiceroObject(json_response)
 
-    def _submit_request(self, request_url):
+    def _request_raw(self, request_url, validators=None):
         """
-        # _submit_request()
+        # _request_raw()
 
-        Given a request_url composed with the _compose_request_url() method, this
-        method requests the URL from the Cicero API and returns the JSON
-        response as a RootCiceroObject (defined in cicero_response_classes.py)
-        if successful.
+        Requests request_url from the Cicero API and returns the raw body of
+        the response, without decoding or parsing it.
+
+        If validators (a dictionary) is given, the request is made conditional
+        on its "etag" and "last_modified" values, if it has them, and it is
+        updated with those of the response. None is returned if the response
+        is 304 Not Modified.
 
-        If the Cicero API raises an error (a urllib2.HTTPError),
+        If the Cicero API raises an error (an HTTPError),
         the resulting JSON (with error message from the API) and the HTTP status
         code are returned and raised as a CiceroError (defined in
         cicero_errors.py).
 
         If python-cicero cannot communicate with the Cicero API
-        (a urllib2.URLError), a NetworkError (defined in cicero_errors.py) with
-        a urllib2.URLError.reason is raised.
+        (a URLError), a NetworkError (defined in cicero_errors.py) with
+        the URLError's reason is raised.
         """
 
-        request = urllib2.Request(request_url)
+        request = cicero_compat.Request(request_url)
         request.add_header('User-Agent', 'Cicero_Python_Wrapper')
+        if validators:
+            if validators.get('etag'):
+                request.add_header('If-None-Match', validators['etag'])
+            if validators.get('last_modified'):
+                request.add_header('If-Modified-Since',
+                                   validators['last_modified'])
 
         try:
-            response = urllib2.urlopen(request)
-            blob = response.read()
-            json_dict = json.loads(blob)
-            return self.json_to_cicero_object(json_dict)
-        except urllib2.HTTPError as e:
-            error_blob = e.read()
-            error_dict = json.loads(error_blob)
-            error_dict['status_code'] = e.code
-            raise CiceroError(error_dict)
-        except urllib2.URLError as e:
+            response = cicero_compat.urlopen(request)
+            if validators is not None:
+                headers = response.info()
+                validators['etag'] = headers.get('ETag')
+                validators['last_modified'] = headers.get('Last-Modified')
+            return native_str(response.read())
+        except cicero_compat.HTTPError as e:
+            if e.code == 304 and validators:
+                return None
+            raise _cicero_error(e)
+        except cicero_compat.URLError as e:
             raise NetworkError(_NETWORK_ERROR, e.reason)
-        
-    def _response_from_endpoint(self, endpoint, args):
+
+    def _fetch(self, request_url, event=None, validators=None):
+        """
+        # _fetch()
+
+        _request_raw(), retried as described under Retries above, and hedged
+        as described under Hedged requests. The number of retries made and
+        any hedging are recorded in event, if given.
+        """
+        retries = 0
+        while True:
+            try:
+                if self.hedge is not None:
+                    return self._hedged(request_url, event, validators)
+                if validators is None:
+                    return self._request_raw(request_url)
+                return self._request_raw(request_url, validators)
+            except (CiceroError, NetworkError) as e:
+                if retries >= self.max_retries or not _retryable(e):
+                    raise
+            time.sleep(self.retry_backoff * 2 ** retries)
+            retries += 1
+            if event is not None:
+                event.retries = retries
+
+    def _hedged(self, request_url, event, validators):
+        if validators is None:
+            return self.hedge.call(
+                request_url, lambda: self._request_raw(request_url), event)
+
+        # the attempts run at once, so each updates its own validators, and
+        # only the winner's are kept
+        def attempt():
+            own = dict(validators)
+            return own, self._request_raw(request_url, own)
+
+        own, blob = self.hedge.call(request_url, attempt, event)
+        validators.clear()
+        validators.update(own)
+        return blob
+
+    def _submit_request(self, request_url, event=None, key=None):
+        """
+        # _submit_request()
+
+        Given a request_url composed with the _compose_request_url() method, this
+        method requests the URL from the Cicero API (with _fetch()) and
+        returns the JSON response as a RootCiceroObject (defined in
+        cicero_response_classes.py) if successful. Errors are raised as
+        described in _request_raw().
+
+        If any hooks are attached, each phase of the request is timed and
+        the hooks are called with a RequestEvent, whether the request
+        succeeded or not. The event argument is used by
+        _response_from_endpoint() to pass along the time it spent composing
+        the url.
+
+        If key is given and .revalidate is set, the request is made
+        conditional on the response kept under key, as described under
+        Conditional requests above.
+        """
+
+        revalidate = self.revalidate if key is not None else None
+        if event is None:
+            if not self._hooks and revalidate is None:
+                blob = self._fetch(request_url)
+                return self.json_to_cicero_object(json.loads(blob))
+            event = RequestEvent(request_url.split('?', 1)[0])
+
+        entry = validators = None
+        if revalidate is not None:
+            entry = revalidate.get(key)
+            validators = dict(entry[0]) if entry is not None else {}
+
+        event.url = request_url
+        event.request_bytes = len(request_url)
+        try:
+            start = _timer()
+            blob = self._fetch(request_url, event, validators)
+            decode_start = _timer()
+            event.network_time = decode_start - start
+            root = None
+            if revalidate is not None:
+                # unchanged if the API says so, or if the body is the same
+                digest = (entry[1] if blob is None else
+                          hashlib.sha1(to_bytes(blob)).digest())
+                if entry is not None and digest == entry[1]:
+                    root = entry[2]
+                    event.revalidated = True
+            if root is None:
+                event.response_bytes = len(blob)
+                json_dict = json.loads(blob)
+                parse_start = _timer()
+                event.decode_time = parse_start - decode_start
+                root = self.json_to_cicero_object(json_dict)
+                event.parse_time = _timer() - parse_start
+            else:
+                event.response_bytes = len(blob) if blob is not None else 0
+            event.result = root
+        except (CiceroError, NetworkError) as e:
+            if not event.network_time:
+                event.network_time = _timer() - start
+            event.error = e
+            self._emit(event)
+            raise
+
+        if revalidate is not None:
+            revalidate.set(key, (validators, digest, root))
+        self._emit(event)
+        return root
+
+    def _response_from_endpoint(self, endpoint, args, path=None,
+                                authenticate=True):
         """
         # _response_from_endpoint()
         
         Uses the previous two functions (_compose_request_url() and
         _submit_request()) to compose a url for Cicero, request it, and
         return the API response.
+
+        If the connection has a cache, responses are cached by endpoint and
+        query (but not user id or token), and a cached response is returned
+        without making a request. If it has a negative cache, empty responses
+        and client errors are kept there instead, as described under Negative
+        caching above.
+        """
+        if self.cache is None and self.negative_cache is None:
+            return self._request_from_endpoint(endpoint, args, path,
+                                               authenticate)
+        return self._cached_response(
+            endpoint, _cache_key(endpoint, args, path),
+            lambda: self._request_from_endpoint(endpoint, args, path,
+                                                authenticate))
+
+    def _cached_response(self, endpoint, key, request):
+        """
+        # _cached_response()
+
+        The response for key from .negative_cache or .cache, or else
+        request(), which returns a RootCiceroObject, with its response or
+        error kept in them as described under Caching and Negative caching
+        above.
+        """
+        cache = self.cache
+        negative_cache = self.negative_cache
+        if endpoint in _UNCACHED_ENDPOINTS:
+            return request()
+        if negative_cache is not None:
+            known = negative_cache.get(key)
+            if known is not None:
+                return self._cache_hit(endpoint, known)
+        if cache is not None:
+            root = cache.get(key)
+            if root is not None:
+                return self._cache_hit(endpoint, root)
+
+        try:
+            root = request()
+        except CiceroError as e:
+            if negative_cache is not None and _known_failure(e):
+                negative_cache.set(key, (e.error_list, e.status_code))
+            raise
+        if negative_cache is not None and _is_empty(root):
+            negative_cache.set(key, root)
+        elif cache is not None:
+            cache.set(key, root)
+        return root
+
+    def _cache_hit(self, endpoint, cached):
+        # a response from the cache, or an error from the negative cache,
+        # as an (error list, status code) pair, which is raised
+        error = None
+        if type(cached) is tuple:
+            error = CiceroError({'response': {'errors': cached[0]},
+                                 'status_code': cached[1]})
+        if self._hooks:
+            event = RequestEvent(endpoint)
+            event.cache_hit = True
+            event.error = error
+            if error is None:
+                event.result = cached
+            self._emit(event)
+        if error is not None:
+            raise error
+        return cached
+
+    def _request_from_endpoint(self, endpoint, args, path, authenticate):
+        key = (_cache_key(endpoint, args, path)
+               if self.revalidate is not None else None)
+        if not self._hooks:
+            url = self._compose_request_url(endpoint, args, path, authenticate)
+            return self._submit_request(url, key=key)
+
+        event = RequestEvent(endpoint)
+        start = _timer()
+        url = self._compose_request_url(endpoint, args, path, authenticate)
+        event.compose_time = _timer() - start
+        return self._submit_request(url, event, key)
+
+    def batch_request(self, endpoint, queries, **options):
+        """
+        # batch_request(endpoint, queries, **options)
+
+        Requests endpoint concurrently once for each dictionary of query
+        arguments in queries, and returns a list of the responses in the same
+        order, with the CiceroError or NetworkError in place of any request
+        that failed. Options are described in cicero_batch.py: max_workers,
+        parse_processes and process_pool to decode and parse responses in
+        worker processes, fields to return flattened rows instead of
+        RootCiceroObjects, journal (and keys) to record requests in a
+        Journal (defined in cicero_journal.py) and replay them on restart,
+        and limiter to adapt the requests in flight to how the API copes
+        (see cicero_concurrency.py).
+        For example,
+
+            cicero.batch_request(OFFICIAL_ENDPOINT,
+                                 [{'search_loc': address} for address in addresses],
+                                 max_workers=16, parse_processes=4,
+                                 fields=['first_name', 'last_name',
+                                         'office.district.district_type'])
+
+        Responses parsed in worker processes are always RootCiceroObjects,
+        even if json_to_cicero_object() is overridden.
         """
-        url = self._compose_request_url(endpoint, args)
-        return self._submit_request(url)
+        from . import cicero_batch  # loads multiprocessing, so only when used
+        return cicero_batch.batch_request(self, endpoint, queries, **options)
 
 class CiceroRestConnection(CiceroRestABC):
     """
@@ -160,6 +621,8 @@ class CiceroRestConnection(CiceroRestABC):
         [/nonlegislative_district](https://cicero.azavea.com/docs/district.html)
     +   get_map(*kwargs) -
         [/map](https://cicero.azavea.com/docs/map.html)
+    +   get_officials_by_ids(ids), get_districts_by_ids(ids) -
+        /official or /legislative_district for many ids at once
     +   get_district_type() -
         [/district_type](https://cicero.azavea.com/docs/district_type.html)
     +   get_account_credits_remaining() -
@@ -216,40 +679,46 @@ class CiceroRestConnection(CiceroRestABC):
 
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, cache=None):
         """
-        # __init__(username, password)
+        # __init__(username, password, cache=None)
 
         We initialize the CiceroRestConnection class with a username and
         password. These are then encoded as POST data, and POSTED to the
         TOKEN_ENDPOINT. The response contains a numerical User ID and a token,
         (stored in self.user_id and self.token) which we use for
         subsequent calls to the API.
+
+        Optionally, pass a ResponseCache (defined in cicero_cache.py) as cache
+        to answer repeated queries without calling the API again, like:
+
+            CiceroRestConnection(username, password,
+                                 cache=ResponseCache(max_entries=10000, ttl=3600))
         """
         self.username = username
         self.password = password
+        if cache is not None:
+            self.cache = cache
 
         # TODO: add functionality for API keys in addition to tokens
-        login_params = urllib.urlencode({
+        login_params = to_bytes(urlencode({
             'username': self.username,
             'password': self.password
-        })
+        }))
 
         try:
             #getting a token is the only POST request in Cicero, so we will
             #POST the login_params rather than concatenating them to the
             #TOKEN_ENDPOINT
-            token_request = urllib2.Request(TOKEN_ENDPOINT, login_params)
-            token_response = urllib2.urlopen(token_request).read()
+            token_request = cicero_compat.Request(TOKEN_ENDPOINT, login_params)
+            token_response = native_str(
+                cicero_compat.urlopen(token_request).read())
             token_json = json.loads(token_response)
             self.user_id = token_json['user']
             self.token = token_json['token']
-        except urllib2.HTTPError as e:
-            token_error_blob = e.read()
-            token_error_dict = json.loads(token_error_blob)
-            token_error_dict['status_code'] = e.code
-            raise CiceroError(token_error_dict)
-        except urllib2.URLError as e:
+        except cicero_compat.HTTPError as e:
+            raise _cicero_error(e)
+        except cicero_compat.URLError as e:
             raise NetworkError(_NETWORK_ERROR, e.reason)
 
     def get_election_event(self, **kwargs):
@@ -305,6 +774,38 @@ class CiceroRestConnection(CiceroRestABC):
         """
         return self._response_from_endpoint(NONLEGISLATIVE_DISTRICT_ENDPOINT, kwargs)
 
+    def get_officials_by_ids(self, ids, ids_per_request=20, max_workers=8,
+                             **kwargs):
+        """
+        # get_officials_by_ids(ids, ids_per_request=20, max_workers=8, **kwargs)
+
+        Fetches many officials by their Cicero unique ids at once, and returns
+        a dictionary of id to OfficialObject. Duplicate ids are requested only
+        once, ids already in this connection's cache are not requested at all,
+        and the rest are packed up to ids_per_request at a time into OR queries
+        sent concurrently (see hydrate_by_ids() in cicero_batch.py). Ids which
+        can't be found are left out of the dictionary.
+        """
+        from . import cicero_batch
+        return cicero_batch.hydrate_by_ids(
+            self, OFFICIAL_ENDPOINT, 'officials', ids, ids_per_request,
+            max_workers, **kwargs)
+
+    def get_districts_by_ids(self, ids, endpoint=LEGISLATIVE_DISTRICT_ENDPOINT,
+                             ids_per_request=20, max_workers=8, **kwargs):
+        """
+        # get_districts_by_ids(ids, endpoint=LEGISLATIVE_DISTRICT_ENDPOINT,
+        #                      ids_per_request=20, max_workers=8, **kwargs)
+
+        Like get_officials_by_ids(), but for districts, returning a dictionary
+        of id to DistrictObject. Pass endpoint=NONLEGISLATIVE_DISTRICT_ENDPOINT
+        for nonlegislative districts.
+        """
+        from . import cicero_batch
+        return cicero_batch.hydrate_by_ids(
+            self, endpoint, 'districts', ids, ids_per_request, max_workers,
+            **kwargs)
+
     def get_map(self, **kwargs):
         """
         # get_map(**kwargs)
@@ -358,10 +859,7 @@ class CiceroRestConnection(CiceroRestABC):
         for more info.
         """
 
-        url = (DISTRICT_TYPE_ENDPOINT + '?user=' +
-               str(self.user_id) + '&token=' +
-               str(self.token) + '&f=json')
-        return self._submit_request(url)
+        return self._response_from_endpoint(DISTRICT_TYPE_ENDPOINT, {})
 
     def get_account_credits_remaining(self):
         """
@@ -377,10 +875,7 @@ class CiceroRestConnection(CiceroRestABC):
         for more info.
         """
 
-        url = (ACCOUNT_CREDITS_REMAINING_ENDPOINT +
-               '?user=' + str(self.user_id) +
-               '&token=' + str(self.token) + '&f=json')
-        return self._submit_request(url)
+        return self._response_from_endpoint(ACCOUNT_CREDITS_REMAINING_ENDPOINT, {})
 
     def get_account_usage(self, first_time, second_time=""):
         """
@@ -415,6 +910,9 @@ class CiceroRestConnection(CiceroRestABC):
                get_account_usage("2012", "2013")
                 any of these will return usage history within the given timeframe.
 
+        To poll usage over long ranges, UsageHistory (in cicero_usage.py)
+        caches finished months and only requests the months it lacks.
+
         See [the Cicero API docs](https://cicero.azavea.com/docs/usage.html)
         for more info.
         """
@@ -422,11 +920,7 @@ class CiceroRestConnection(CiceroRestABC):
         path = (first_time + '/to/' + second_time
                 if second_time
                 else first_time)
-        url = (ACCOUNT_USAGE_ENDPOINT + '/' + path +
-               '?user=' + str(self.user_id) +
-               '&token=' + str(self.token) +
-               '&f=json')
-        return self._submit_request(url)
+        return self._response_from_endpoint(ACCOUNT_USAGE_ENDPOINT, {}, path)
 
     def get_version(self):
         """
@@ -442,5 +936,5 @@ class CiceroRestConnection(CiceroRestABC):
         for more info.
         """
 
-        version_request_url = VERSION_ENDPOINT + '?f=json'
-        return self._submit_request(version_request_url)
+        return self._response_from_endpoint(VERSION_ENDPOINT, {},
+                                            authenticate=False)
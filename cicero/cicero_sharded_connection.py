@@ -0,0 +1,145 @@
+"""
+This file defines ShardedCiceroConnection, which spreads requests over
+several Cicero accounts, each with its own pool of credits, while offering
+the same get_*() and batch_request() methods as a CiceroRestConnection.
+
+    cicero = ShardedCiceroConnection([('user_a', 'password_a'),
+                                      ('user_b', 'password_b')],
+                                     strategy='credits')
+    cicero.get_official(search_loc='340 N 12th St, Philadelphia, PA USA')
+
+Request urls are composed as usual, and when each is sent the account's user
+id and token in it are swapped for those of the account chosen to send it:
+by smooth weighted round-robin over the accounts' weights, which are either
+given or, with strategy="credits", each account's remaining credits. An
+account whose request fails with a network error, an authentication error,
+rate limiting or a server error is skipped for cooldown seconds, and the
+request is sent again with the next account.
+"""
+
+import threading
+import time
+
+from .cicero_rest_connection import CiceroRestConnection
+from .cicero_errors import CiceroError, NetworkError
+
+
+def _auth_query(connection):
+    return ('?user=' + str(connection.user_id) + '&token=' +
+            str(connection.token) + '&f=json')
+
+
+def _fails_over(error):
+    # errors which another account may well not get
+    return (isinstance(error, NetworkError) or
+            error.status_code in (401, 403, 429) or error.status_code >= 500)
+
+
+class ShardedCiceroConnection(CiceroRestConnection):
+    """
+    # ShardedCiceroConnection(accounts, weights=None, strategy="round_robin",
+    #                         cooldown=30, cache=None)
+
+    accounts is a list of CiceroRestConnections, or of (username, password)
+    pairs to authenticate. weights, if given, is a relative weight for each
+    account (by default they are equal). With strategy="credits", the weights
+    are instead set by refresh_weights().
+
+    ## Available Attributes and Methods:
+
+    +   .shards (list of CiceroRestConnections)
+    +   .weights (list of numbers)
+    +   .requests (list of integers) - requests sent with each account
+    +   .refresh_weights() - set each account's weight to its credit balance
+            (as reported by get_account_credits_remaining()), or 0 if it
+            can't be fetched, and return the weights
+    +   .get_*(), batch_request() - as for CiceroRestConnection
+
+    The /account endpoints (get_account_credits_remaining() and
+    get_account_usage()) answer for whichever account the request is sent
+    with; call them on .shards[i] for a particular account.
+    """
+
+    def __init__(self, accounts, weights=None, strategy='round_robin',
+                 cooldown=30, cache=None):
+        if not accounts:
+            raise ValueError('ShardedCiceroConnection needs at least one account')
+        self.shards = [a if isinstance(a, CiceroRestConnection)
+                       else CiceroRestConnection(*a) for a in accounts]
+        if cache is not None:
+            self.cache = cache
+        self.cooldown = cooldown
+        self.requests = [0] * len(self.shards)
+        self._current = [0] * len(self.shards)
+        self._down_until = [0] * len(self.shards)
+        self._lock = threading.Lock()
+
+        # urls are composed with the first account, then re-authenticated
+        # for the account chosen to send them
+        primary = self.shards[0]
+        self.username = primary.username
+        self.password = primary.password
+        self.user_id = primary.user_id
+        self.token = primary.token
+
+        if strategy == 'credits':
+            self.refresh_weights()
+        elif strategy == 'round_robin':
+            self.weights = list(weights or [1] * len(self.shards))
+        else:
+            raise ValueError('unknown strategy %r' % strategy)
+
+    def refresh_weights(self):
+        weights = []
+        for shard in self.shards:
+            try:
+                results = shard.get_account_credits_remaining().response.results
+                weights.append(max(0, results.credit_balance))
+            except (CiceroError, NetworkError):
+                weights.append(0)
+        self.weights = weights
+        return weights
+
+    def _order(self):
+        """
+        Returns the indexes of the shards to try for one request: the next by
+        smooth weighted round-robin first, then the rest that are up, by
+        weight, then those cooling down. Shards with no weight are only used
+        if every other shard has failed.
+        """
+        now = time.time()
+        with self._lock:
+            up = [i for i in range(len(self.shards))
+                  if self._down_until[i] <= now and self.weights[i] > 0]
+            if up:
+                total = 0
+                for i in up:
+                    self._current[i] += self.weights[i]
+                    total += self.weights[i]
+                first = max(up, key=lambda i: self._current[i])
+                self._current[first] -= total
+                up.remove(first)
+                up.insert(0, first)
+        rest = sorted((i for i in range(len(self.shards)) if i not in up),
+                      key=lambda i: (self._down_until[i], -self.weights[i]))
+        return up + rest
+
+    def _request_raw(self, request_url, validators=None):
+        auth = _auth_query(self)
+        error = None
+        for i in self._order():
+            shard = self.shards[i]
+            url = request_url
+            if auth in url:
+                url = url.replace(auth, _auth_query(shard), 1)
+            try:
+                with self._lock:
+                    self.requests[i] += 1
+                return shard._fetch(url, validators=validators)
+            except (CiceroError, NetworkError) as e:
+                if not _fails_over(e):
+                    raise
+                error = e
+                with self._lock:
+                    self._down_until[i] = time.time() + self.cooldown
+        raise error
@@ -0,0 +1,234 @@
+"""
+This file defines LocalStore, an in-memory store of the OfficialObjects and
+DistrictObjects from Cicero API responses, with secondary indexes so common
+lookups - officials by last name, party, district type, state or chamber, and
+districts by type or state - are answered offline, without an API request.
+
+    store = LocalStore('cicero_store.json')
+    store.add(cicero.get_official(state='PA', max=200))
+    store.find_officials(last_name='*e*ning*', district_type='STATE_LOWER')
+    store.save()
+
+A LocalStore can also be kept up to date from the change feed of an
+OfficialSync (see cicero_sync.py) with .apply(changes).
+"""
+
+import os
+import re
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_response_classes import (AbstractCiceroObject, OfficialObject,
+                                     DistrictObject)
+
+
+"""
+Attributes the response classes derive from others while parsing, rather
+than copy from the JSON.
+"""
+_DERIVED = ('identifiers_by_type',)
+
+
+def _to_json(value):
+    # The response classes keep their JSON keys as attribute names, so an
+    # object's __dict__ is (recursively) the JSON it was parsed from.
+    if isinstance(value, AbstractCiceroObject):
+        return dict((k, _to_json(v)) for k, v in value.__dict__.items()
+                    if k not in _DERIVED)
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _wildcard(pattern):
+    # Cicero's wildcard syntax: * matches any run of characters, and matching
+    # is case-insensitive. Nothing else is special.
+    return re.compile('.*'.join(re.escape(p) for p in pattern.lower().split('*'))
+                      + r'\Z')
+
+
+class _Index(object):
+    # value -> set of ids, for one attribute of the stored objects. The value
+    # each id was indexed under is remembered, so an object changed in place
+    # before being added again is still unindexed correctly.
+
+    def __init__(self, key):
+        self.key = key
+        self.ids = {}
+        self.values = {}
+
+    def add(self, obj):
+        value = self.values[obj.id] = self.key(obj)
+        self.ids.setdefault(value, set()).add(obj.id)
+
+    def remove(self, obj):
+        value = self.values.pop(obj.id, None)
+        ids = self.ids.get(value)
+        if ids is not None:
+            ids.discard(obj.id)
+            if not ids:
+                del self.ids[value]
+
+    def lookup(self, value):
+        return self.ids.get(value, ())
+
+
+class _LastNameIndex(_Index):
+
+    def __init__(self):
+        _Index.__init__(self, lambda o: (o.last_name or '').lower())
+        self._patterns = {}
+
+    def lookup(self, pattern):
+        pattern = pattern.lower()
+        if '*' not in pattern:
+            return self.ids.get(pattern, ())
+        regex = self._patterns.get(pattern)
+        if regex is None:
+            regex = self._patterns[pattern] = _wildcard(pattern)
+        # scan the distinct last names, not every official
+        matched = set()
+        for name, ids in self.ids.items():
+            if regex.match(name):
+                matched.update(ids)
+        return matched
+
+
+def _official_district(official):
+    return official.office.district
+
+
+class LocalStore(object):
+    """
+    # LocalStore(path=None)
+
+    Stores officials and districts by Cicero id, optionally saved to and
+    loaded from a JSON file at path. Adding an object with an id already in
+    the store replaces it.
+
+    ## Available Methods:
+
+    +   .add(root) - add every official and district (including the district
+            of each official's office) in a RootCiceroObject
+    +   .add_official(official), .add_district(district)
+    +   .remove_official(official_id), .remove_district(district_id)
+    +   .apply(changes) - apply a list of ChangeEvents from OfficialSync
+    +   .get_official(official_id), .get_district(district_id) - the stored
+            object, or None
+    +   .find_officials(last_name=None, party=None, district_type=None,
+            state=None, chamber=None, chamber_type=None) - list of
+            OfficialObjects matching every argument given, by id. last_name
+            is case-insensitive and may use * wildcards, like "*e*ning*".
+            chamber is a chamber id, chamber_type is "UPPER", "LOWER" or "EXEC".
+    +   .find_districts(district_type=None, state=None) - list of
+            DistrictObjects matching every argument given, by id
+    +   .save() - write the store to path
+    +   .officials, .districts (dictionaries) - id to object
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.officials = {}
+        self.districts = {}
+        self._official_indexes = {
+            'last_name': _LastNameIndex(),
+            'party': _Index(lambda o: o.party),
+            'district_type': _Index(lambda o: _official_district(o).district_type),
+            'state': _Index(lambda o: _official_district(o).state),
+            'chamber': _Index(lambda o: o.office.chamber.id),
+            'chamber_type': _Index(lambda o: o.office.chamber.type),
+        }
+        self._district_indexes = {
+            'district_type': _Index(lambda d: d.district_type),
+            'state': _Index(lambda d: d.state),
+        }
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            for official_dict in saved['officials']:
+                self.add_official(OfficialObject(official_dict))
+            for district_dict in saved['districts']:
+                self.add_district(DistrictObject(district_dict))
+
+    def _put(self, objects, indexes, obj):
+        old = objects.get(obj.id)
+        if old is not None:
+            for index in indexes.values():
+                index.remove(old)
+        objects[obj.id] = obj
+        for index in indexes.values():
+            index.add(obj)
+
+    def _pop(self, objects, indexes, object_id):
+        old = objects.pop(object_id, None)
+        if old is not None:
+            for index in indexes.values():
+                index.remove(old)
+
+    def add_official(self, official):
+        self._put(self.officials, self._official_indexes, official)
+
+    def add_district(self, district):
+        self._put(self.districts, self._district_indexes, district)
+
+    def remove_official(self, official_id):
+        self._pop(self.officials, self._official_indexes, official_id)
+
+    def remove_district(self, district_id):
+        self._pop(self.districts, self._district_indexes, district_id)
+
+    def add(self, root):
+        results = root.response.results
+        for holder in getattr(results, 'candidates', None) or [results]:
+            for official in getattr(holder, 'officials', ()):
+                self.add_official(official)
+                self.add_district(official.office.district)
+            for district in getattr(holder, 'districts', ()):
+                self.add_district(district)
+
+    def apply(self, changes):
+        for change in changes:
+            if change.kind == 'vacated':
+                self.remove_official(change.official_id)
+            else:
+                official = OfficialObject(change.new)
+                self.add_official(official)
+                self.add_district(official.office.district)
+
+    def get_official(self, official_id):
+        return self.officials.get(official_id)
+
+    def get_district(self, district_id):
+        return self.districts.get(district_id)
+
+    def _find(self, objects, indexes, criteria):
+        matches = [indexes[name].lookup(value)
+                   for name, value in criteria.items() if value is not None]
+        if not matches:
+            ids = objects
+        else:
+            matches.sort(key=len)
+            ids = set(matches[0])
+            for other in matches[1:]:
+                ids.intersection_update(other)
+                if not ids:
+                    break
+        return [objects[i] for i in sorted(ids)]
+
+    def find_officials(self, last_name=None, party=None, district_type=None,
+                       state=None, chamber=None, chamber_type=None):
+        return self._find(self.officials, self._official_indexes, {
+            'last_name': last_name, 'party': party,
+            'district_type': district_type, 'state': state,
+            'chamber': chamber, 'chamber_type': chamber_type})
+
+    def find_districts(self, district_type=None, state=None):
+        return self._find(self.districts, self._district_indexes, {
+            'district_type': district_type, 'state': state})
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'officials': _to_json(list(self.officials.values())),
+                       'districts': _to_json(list(self.districts.values()))}, f)
@@ -0,0 +1,237 @@
+"""
+This file defines an incremental sync of elected officials from the Cicero
+API into a local store, so a nightly refresh only downloads the officials
+which changed since the last one.
+
+An OfficialStore keeps the raw JSON of each official, keyed by Cicero id, and
+a "watermark": the latest last_update_date of any official it has seen. Each
+OfficialSync.sync() asks the /official endpoint only for officials updated
+on or after the watermark (paging through the results), compares them with
+the store, applies the differences and records them in a change feed of
+ChangeEvents:
+
++   "added" - an official not in the store before
++   "new_term" - an official whose surrogate key (sk) changed, ie a new
+    historical record, such as a new term of office
++   "updated" - any other change to an official's record
++   "vacated" - an official whose valid_to date has passed, which is removed
+    from the store
+
+/official only returns officials valid now, and a term coming to its end
+needn't change an official's last_update_date, so an official whose term
+has ended may never be returned again. After applying what it fetched,
+sync() therefore also sweeps the store for officials whose valid_to has
+passed, and vacates those too.
+
+    store = OfficialStore('officials.json')
+    sync = OfficialSync(cicero, store, query={'district_type': 'STATE_LOWER'})
+    for change in sync.sync():
+        print(change.kind, change.official_id)
+    store.save()
+"""
+
+import os
+import time
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_endpoint_constants import OFFICIAL_ENDPOINT
+from .cicero_response_classes import OfficialObject
+
+
+def _now():
+    # Cicero datetimes are "YYYY-MM-DD HH:MM:SS" strings, which sort as text
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+class OfficialStore(object):
+    """
+    # OfficialStore(path=None)
+
+    A local store of officials' raw JSON, keyed by Cicero id, optionally
+    saved to and loaded from a JSON file at path.
+
+    ## Available Attributes and Methods:
+
+    +   .watermark (string) - latest last_update_date synced, or None
+    +   .get(official_id) - an OfficialObject for official_id, or None
+    +   .get_raw(official_id) - the official's raw JSON dictionary, or None
+    +   .put(official_dict), .remove(official_id)
+    +   .save() - write the store to path
+    +   len(store), official_id in store, iterating over ids
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.watermark = None
+        self._officials = {}
+        self._parsed = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.watermark = saved['watermark']
+            for official_dict in saved['officials']:
+                self._officials[official_dict['id']] = official_dict
+
+    def get_raw(self, official_id):
+        return self._officials.get(official_id)
+
+    def get(self, official_id):
+        official = self._parsed.get(official_id)
+        if official is None and official_id in self._officials:
+            official = self._parsed[official_id] = OfficialObject(
+                self._officials[official_id])
+        return official
+
+    def put(self, official_dict):
+        self._officials[official_dict['id']] = official_dict
+        self._parsed.pop(official_dict['id'], None)
+
+    def remove(self, official_id):
+        self._officials.pop(official_id, None)
+        self._parsed.pop(official_id, None)
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'watermark': self.watermark,
+                       'officials': list(self._officials.values())}, f)
+
+    def __len__(self):
+        return len(self._officials)
+
+    def __contains__(self, official_id):
+        return official_id in self._officials
+
+    def __iter__(self):
+        return iter(list(self._officials))
+
+
+class ChangeEvent(object):
+    """
+    # ChangeEvent
+
+    One change applied to an OfficialStore by OfficialSync.sync().
+
+    ## Available Attributes:
+
+    +   .kind (string) - "added", "new_term", "updated" or "vacated"
+    +   .official_id (integer) - Cicero unique ID of the official
+    +   .old (dictionary) - the official's raw JSON before, or None if added
+    +   .new (dictionary) - the official's raw JSON after the change
+    """
+
+    def __init__(self, kind, official_id, old, new):
+        self.kind = kind
+        self.official_id = official_id
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__, self.kind,
+                               self.official_id)
+
+
+class OfficialSync(object):
+    """
+    # OfficialSync(connection, store, query=None, page_size=100,
+    #              watermark_param="last_update_date_on_or_after")
+
+    Syncs the officials matching query (a dictionary of /official query
+    arguments, like {'state': 'PA'}) from connection into store. Only
+    officials updated on or after the store's watermark are requested, using
+    the watermark_param query argument. The first sync, with no watermark,
+    downloads every matching official.
+
+    ## Available Attributes and Methods:
+
+    +   .sync() - fetch and apply changes, and vacate officials in the store
+            whose valid_to has passed, returning the list of ChangeEvents
+    +   .changes (list of ChangeEvents) - the change feed of every sync so
+            far, including the changes a sync cut short by an error had
+            already applied
+    +   .changes_since(position) - ChangeEvents after the first position
+            entries of the feed, so a consumer can remember len(sync.changes)
+            and later pick up where it left off
+    """
+
+    def __init__(self, connection, store, query=None, page_size=100,
+                 watermark_param='last_update_date_on_or_after'):
+        self.connection = connection
+        self.store = store
+        self.query = dict(query or {})
+        self.page_size = page_size
+        self.watermark_param = watermark_param
+        self.changes = []
+
+    def _fetch_updated(self):
+        query = dict(self.query)
+        if self.store.watermark:
+            query[self.watermark_param] = self.store.watermark
+        query['max'] = self.page_size
+        offset = 0
+        while True:
+            query['offset'] = offset
+            url = self.connection._compose_request_url(OFFICIAL_ENDPOINT, query)
+            results = json.loads(
+                self.connection._fetch(url))['response']['results']
+
+            page = list(results.get('officials', ()))
+            for candidate in results.get('candidates', ()):
+                page.extend(candidate['officials'])
+            for official_dict in page:
+                yield official_dict
+
+            offset += len(page)
+            total = results.get('count', {}).get('total', 0)
+            if not page or offset >= total:
+                break
+
+    def _diff(self, old, new, now):
+        if new['valid_to'] and new['valid_to'] <= now:
+            return 'vacated' if old is not None else None
+        if old is None:
+            return 'added'
+        if old['sk'] != new['sk']:
+            return 'new_term'
+        if old['last_update_date'] != new['last_update_date'] or old != new:
+            return 'updated'
+        return None
+
+    def _apply(self, applied, change):
+        # into the feed at once, so a sync cut short by an error keeps the
+        # changes it already made to the store
+        applied.append(change)
+        self.changes.append(change)
+
+    def sync(self):
+        now = _now()
+        watermark = self.store.watermark
+        applied = []
+        for new in self._fetch_updated():
+            old = self.store.get_raw(new['id'])
+            kind = self._diff(old, new, now)
+            if new['last_update_date'] and (
+                    watermark is None or new['last_update_date'] > watermark):
+                watermark = new['last_update_date']
+            if kind is None:
+                continue
+            if kind == 'vacated':
+                self.store.remove(new['id'])
+            else:
+                self.store.put(new)
+            self._apply(applied, ChangeEvent(kind, new['id'], old, new))
+
+        for official_id in self.store:
+            old = self.store.get_raw(official_id)
+            if old['valid_to'] and old['valid_to'] <= now:
+                self.store.remove(official_id)
+                self._apply(applied,
+                            ChangeEvent('vacated', official_id, old, old))
+
+        self.store.watermark = watermark
+        return applied
+
+    def changes_since(self, position):
+        return self.changes[position:]
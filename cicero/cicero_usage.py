@@ -0,0 +1,191 @@
+"""
+This file defines UsageHistory, a cache of an account's monthly usage (from
+the /account/usage endpoint, like get_account_usage()) which never asks for a
+finished month twice.
+
+Usage for a month can't change once the month is over, so UsageHistory
+splits every range it is asked for into months, keeps each finished month it
+has fetched for good (in a JSON file at path, if given), and only requests
+the months it doesn't have, along with the current month, which is requested
+every time. Missing months next to each other are fetched in one request.
+
+    history = UsageHistory(cicero, 'usage.json')
+    for month in history.get('2012', '2013'):
+        print(month.year, month.month, month.credits_used)
+    series = history.series('2012', '2013')
+    series.by_type['official']
+
+A month counts as finished a day after it ends (in UTC), so a month isn't
+cached while it may still be under way in the Cicero API's own time zone.
+"""
+
+import os
+import time
+from array import array
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from .cicero_endpoint_constants import ACCOUNT_USAGE_ENDPOINT
+from .cicero_response_classes import AccountUsageObject
+
+
+def _now():
+    return time.time()
+
+
+def _month_of(timestamp):
+    t = time.gmtime(timestamp)
+    return t.tm_year, t.tm_mon
+
+
+def _parse_time(text, last):
+    # "YYYY" or "YYYY-MM" as a (year, month) pair; a year alone is its first
+    # month, or its last if last is True
+    parts = str(text).split('-')
+    year = int(parts[0])
+    if len(parts) > 1:
+        return year, int(parts[1])
+    return year, 12 if last else 1
+
+
+def _next(month):
+    year, m = month
+    return (year + 1, 1) if m == 12 else (year, m + 1)
+
+
+def _months(first, last):
+    month = first
+    while month <= last:
+        yield month
+        month = _next(month)
+
+
+def _label(month):
+    return '%04d-%02d' % month
+
+
+class UsageSeries(object):
+    """
+    # UsageSeries
+
+    Credits used per month over a range of months, returned by
+    UsageHistory.series(). Months without usage have 0 credits.
+
+    ## Available Attributes:
+
+    +   .months (list of (year, month) pairs) - every month in the range
+    +   .credits_used (array of integers) - total credits used each month
+    +   .by_type (dictionary of activity type to array of integers) - credits
+            used each month by each activity type (ie, API endpoint)
+    """
+
+    def __init__(self, months, usage):
+        self.months = months
+        self.credits_used = array('l', [0] * len(months))
+        self.by_type = {}
+        position = dict((month, i) for i, month in enumerate(months))
+        for month_dict in usage:
+            i = position[(month_dict['year'], month_dict['month'])]
+            self.credits_used[i] = int(month_dict['credits_used'])
+            for activity in month_dict['activity_types']:
+                credits = self.by_type.get(activity['type'])
+                if credits is None:
+                    credits = self.by_type[activity['type']] = array(
+                        'l', [0] * len(months))
+                credits[i] += int(activity['credits_used'])
+
+
+class UsageHistory(object):
+    """
+    # UsageHistory(connection, path=None)
+
+    Monthly usage of the account connection is authenticated with, with
+    finished months cached in memory and, if path is given, in a JSON file
+    there, which is loaded if it exists and saved whenever a finished month
+    is added.
+
+    ## Available Attributes and Methods:
+
+    +   .get(first_time, second_time="") - list of AccountUsageObjects, one
+            per month with any usage, between first_time and second_time,
+            which are "YYYY" or "YYYY-MM" strings as for get_account_usage()
+    +   .series(first_time, second_time="") - a UsageSeries for the same
+            months
+    +   .requests (integer) - requests made to the API
+    +   .save() - write the cached months to path
+    """
+
+    def __init__(self, connection, path=None):
+        self.connection = connection
+        self.path = path
+        self.requests = 0
+        # finished months: (year, month) to the month's raw JSON, or None if
+        # the account used nothing that month
+        self._finished = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for label, month_dict in json.load(f)['months'].items():
+                    self._finished[_parse_time(label, False)] = month_dict
+
+    def save(self):
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'months': dict((_label(month), month_dict)
+                                      for month, month_dict in
+                                      self._finished.items())}, f)
+        os.rename(temp, self.path)
+
+    def _range(self, first_time, second_time):
+        first = _parse_time(first_time, False)
+        last = _parse_time(second_time or first_time, True)
+        # the API can't have usage from after today, wherever it is
+        return list(_months(first, min(last, _month_of(_now() + 86400))))
+
+    def _fetch(self, first, last):
+        path = _label(first)
+        if last != first:
+            path += '/to/' + _label(last)
+        url = self.connection._compose_request_url(ACCOUNT_USAGE_ENDPOINT, {},
+                                                   path)
+        self.requests += 1
+        results = json.loads(self.connection._fetch(url))['response']['results']
+        return dict(((m['year'], m['month']), m) for m in results)
+
+    def _usage(self, first_time, second_time):
+        months = self._range(first_time, second_time)
+        finished = _month_of(_now() - 86400)
+
+        # runs of months to fetch: those not cached, and the current month
+        runs = []
+        for month in months:
+            if month in self._finished:
+                continue
+            if runs and _next(runs[-1][-1]) == month:
+                runs[-1].append(month)
+            else:
+                runs.append([month])
+
+        usage = dict((month, self._finished[month]) for month in months
+                     if month in self._finished)
+        added = False
+        for run in runs:
+            fetched = self._fetch(run[0], run[-1])
+            for month in run:
+                month_dict = fetched.get(month)
+                usage[month] = month_dict
+                if month < finished:
+                    self._finished[month] = month_dict
+                    added = True
+        if added and self.path:
+            self.save()
+        return months, [usage[month] for month in months
+                        if usage.get(month) is not None]
+
+    def get(self, first_time, second_time=''):
+        return [AccountUsageObject(month_dict) for month_dict in
+                self._usage(first_time, second_time)[1]]
+
+    def series(self, first_time, second_time=''):
+        return UsageSeries(*self._usage(first_time, second_time))
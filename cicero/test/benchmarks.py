@@ -0,0 +1,338 @@
+"""
+This file contains offline benchmarks for python-cicero. They run against the
+recorded fixtures and a local MockCiceroServer (see mock_server.py), so they
+need neither network access nor Cicero credentials, and report operations per
+second and, where the tracemalloc module is available, peak memory allocated
+per operation.
+
+Run every benchmark with:
+
+    python -m cicero.test.benchmarks
+
+or only some of them by name, like:
+
+    python -m cicero.test.benchmarks compose_url parse
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer as _timer
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from cicero.cicero_compat import urlencode
+from cicero.cicero_rest_connection import *
+from cicero.cicero_journal import Journal
+from cicero.cicero_batch import flatten
+from cicero.cicero_projection import project, project_array
+from cicero.cicero_labels import format_label, write_labels
+from cicero.test.mock_server import *
+from cicero.test.parse_benchmarks import synthetic_response
+
+
+"""
+Fixtures used for the JSON decode and RootCiceroObject parse benchmarks.
+"""
+PARSE_FIXTURES = ('official_geocoded', 'official', 'legislative_district_geocoded',
+                  'nonlegislative_district', 'election_event', 'map',
+                  'district_type', 'account_usage')
+
+
+def measure(func, min_time=0.5):
+    """
+    # measure(func, min_time=0.5)
+
+    Calls func() repeatedly for at least min_time seconds, and returns a
+    tuple of (operations per second, peak bytes allocated by one call). The
+    peak is None when tracemalloc is unavailable.
+    """
+    func()  # warm up
+
+    count = 0
+    batch = 1
+    start = _timer()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for _ in range(batch):
+            func()
+        count += batch
+        batch *= 2
+        elapsed = _timer() - start
+    ops_per_sec = count / elapsed
+
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return ops_per_sec, peak
+
+
+def _result(name, func, min_time):
+    ops_per_sec, peak = measure(func, min_time)
+    return {'name': name, 'ops_per_sec': ops_per_sec,
+            'peak_memory_bytes': peak}
+
+
+def _legacy_compose_request_url(cicero, endpoint, kwargs):
+    # _compose_request_url() as it was before url templates, for comparison
+    if 'id' in kwargs:
+        object_id = kwargs.pop('id')
+        request_url = (endpoint + '/' + str(object_id) + '?user=' +
+                       str(cicero.user_id) + '&token=' + str(cicero.token) +
+                       '&f=json&')
+    else:
+        request_url = (endpoint + '?user=' + str(cicero.user_id) + '&token=' +
+                       str(cicero.token) + '&f=json&')
+    return request_url + urlencode(kwargs, True)
+
+
+def bench_compose_url(min_time):
+    cicero = OfflineCiceroConnection()
+    queries = (
+        ('search_loc', {'search_loc': '340 N 12th St, Philadelphia, PA USA'}),
+        ('or_query', {'search_loc': '340 N 12th St, Philadelphia, PA USA',
+                      'district_type': ('STATE_LOWER', 'STATE_UPPER')}),
+        ('id', {'id': 48853}),
+        ('none', {}),
+    )
+    results = []
+    for name, query in queries:
+        results.append(_result(
+            'compose_url[%s]' % name,
+            lambda q=query: cicero._compose_request_url(OFFICIAL_ENDPOINT, q),
+            min_time))
+        results.append(_result(
+            'compose_url_legacy[%s]' % name,
+            lambda q=query: _legacy_compose_request_url(
+                cicero, OFFICIAL_ENDPOINT, dict(q)),
+            min_time))
+    return results
+
+
+def bench_json_decode(min_time):
+    results = []
+    for name in PARSE_FIXTURES:
+        blob = load_fixture(name)
+        results.append(_result('json_decode[%s]' % name,
+                               lambda b=blob: json.loads(b), min_time))
+    return results
+
+
+def bench_parse(min_time):
+    results = []
+    for name in PARSE_FIXTURES:
+        json_dict = json.loads(load_fixture(name))
+        results.append(_result('parse[%s]' % name,
+                               lambda d=json_dict: RootCiceroObject(d),
+                               min_time))
+    return results
+
+
+def bench_transport(min_time):
+    with MockCiceroServer() as server:
+        cicero = MockCiceroConnection(server)
+        revalidating = MockCiceroConnection(server)
+        revalidating.revalidate = ResponseCache()
+        return [
+            _result('transport[official_geocoded]',
+                    lambda: cicero.get_official(
+                        search_loc='340 N 12th St, Philadelphia, PA USA'),
+                    min_time),
+            _result('transport[version]', cicero.get_version, min_time),
+            _result('transport[official_geocoded_revalidated]',
+                    lambda: revalidating.get_official(
+                        search_loc='340 N 12th St, Philadelphia, PA USA'),
+                    min_time),
+        ]
+
+
+def bench_batch_parse(min_time):
+    blob = json.dumps(synthetic_response(candidates=10))
+    cicero = OfflineCiceroConnection(blob=blob)
+    queries = [{'search_loc': '%d Synthetic St' % i} for i in range(16)]
+    fields = ['first_name', 'last_name', 'office.district.district_type']
+    processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    try:
+        return [
+            _result('batch_parse[in_process]',
+                    lambda: cicero.batch_request(OFFICIAL_ENDPOINT, queries),
+                    min_time),
+            _result('batch_parse[%d_processes]' % processes,
+                    lambda: cicero.batch_request(OFFICIAL_ENDPOINT, queries,
+                                                 process_pool=pool),
+                    min_time),
+            _result('batch_parse[%d_processes_rows]' % processes,
+                    lambda: cicero.batch_request(OFFICIAL_ENDPOINT, queries,
+                                                 process_pool=pool,
+                                                 fields=fields),
+                    min_time),
+        ]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def bench_projection(min_time):
+    json_dict = synthetic_response(candidates=10)
+    fields = ['first_name', 'last_name', 'office.district.district_type',
+              'office.chamber.name']
+    results = [
+        _result('projection[objects]',
+                lambda: flatten(RootCiceroObject(json_dict), fields), min_time),
+        _result('projection[tuples]',
+                lambda: project(json_dict, fields), min_time),
+    ]
+    if numpy is not None:
+        results.append(_result('projection[numpy]',
+                               lambda: project_array(json_dict, fields),
+                               min_time))
+    return results
+
+
+def bench_labels(min_time):
+    json_dict = synthetic_response(candidates=20)
+    officials = [o for c in RootCiceroObject(json_dict).response.results.candidates
+                 for o in c.officials]
+    addresses = [a for o in officials for a in o.addresses]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'labels.txt')
+
+    def per_object():
+        with open(path, 'w') as f:
+            for a in addresses:
+                f.write(a.get_formatted_mailing_address(county=True) + '\n\n')
+
+    try:
+        return [
+            _result('labels[per_object]', per_object, min_time),
+            _result('labels[format_label]',
+                    lambda: [format_label(a, True) for a in addresses],
+                    min_time),
+            _result('labels[write_labels]',
+                    lambda: write_labels(addresses, path, county=True),
+                    min_time),
+            _result('labels[write_labels_csv]',
+                    lambda: write_labels(officials, path, county=True,
+                                         output_format='csv'),
+                    min_time),
+        ]
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_journal(min_time):
+    cicero = OfflineCiceroConnection()
+    queries = [{'search_loc': '%d Main St' % i} for i in range(64)]
+    directory = tempfile.mkdtemp()
+    replay_path = os.path.join(directory, 'replay.journal')
+    with Journal(replay_path) as journal:
+        cicero.batch_request(OFFICIAL_ENDPOINT, queries, journal=journal)
+
+    def record():
+        path = os.path.join(directory, 'record.journal')
+        with Journal(path) as journal:
+            cicero.batch_request(OFFICIAL_ENDPOINT, queries, journal=journal)
+        os.remove(path)
+        os.remove(path + '.data')
+
+    def replay():
+        with Journal(replay_path) as journal:
+            cicero.batch_request(OFFICIAL_ENDPOINT, queries, journal=journal)
+
+    try:
+        return [
+            _result('journal[none]',
+                    lambda: cicero.batch_request(OFFICIAL_ENDPOINT, queries),
+                    min_time),
+            _result('journal[record]', record, min_time),
+            _result('journal[replay]', replay, min_time),
+        ]
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_import(min_time):
+    # Each operation is a fresh interpreter, so compare against the baseline
+    # of one that imports nothing, to see what importing python-cicero costs.
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    scripts = (
+        ('baseline', 'pass'),
+        ('cicero', 'import cicero'),
+        ('connection', 'import cicero; cicero.CiceroRestConnection'),
+    )
+    return [_result('import[%s]' % name,
+                    lambda s=script: subprocess.check_call(
+                        [sys.executable, '-c', s], cwd=root),
+                    min_time)
+            for name, script in scripts]
+
+
+BENCHMARKS = (
+    ('compose_url', bench_compose_url),
+    ('json_decode', bench_json_decode),
+    ('parse', bench_parse),
+    ('transport', bench_transport),
+    ('batch_parse', bench_batch_parse),
+    ('projection', bench_projection),
+    ('labels', bench_labels),
+    ('journal', bench_journal),
+    ('import', bench_import),
+)
+
+
+def format_results(results):
+    lines = ['%-50s %14s %16s' % ('benchmark', 'ops/sec', 'peak bytes/op')]
+    for r in results:
+        peak = r['peak_memory_bytes']
+        lines.append('%-50s %14.1f %16s' % (
+            r['name'], r['ops_per_sec'], 'n/a' if peak is None else peak))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run offline python-cicero benchmarks.')
+    parser.add_argument('benchmarks', nargs='*',
+                        help='names of benchmarks to run (default: all): %s' %
+                        ', '.join(name for name, _ in BENCHMARKS))
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds to run each benchmark for')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, bench in BENCHMARKS:
+        if not args.benchmarks or name in args.benchmarks:
+            results.extend(bench(args.min_time))
+
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=1) + '\n')
+    else:
+        sys.stdout.write(format_results(results) + '\n')
+
+
+if __name__ == '__main__':
+    main()
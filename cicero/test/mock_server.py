@@ -0,0 +1,292 @@
+"""
+This file defines a local stand-in for the Cicero API, so python-cicero can be
+tested and benchmarked without network access or Cicero credentials.
+
+MockCiceroServer answers every Cicero endpoint with a recorded JSON response
+from the fixtures folder next to this file, optionally after a configurable
+delay, and can inject HTTP errors at random or on demand. Responses carry an
+ETag, and conditional requests for an unchanged response are answered with
+304 Not Modified.
+MockCiceroConnection is a CiceroRestConnection which authenticates with, and
+sends all of its requests to, a MockCiceroServer instead of cicero.azavea.com.
+
+    with MockCiceroServer(latency=0.05) as server:
+        cicero = MockCiceroConnection(server)
+        cicero.get_official(search_loc="340 N 12th St, Philadelphia, PA USA")
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from cicero.cicero_compat import (urlencode, urlparse, parse_qs, Request,
+                                  urlopen, native_str, to_bytes)
+from cicero.cicero_rest_connection import *
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures')
+
+"""
+Maps the path of each endpoint (relative to the API version) to the name of
+its fixture. Requests with a search_loc (or other search_*) query use the
+"<name>_geocoded" fixture instead, when there is one.
+"""
+ROUTES = (
+    ('token/new.json', 'token'),
+    ('official', 'official'),
+    ('legislative_district', 'legislative_district'),
+    ('nonlegislative_district', 'nonlegislative_district'),
+    ('election_event', 'election_event'),
+    ('map', 'map'),
+    ('district_type', 'district_type'),
+    ('account/credits_remaining', 'account_credits_remaining'),
+    ('account/usage', 'account_usage'),
+    ('version', 'version'),
+)
+
+_GEOCODING_PARAMS = ('search_loc', 'search_address', 'search_city',
+                     'search_postal')
+
+
+def load_fixture(name):
+    """
+    # load_fixture(name)
+
+    Returns the raw JSON text of the named fixture, like "official_geocoded".
+    """
+    with open(os.path.join(FIXTURES_DIR, name + '.json'), 'rb') as f:
+        return native_str(f.read())
+
+
+def _has_fixture(name, fixtures):
+    return (name in fixtures or
+            os.path.exists(os.path.join(FIXTURES_DIR, name + '.json')))
+
+
+def route(path_and_query, fixtures=()):
+    """
+    # route(path_and_query, fixtures=())
+
+    Returns the name of the fixture answering a request url or path (with its
+    query string), or None if it isn't a Cicero endpoint. Names in fixtures
+    are considered as well as the recorded fixtures.
+    """
+    parsed = urlparse(path_and_query)
+    path = parsed.path.lstrip('/')
+    version_prefix = VERSION + '/'
+    if version_prefix in path:
+        path = path[path.index(version_prefix) + len(version_prefix):]
+    query = parse_qs(parsed.query)
+
+    for endpoint_path, name in ROUTES:
+        if path == endpoint_path or path.startswith(endpoint_path + '/'):
+            geocoded = name + '_geocoded'
+            if _has_fixture(geocoded, fixtures) and (
+                    any(p in query for p in _GEOCODING_PARAMS) or
+                    not _has_fixture(name, fixtures)):
+                return geocoded
+            return name
+    return None
+
+
+def fixture_names():
+    return sorted(filename[:-len('.json')]
+                  for filename in os.listdir(FIXTURES_DIR)
+                  if filename.endswith('.json'))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _MockCiceroHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.mock._handle(self)
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length') or 0)
+        self.rfile.read(length)
+        self.server.mock._handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockCiceroServer(object):
+    """
+    # MockCiceroServer(latency=0.0, error_rate=0.0, error_status=500,
+    #                  fixtures=None, seed=None)
+
+    A threaded HTTP server on 127.0.0.1 serving recorded Cicero responses.
+
+    +   latency (float) - seconds to wait before answering each request
+    +   error_rate (float) - fraction of requests, chosen at random, answered
+            with an error_status HTTP error and the "error" fixture
+    +   fixtures (dictionary) - fixture name to JSON text, overriding the
+            recorded fixtures
+    +   seed - seed for the random number generator used for error_rate
+
+    ## Available Attributes and Methods:
+
+    +   .url (string) - root url of the server, standing in for SITE_ROOT
+    +   .paths (list of strings) - the path and query of each request received
+    +   .start(), .stop() - also done by using the server in a with statement
+    +   .fail_next(count=1, status=500) - answer the next count requests with
+            a status HTTP error
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_status=500,
+                 fixtures=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fixtures = fixtures or {}
+        self.paths = []
+        self._random = random.Random(seed)
+        self._forced_errors = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/' % self._httpd.server_address[1]
+
+    def start(self):
+        self._httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _MockCiceroHandler)
+        self._httpd.mock = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=500):
+        with self._lock:
+            self._forced_errors.extend([status] * count)
+
+    def _fixture(self, name):
+        if name in self.fixtures:
+            return self.fixtures[name]
+        return load_fixture(name)
+
+    def _handle(self, handler):
+        with self._lock:
+            self.paths.append(handler.path)
+            status = self._forced_errors.pop(0) if self._forced_errors else None
+            if (status is None and self.error_rate and
+                    self._random.random() < self.error_rate):
+                status = self.error_status
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        name = route(handler.path, self.fixtures)
+        if status is None and name is None:
+            status = 404
+
+        etag = None
+        if status is None:
+            body = to_bytes(self._fixture(name))
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            status = 200
+            if handler.headers.get('If-None-Match') == etag:
+                status = 304
+                body = b''
+        else:
+            body = to_bytes(self._fixture('error'))
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            handler.send_header('ETag', etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class MockCiceroConnection(CiceroRestConnection):
+    """
+    # MockCiceroConnection(server, username="mock", password="mock")
+
+    A CiceroRestConnection whose token request and API requests are all sent
+    to a MockCiceroServer. Request urls are composed exactly as they would be
+    for the real API, and only rewritten to point at the server when sent.
+    """
+
+    def __init__(self, server, username='mock', password='mock'):
+        self.server = server
+        self.username = username
+        self.password = password
+
+        login_params = to_bytes(urlencode({
+            'username': self.username,
+            'password': self.password
+        }))
+        token_request = Request(self._rewrite(TOKEN_ENDPOINT), login_params)
+        token_json = json.loads(native_str(urlopen(token_request).read()))
+        self.user_id = token_json['user']
+        self.token = token_json['token']
+
+    def _rewrite(self, url):
+        if url.startswith(SITE_ROOT):
+            return self.server.url + url[len(SITE_ROOT):]
+        return url
+
+    def _request_raw(self, request_url, validators=None):
+        return super(MockCiceroConnection, self)._request_raw(
+            self._rewrite(request_url), validators)
+
+
+class OfflineCiceroConnection(CiceroRestConnection):
+    """
+    # OfflineCiceroConnection(blob=None, error=None)
+
+    A CiceroRestConnection which never touches the network or a server: it
+    skips authentication and answers each request in-process with the
+    recorded fixture for its url (or with blob, if given), or raises error if
+    it is set. The urls requested are recorded in .requested_urls. Responses
+    have no validators, so conditional requests are never answered with 304.
+    """
+
+    def __init__(self, blob=None, error=None):
+        self.username = self.password = ''
+        self.user_id = 1234
+        self.token = 'TOKEN'
+        self.blob = blob
+        self.error = error
+        self.requested_urls = []
+
+    def _request_raw(self, request_url, validators=None):
+        self.requested_urls.append(request_url)
+        if self.error is not None:
+            raise self.error
+        if self.blob is not None:
+            return self.blob
+        return load_fixture(route(request_url))
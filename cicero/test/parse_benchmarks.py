@@ -0,0 +1,211 @@
+"""
+This file contains parse-only benchmarks for cicero_response_classes.py.
+Unlike benchmarks.py, nothing here touches a server: large synthetic
+responses, built by repeating the officials in the recorded fixtures, are fed
+straight into each registered parsing mode, measuring
+
++   construction time (the best of several runs),
++   objects allocated and kept alive by the parsed response (as counted by
+    the gc module),
++   bytes retained by, and peak bytes allocated while building, the parsed
+    response (with tracemalloc, where it is available), and the bytes it
+    retains when parsed from freshly decoded JSON which is then discarded,
+    which counts the strings it keeps from the JSON too.
+
+Results can be saved as a baseline and compared against in a later release:
+
+    python -m cicero.test.parse_benchmarks --save parse_baseline.json
+    python -m cicero.test.parse_benchmarks --compare parse_baseline.json
+
+By default the synthetic response is 1,000 geocoding candidates of 50
+officials each; use --candidates and --officials to change that.
+"""
+
+import argparse
+import gc
+import sys
+from timeit import default_timer as _timer
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from cicero.cicero_response_classes import *
+from cicero.test.mock_server import load_fixture
+
+
+"""
+Parsing modes to compare, as (name, function taking a decoded JSON response
+and returning a parsed response) pairs.
+"""
+PARSE_MODES = [
+    ('eager', lambda json_dict: _without_interning(RootCiceroObject, json_dict)),
+    ('interned', RootCiceroObject),
+]
+
+
+def _without_interning(parse, json_dict):
+    previous = set_interned_fields(())
+    try:
+        return parse(json_dict)
+    finally:
+        set_interned_fields(previous)
+
+
+def synthetic_response(candidates=1000, officials_per_candidate=50):
+    """
+    # synthetic_response(candidates=1000, officials_per_candidate=50)
+
+    Returns a decoded geocoded /official response with the given number of
+    candidates and officials per candidate. Officials are copies of those in
+    the official_geocoded fixture, each with their own ids, names, addresses,
+    committees and identifiers.
+    """
+    template = json.loads(load_fixture('official_geocoded'))
+    template_candidate = template['response']['results']['candidates'][0]
+    template_officials = template_candidate['officials']
+    committees = [o['committees'] for o in template_officials if o['committees']]
+    for official in template_officials:
+        official['committees'] = official['committees'] or committees[0]
+    official_blobs = [json.dumps(o) for o in template_officials]
+
+    results = []
+    n = 0
+    for c in range(candidates):
+        candidate = dict(template_candidate)
+        candidate['match_addr'] = u'%d Synthetic St, Philadelphia, PA' % c
+        candidate['count'] = {'from': 0, 'to': officials_per_candidate - 1,
+                              'total': officials_per_candidate}
+        officials = []
+        for i in range(officials_per_candidate):
+            official = json.loads(official_blobs[i % len(official_blobs)])
+            n += 1
+            official['id'] = official['sk'] = n
+            official['last_name'] = u'%s%d' % (official['last_name'], n)
+            for identifier in official['identifiers']:
+                identifier['official'] = n
+                identifier['identifier_value'] = u'%s-%d' % (
+                    identifier['identifier_value'], n)
+            officials.append(official)
+        candidate['officials'] = officials
+        results.append(candidate)
+
+    return {'response': {'errors': [], 'messages': [],
+                         'results': {'candidates': results}}}
+
+
+def measure_parse(parse, json_dict, repeat=3):
+    """
+    # measure_parse(parse, json_dict, repeat=3)
+
+    Returns a dictionary with the best construction time in seconds, the
+    number of gc-tracked objects kept alive by the parsed response, and
+    (if tracemalloc is available) the bytes retained by it, the peak bytes
+    allocated while parsing, and the bytes retained by it when parsed from
+    JSON decoded (from json_dict re-encoded) only for it.
+    """
+    best = None
+    for _ in range(repeat):
+        start = _timer()
+        parse(json_dict)
+        elapsed = _timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    parsed = parse(json_dict)
+    gc.collect()
+    objects = len(gc.get_objects()) - objects_before
+    del parsed
+
+    retained = peak = retained_from_json = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            parsed = parse(json_dict)
+            retained, peak = tracemalloc.get_traced_memory()
+            del parsed
+        finally:
+            tracemalloc.stop()
+
+        blob = json.dumps(json_dict)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            parsed = parse(json.loads(blob))
+            gc.collect()
+            retained_from_json = tracemalloc.get_traced_memory()[0]
+            del parsed
+        finally:
+            tracemalloc.stop()
+
+    return {'seconds': best, 'objects': objects,
+            'retained_bytes': retained, 'peak_bytes': peak,
+            'retained_from_json_bytes': retained_from_json}
+
+
+def run(candidates=1000, officials_per_candidate=50, repeat=3, modes=None):
+    json_dict = synthetic_response(candidates, officials_per_candidate)
+    results = {}
+    for name, parse in PARSE_MODES:
+        if not modes or name in modes:
+            results[name] = measure_parse(parse, json_dict, repeat)
+    return results
+
+
+def format_results(results, baseline=None):
+    lines = ['%-12s %10s %12s %16s %16s %16s%s' % (
+        'mode', 'seconds', 'objects', 'retained bytes', 'peak bytes',
+        'from JSON bytes', '   vs baseline' if baseline else '')]
+    for name in sorted(results):
+        r = results[name]
+        line = '%-12s %10.3f %12d %16s %16s %16s' % (
+            name, r['seconds'], r['objects'],
+            'n/a' if r['retained_bytes'] is None else r['retained_bytes'],
+            'n/a' if r['peak_bytes'] is None else r['peak_bytes'],
+            'n/a' if r.get('retained_from_json_bytes') is None
+            else r['retained_from_json_bytes'])
+        if baseline and name in baseline:
+            line += '   %.2fx time, %.2fx objects' % (
+                r['seconds'] / baseline[name]['seconds'],
+                float(r['objects']) / max(baseline[name]['objects'], 1))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing large synthetic Cicero responses.')
+    parser.add_argument('modes', nargs='*',
+                        help='parsing modes to run (default: all): %s' %
+                        ', '.join(name for name, _ in PARSE_MODES))
+    parser.add_argument('--candidates', type=int, default=1000)
+    parser.add_argument('--officials', type=int, default=50,
+                        help='officials per candidate')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', metavar='FILE',
+                        help='save results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare results with a saved JSON baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.candidates, args.officials, args.repeat, args.modes)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    sys.stdout.write(format_results(results, baseline) + '\n')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
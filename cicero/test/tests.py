@@ -1,9 +1,39 @@
 """
 This file contains all unit tests for the python-cicero API wrapper.
 """
+import csv
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from cicero.cicero_compat import urlencode
 from cicero.cicero_rest_connection import *
+from cicero.cicero_metrics import *
+from cicero.cicero_batch import flatten
+from cicero.cicero_projection import project, project_array
+from cicero import cicero_sync
+from cicero.cicero_sync import OfficialStore, OfficialSync
+from cicero.cicero_store import LocalStore
+from cicero.cicero_cli import enrich
+from cicero.cicero_journal import Journal
+from cicero.cicero_sharded_connection import ShardedCiceroConnection
+from cicero.cicero_indexes import IdentifierIndex, CommitteeIndex
+from cicero.cicero_labels import format_label, write_labels
+from cicero.cicero_columnar import DistrictColumns
+from cicero import cicero_usage
+from cicero.cicero_usage import UsageHistory
+from cicero.cicero_concurrency import AIMDLimiter, EndpointLimiters
+from cicero.cicero_hedging import HedgePolicy, FREE_ENDPOINTS
+from cicero.test.mock_server import *
+from cicero.test.parse_benchmarks import synthetic_response, measure_parse
 
 USERNAME = ""  # if running tests directly, enter your Cicero API username here
 PASSWORD = ""  # if running tests directly, enter your Cicero API password here
@@ -208,6 +238,1397 @@ class CiceroDistrictTypeTests(CiceroBaseTest):
             self.blob.response.results.district_types[2].name_short, u'JUDICIAL')
 
 
+class CiceroComposeRequestUrlTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.auth = '?user=1234&token=TOKEN&f=json'
+
+    def test_matches_urlencode(self):
+        query = {'search_loc': "340 N 12th St, O'Brien & Co", 'max': 200,
+                 'lat': 40.5, 'district_type': ('STATE_LOWER', 'STATE_UPPER'),
+                 'last_name': u'Pe\xf1a', 'valid_on': ['2013-01-01']}
+        self.assertEqual(
+            self.cicero._compose_request_url(OFFICIAL_ENDPOINT, query),
+            OFFICIAL_ENDPOINT + self.auth + '&' + urlencode(query, True))
+
+    def test_or_query(self):
+        url = self.cicero._compose_request_url(
+            OFFICIAL_ENDPOINT, {'district_type': ('STATE_LOWER', 'STATE_UPPER')})
+        self.assertTrue(url.endswith(
+            '&district_type=STATE_LOWER&district_type=STATE_UPPER'))
+
+    def test_id_and_path(self):
+        query = {'id': 2, 'include_image_data': 1}
+        self.assertEqual(self.cicero._compose_request_url(MAP_ENDPOINT, query),
+                         MAP_ENDPOINT + '/2' + self.auth + '&include_image_data=1')
+        self.assertEqual(query, {'id': 2, 'include_image_data': 1})
+        self.cicero.get_account_usage("2012-11", "2013")
+        self.assertEqual(self.cicero.requested_urls[-1],
+                         ACCOUNT_USAGE_ENDPOINT + '/2012-11/to/2013' + self.auth)
+
+    def test_informational_endpoints(self):
+        self.cicero.get_district_type()
+        self.cicero.get_account_credits_remaining()
+        self.cicero.get_version()
+        self.assertEqual(self.cicero.requested_urls, [
+            DISTRICT_TYPE_ENDPOINT + self.auth,
+            ACCOUNT_CREDITS_REMAINING_ENDPOINT + self.auth,
+            VERSION_ENDPOINT + '?f=json'])
+
+    def test_token_refresh(self):
+        self.cicero.get_official(last_name="Smith")
+        self.cicero.token = 'NEW_TOKEN'
+        self.cicero.get_official(last_name="Smith")
+        self.assertIn('token=TOKEN&', self.cicero.requested_urls[0])
+        self.assertIn('token=NEW_TOKEN&', self.cicero.requested_urls[1])
+
+
+class CiceroInstrumentationHookTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.events = []
+        self.cicero.add_hook(self.events.append)
+
+    def test_event_per_request(self):
+        self.cicero.get_official(last_name="Smith")
+        self.cicero.get_version()
+        self.assertEqual(len(self.events), 2)
+        event = self.events[0]
+        self.assertIsInstance(event, RequestEvent)
+        self.assertEqual(event.endpoint, OFFICIAL_ENDPOINT)
+        self.assertEqual(event.url, self.cicero.requested_urls[0])
+        self.assertEqual(event.response_bytes, len(load_fixture('official')))
+        self.assertIsNone(event.error)
+        self.assertTrue(event.total_time >= event.parse_time > 0)
+        self.assertEqual(self.events[1].endpoint, VERSION_ENDPOINT)
+
+    def test_event_on_error(self):
+        self.cicero.error = NetworkError("down", "timeout")
+        self.assertRaises(NetworkError, self.cicero.get_version)
+        self.assertIs(self.events[0].error, self.cicero.error)
+
+    def test_remove_hook(self):
+        self.cicero.remove_hook(self.events.append)
+        self.cicero.get_version()
+        self.assertEqual(self.events, [])
+
+
+class CiceroMetricsRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.metrics = MetricsRegistry()
+        self.cicero.add_hook(self.metrics)
+
+    def test_counts_by_endpoint(self):
+        self.cicero.get_official(last_name="Smith")
+        self.cicero.get_official(id=1234)
+        self.cicero.get_map(id=2)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['OFFICIAL_ENDPOINT']['requests'], 2)
+        self.assertEqual(snapshot['MAP_ENDPOINT']['requests'], 1)
+        self.assertEqual(snapshot['MAP_ENDPOINT']['response_bytes'],
+                         len(load_fixture('map')))
+        self.assertEqual(snapshot['MAP_ENDPOINT']['latency']['count'], 1)
+
+    def test_error_counts(self):
+        self.cicero.error = CiceroError({'response': {'errors': ['bad']},
+                                         'status_code': 400})
+        self.assertRaises(CiceroError, self.cicero.get_official)
+        self.cicero.error = NetworkError("down", "timeout")
+        self.assertRaises(NetworkError, self.cicero.get_official)
+        official = self.metrics.snapshot()['OFFICIAL_ENDPOINT']
+        self.assertEqual(official['cicero_errors'], {400: 1})
+        self.assertEqual(official['network_errors'], 1)
+
+    def test_cache_hits(self):
+        self.cicero.cache = ResponseCache()
+        self.cicero.negative_cache = ResponseCache()
+        self.cicero.get_district_type()
+        self.cicero.get_district_type()
+        self.cicero.error = CiceroError({'response': {'errors': ['bad']},
+                                         'status_code': 400})
+        self.assertRaises(CiceroError, self.cicero.get_official)
+        self.assertRaises(CiceroError, self.cicero.get_official)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['DISTRICT_TYPE_ENDPOINT']['requests'], 2)
+        self.assertEqual(snapshot['DISTRICT_TYPE_ENDPOINT']['cache_hits'], 1)
+        self.assertEqual(snapshot['DISTRICT_TYPE_ENDPOINT']['latency']['count'], 1)
+        self.assertEqual(snapshot['OFFICIAL_ENDPOINT']['cache_hits'], 1)
+        self.assertEqual(snapshot['OFFICIAL_ENDPOINT']['cicero_errors'], {400: 1})
+        self.assertEqual(snapshot['OFFICIAL_ENDPOINT']['latency']['count'], 1)
+
+    def test_histogram_quantiles(self):
+        histogram = LatencyHistogram(buckets=(0.1, 0.2, 0.4))
+        for value in (0.05,) * 50 + (0.15,) * 49 + (0.3,):
+            histogram.observe(value)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.1)
+        self.assertTrue(0.1 < histogram.quantile(0.99) <= 0.2)
+        self.assertEqual(histogram.cumulative_counts(), [50, 99, 100, 100])
+
+    def test_prometheus_text(self):
+        self.cicero.get_version()
+        text = self.metrics.prometheus_text()
+        self.assertIn('cicero_requests_total{endpoint="VERSION_ENDPOINT"} 1',
+                      text)
+        self.assertIn('cicero_request_duration_seconds_bucket'
+                      '{endpoint="VERSION_ENDPOINT",le="+Inf"} 1', text)
+
+
+class CiceroFixtureParsingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+
+    def test_geocoded_official(self):
+        blob = self.cicero.get_official(search_loc="340 N 12th St Philadelphia")
+        official = blob.response.results.candidates[0].officials[1]
+        self.assertIsInstance(official, OfficialObject)
+        self.assertEqual(official.office.district.district_type, "STATE_LOWER")
+
+    def test_nongeocoded_official(self):
+        blob = self.cicero.get_official(last_name="O'Brien")
+        self.assertIsInstance(blob.response.results,
+                              OfficialNonGeocodingResultsObject)
+
+    def test_every_endpoint(self):
+        self.assertIsInstance(
+            self.cicero.get_legislative_district(search_loc="340 12 ST")
+            .response.results.candidates[0], DistrictGeocodingCandidate)
+        self.assertEqual(
+            self.cicero.get_nonlegislative_district(lat=40, lon=-75.1)
+            .response.results.districts[1].id, 585268)
+        self.assertIsInstance(
+            self.cicero.get_election_event().response.results
+            .election_events[0].chambers[0], ChamberObject)
+        self.assertTrue(self.cicero.get_map(id=2, include_image_data=1)
+                        .response.results.maps[0].img_src)
+        self.assertEqual(self.cicero.get_district_type().response.results
+                         .district_types[2].name_short, u'JUDICIAL')
+        self.assertIsInstance(self.cicero.get_account_credits_remaining()
+                              .response.results.usable_batches[0],
+                              CreditBatchObject)
+        self.assertIsInstance(self.cicero.get_account_usage("2013-11")
+                              .response.results[0], AccountUsageObject)
+        self.assertEqual(self.cicero.get_version().response.results.version,
+                         u'3.1')
+
+
+class CiceroMockServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockCiceroServer().start()
+        self.cicero = MockCiceroConnection(self.server)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_authentication(self):
+        self.assertEqual(self.cicero.user_id, 1234)
+        self.assertTrue(self.server.paths[0].endswith('token/new.json'))
+
+    def test_official(self):
+        blob = self.cicero.get_official(search_loc="340 N 12th St Philadelphia")
+        self.assertIsInstance(blob.response.results.candidates[0].officials[0],
+                              OfficialObject)
+        self.assertIn('search_loc=340+N+12th+St+Philadelphia',
+                      self.server.paths[-1])
+
+    def test_conditional_requests(self):
+        self.cicero.revalidate = ResponseCache()
+        events = []
+        self.cicero.add_hook(events.append)
+        first = self.cicero.get_district_type()
+        second = self.cicero.get_district_type()
+        self.assertIs(second, first)
+        self.assertEqual([e.revalidated for e in events], [False, True])
+        self.assertEqual(events[1].response_bytes, 0)  # 304 Not Modified
+        self.assertIsNot(self.cicero.get_version(), first)
+        self.assertEqual(len(self.server.paths), 4)  # token and 3 requests
+
+    def test_error_injection(self):
+        self.server.fail_next(status=400)
+        try:
+            self.cicero.get_official(bogus=1)
+        except CiceroError as e:
+            self.assertEqual(e.status_code, 400)
+            self.assertEqual(e.error_list, [u'Invalid query parameter: bogus'])
+        else:
+            self.fail("CiceroError not raised")
+        self.cicero.get_official(last_name="Smith")
+
+    def test_non_json_error_body(self):
+        self.server.fixtures['error'] = 'Bad Gateway'
+        self.server.fail_next(status=502)
+        try:
+            self.cicero.get_version()
+        except CiceroError as e:
+            self.assertEqual(e.status_code, 502)
+            self.assertEqual(e.error_list, ['Bad Gateway'])
+        else:
+            self.fail("CiceroError not raised")
+        self.assertIsInstance(self.cicero.get_version(), RootCiceroObject)
+
+
+class CiceroParseBenchmarkTests(unittest.TestCase):
+
+    def test_synthetic_response(self):
+        json_dict = synthetic_response(candidates=2, officials_per_candidate=3)
+        candidates = RootCiceroObject(json_dict).response.results.candidates
+        self.assertEqual(len(candidates), 2)
+        self.assertEqual([o.id for o in candidates[1].officials], [4, 5, 6])
+        self.assertTrue(all(o.committees for o in candidates[0].officials))
+
+    def test_measure_parse(self):
+        result = measure_parse(RootCiceroObject, synthetic_response(1, 1),
+                               repeat=1)
+        # objects are counted across the whole process, which other tests'
+        # threads may be freeing at the same time, so only its presence is
+        # checked
+        self.assertEqual(sorted(result),
+                         ['objects', 'peak_bytes', 'retained_bytes',
+                          'retained_from_json_bytes', 'seconds'])
+        self.assertTrue(result['seconds'] > 0)
+
+
+class CiceroInterningTests(unittest.TestCase):
+
+    def officials(self):
+        root = RootCiceroObject(json.loads(load_fixture('official')))
+        return root.response.results.officials
+
+    def test_interned_fields(self):
+        first, second = self.officials()[1:]
+        self.assertEqual(first.party, u'Democratic')
+        self.assertIs(first.party, second.party)
+        self.assertIs(first.office.district.state,
+                      second.office.district.state)
+        # fields not interned are left alone
+        self.assertIsNot(first.office.district.valid_from,
+                         second.office.district.valid_from)
+
+    def test_set_interned_fields(self):
+        previous = set_interned_fields(())
+        try:
+            first, second = self.officials()[1:]
+            self.assertEqual(first.party, second.party)
+            self.assertIsNot(first.party, second.party)
+        finally:
+            self.assertEqual(set_interned_fields(previous), frozenset())
+
+
+class CiceroBatchRequestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.queries = [{'search_loc': '340 N 12th St Philadelphia'},
+                        {'last_name': "O'Brien"}]
+        self.fields = ['last_name', 'office.district.district_type']
+
+    def test_threads(self):
+        results = self.cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                            max_workers=2)
+        self.assertIsInstance(results[0].response.results.candidates[0],
+                              OfficialGeocodingCandidate)
+        self.assertIsInstance(results[1].response.results,
+                              OfficialNonGeocodingResultsObject)
+        self.assertEqual(len(self.cicero.requested_urls), 2)
+
+    def test_rows(self):
+        results = self.cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                            fields=self.fields)
+        self.assertEqual(results[0][1], (u"O'Brien", u'STATE_LOWER'))
+        self.assertEqual(results[0], results[1])
+
+    def test_process_pool(self):
+        rows = self.cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                         fields=self.fields)
+        self.assertEqual(self.cicero.batch_request(
+            OFFICIAL_ENDPOINT, self.queries, parse_processes=2,
+            fields=self.fields), rows)
+        objects = self.cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                            parse_processes=2)
+        self.assertEqual([flatten(r, self.fields) for r in objects], rows)
+
+    def test_errors_in_place(self):
+        self.cicero.error = NetworkError("down", "timeout")
+        results = self.cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                            parse_processes=1)
+        self.assertEqual(results, [self.cicero.error] * 2)
+
+
+class CiceroResponseCacheTests(unittest.TestCase):
+
+    def test_lru_and_ttl(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')),
+                         (1, None, 3))
+        cache = ResponseCache(ttl=-1)
+        cache.set('a', 1)
+        self.assertNotIn('a', cache)
+
+    def test_connection_cache(self):
+        cicero = OfflineCiceroConnection()
+        cicero.cache = ResponseCache()
+        events = []
+        cicero.add_hook(events.append)
+        first = cicero.get_official(last_name="Smith", max=10)
+        cicero.token = 'REFRESHED'
+        self.assertIs(cicero.get_official(max=10, last_name="Smith"), first)
+        self.assertEqual(len(cicero.requested_urls), 1)
+        self.assertEqual([e.cache_hit for e in events], [False, True])
+
+    def test_account_endpoints_not_cached(self):
+        cicero = OfflineCiceroConnection()
+        cicero.cache = ResponseCache()
+        cicero.negative_cache = ResponseCache()
+        for _ in range(2):
+            cicero.get_account_credits_remaining()
+            cicero.get_account_usage('2013-11')
+            cicero.get_version()
+        self.assertEqual(len(cicero.requested_urls), 6)
+        self.assertEqual(len(cicero.cache), 0)
+
+
+class CiceroHydrateByIdsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.cicero.cache = ResponseCache()
+
+    def test_officials_by_ids(self):
+        officials = self.cicero.get_officials_by_ids([48853, 65321, 48853, 1])
+        self.assertEqual(sorted(officials), [48853, 65321])
+        self.assertEqual(officials[65321].last_name, u"O'Brien")
+        packed, single = self.cicero.requested_urls
+        self.assertIn('id=48853&id=65321&id=1', packed)
+        self.assertIn('max=3', packed)
+        self.assertTrue(single.startswith(OFFICIAL_ENDPOINT + '/1?'))
+
+        self.cicero.get_officials_by_ids([65321, 48853])
+        self.assertEqual(len(self.cicero.requested_urls), 2)
+
+        # other query arguments are other queries
+        self.cicero.get_officials_by_ids([65321], valid_on='2010-01-01')
+        self.assertEqual(len(self.cicero.requested_urls), 3)
+        self.assertIn('valid_on=2010-01-01', self.cicero.requested_urls[-1])
+        self.cicero.get_officials_by_ids([65321], valid_on='2010-01-01')
+        self.assertEqual(len(self.cicero.requested_urls), 3)
+
+    def test_districts_by_ids(self):
+        districts = self.cicero.get_districts_by_ids(
+            [585268, 712001], endpoint=NONLEGISLATIVE_DISTRICT_ENDPOINT,
+            ids_per_request=1)
+        self.assertEqual(districts[712001].district_type, u'CENSUS')
+        self.assertEqual(len(self.cicero.requested_urls), 2)
+
+
+class CiceroOfficialSyncTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cicero = OfflineCiceroConnection()
+        self.store = OfficialStore()
+        self.sync = OfficialSync(self.cicero, self.store, query={'state': 'PA'},
+                                 page_size=2)
+
+    def test_initial_sync_pages_and_adds(self):
+        blob = json.loads(load_fixture('official'))
+        blob['response']['results']['count']['total'] = 5
+        self.cicero.blob = json.dumps(blob)
+        changes = self.sync.sync()
+        self.assertEqual([(c.kind, c.official_id) for c in changes],
+                         [('added', 48853), ('added', 65321), ('added', 65599)])
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.get(65321).last_name, u"O'Brien")
+        self.assertEqual(self.store.watermark, '2013-11-05 19:06:27')
+        first, second = self.cicero.requested_urls
+        self.assertIn('max=2', first)
+        self.assertIn('offset=0', first)
+        self.assertIn('offset=3', second)
+        self.assertNotIn('last_update_date_on_or_after', first)
+
+    def test_incremental_sync_diffs(self):
+        self.sync.sync()
+        position = len(self.sync.changes)
+
+        blob = json.loads(load_fixture('official'))
+        officials = blob['response']['results']['officials']
+        officials[0]['sk'] += 1
+        officials[0]['last_update_date'] = '2014-01-06 10:00:00'
+        officials[1]['valid_to'] = '2014-01-01 00:00:00'
+        officials[1]['last_update_date'] = '2014-01-02 10:00:00'
+        self.cicero.blob = json.dumps(blob)
+        self.cicero.requested_urls = []
+
+        changes = self.sync.sync()
+        self.assertEqual([(c.kind, c.official_id) for c in changes],
+                         [('new_term', 48853), ('vacated', 65321)])
+        self.assertEqual(self.sync.changes_since(position), changes)
+        self.assertNotIn(65321, self.store)
+        self.assertEqual(self.store.watermark, '2014-01-06 10:00:00')
+        self.assertIn('last_update_date_on_or_after=2013-11-05+19%3A06%3A27',
+                      self.cicero.requested_urls[0])
+
+    def test_failed_sync_keeps_applied_changes(self):
+        blob = json.loads(load_fixture('official'))
+        blob['response']['results']['count']['total'] = 5
+        cicero = _FailingConnection(1)
+        cicero.blob = json.dumps(blob)
+        sync = OfficialSync(cicero, self.store, page_size=2)
+        self.assertRaises(NetworkError, sync.sync)
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual([c.kind for c in sync.changes], ['added'] * 3)
+        self.assertEqual(self.store.watermark, None)
+
+        cicero.limit = 10
+        self.assertEqual(sync.sync(), [])
+        self.assertEqual(len(sync.changes), 3)
+
+    def test_term_ends_without_update(self):
+        blob = json.loads(load_fixture('official'))
+        blob['response']['results']['officials'][2]['valid_to'] = \
+            '2014-06-30 00:00:00'
+        self.cicero.blob = json.dumps(blob)
+        now = cicero_sync._now
+        try:
+            cicero_sync._now = lambda: '2014-01-01 00:00:00'
+            self.assertEqual(len(self.sync.sync()), 3)
+
+            # the API returns nothing new, but the term has since ended
+            blob['response']['results']['officials'] = []
+            blob['response']['results']['count']['total'] = 0
+            self.cicero.blob = json.dumps(blob)
+            cicero_sync._now = lambda: '2014-07-01 00:00:00'
+            changes = self.sync.sync()
+        finally:
+            cicero_sync._now = now
+        self.assertEqual([(c.kind, c.official_id) for c in changes],
+                         [('vacated', 65599)])
+        self.assertEqual(changes[0].old['valid_to'], '2014-06-30 00:00:00')
+        self.assertEqual(sorted(self.store), [48853, 65321])
+
+    def test_store_persistence(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'officials.json')
+        self.store.path = path
+        self.sync.sync()
+        self.store.save()
+        loaded = OfficialStore(path)
+        self.assertEqual(sorted(loaded), [48853, 65321, 65599])
+        self.assertEqual(loaded.watermark, self.store.watermark)
+        self.assertEqual(loaded.get(48853).last_name, u'Biden')
+
+
+class CiceroLocalStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.store = LocalStore()
+        self.store.add(RootCiceroObject(json.loads(load_fixture('official'))))
+        self.store.add(RootCiceroObject(
+            json.loads(load_fixture('nonlegislative_district'))))
+
+    def ids(self, objects):
+        return [o.id for o in objects]
+
+    def test_find_officials(self):
+        find = self.store.find_officials
+        self.assertEqual(self.ids(find(last_name='biden')), [48853])
+        self.assertEqual(self.ids(find(last_name='*e*')), [48853, 65321, 65599])
+        self.assertEqual(self.ids(find(last_name='o\'b*')), [65321])
+        self.assertEqual(self.ids(find(state='PA', chamber_type='UPPER')), [65599])
+        self.assertEqual(self.ids(find(district_type='STATE_LOWER',
+                                       party='Democratic')), [65321])
+        self.assertEqual(find(last_name='Smith', state='PA'), [])
+
+    def test_find_districts_and_replace(self):
+        self.assertEqual(self.ids(self.store.find_districts(
+            district_type='CENSUS')), [712001])
+        official = self.store.get_official(65321)
+        official.party = 'Independent'
+        self.store.add_official(official)
+        self.assertEqual(self.ids(self.store.find_officials(
+            party='Democratic')), [48853, 65599])
+        self.store.remove_official(65599)
+        self.assertEqual(self.ids(self.store.find_officials(state='PA')),
+                         [65321])
+
+    def test_persistence_and_sync_changes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'store.json')
+        self.store.path = path
+        self.store.save()
+        loaded = LocalStore(path)
+        self.assertEqual(sorted(loaded.officials), [48853, 65321, 65599])
+        self.assertEqual(self.ids(loaded.find_officials(last_name='FARN*')),
+                         [65599])
+        self.assertEqual(loaded.get_official(65321).committees[0].id, 701)
+
+        synced = LocalStore()
+        sync = OfficialSync(OfflineCiceroConnection(), OfficialStore())
+        synced.apply(sync.sync())
+        self.assertEqual(self.ids(synced.find_officials(chamber_type='EXEC')),
+                         [48853])
+
+
+class CiceroLazyImportTests(unittest.TestCase):
+
+    def test_package_attributes(self):
+        import cicero
+        self.assertEqual(cicero.OFFICIAL_ENDPOINT, OFFICIAL_ENDPOINT)
+        self.assertIs(cicero.CiceroRestConnection, CiceroRestConnection)
+        self.assertRaises(AttributeError, getattr, cicero, 'NoSuchThing')
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     "lazy loading needs module __getattr__")
+    def test_import_loads_no_heavy_modules(self):
+        script = (
+            "import sys, cicero\n"
+            "heavy = ('cicero.cicero_rest_connection', "
+            "'cicero.cicero_response_classes', 'cicero.cicero_batch', "
+            "'multiprocessing', 'logging', 'urllib.request')\n"
+            "before = [m for m in heavy if m in sys.modules]\n"
+            "cicero.CiceroRestConnection\n"
+            "after = [m for m in heavy if m in sys.modules]\n"
+            "print(repr((before, after)))\n")
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=root)
+        before, after = eval(output)
+        self.assertEqual(before, [])
+        self.assertEqual(after, ['cicero.cicero_rest_connection',
+                                 'cicero.cicero_response_classes'])
+
+
+class CiceroRetryTests(unittest.TestCase):
+
+    def test_retries_server_errors(self):
+        with MockCiceroServer() as server:
+            cicero = MockCiceroConnection(server)
+            cicero.max_retries = 2
+            cicero.retry_backoff = 0
+            events = []
+            cicero.add_hook(events.append)
+
+            server.fail_next(2, status=503)
+            self.assertIsInstance(cicero.get_version(), RootCiceroObject)
+            self.assertEqual(events[-1].retries, 2)
+
+            server.fail_next(1, status=400)
+            self.assertRaises(CiceroError, cicero.get_official, bogus=1)
+            self.assertEqual(events[-1].retries, 0)
+
+            server.fail_next(3, status=503)
+            self.assertRaises(CiceroError, cicero.get_version)
+
+
+class _FailingConnection(OfflineCiceroConnection):
+    # answers the first `limit` requests, then raises NetworkErrors
+
+    def __init__(self, limit):
+        OfflineCiceroConnection.__init__(self)
+        self.limit = limit
+
+    def _request_raw(self, request_url):
+        if len(self.requested_urls) >= self.limit:
+            raise NetworkError('down', 'test')
+        return OfflineCiceroConnection._request_raw(self, request_url)
+
+
+class CiceroBatchCliTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.input = os.path.join(self.dir, 'addresses.csv')
+        with open(self.input, 'w') as f:
+            f.write('name,address,lat,lon\n')
+            for i in range(5):
+                f.write('row%d,%d Main St,,\n' % (i, i))
+            f.write('coords,,40,-75.1\n')
+        self.output = os.path.join(self.dir, 'officials.jsonl')
+
+    def read_output(self):
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    def test_enrich(self):
+        cicero = OfflineCiceroConnection()
+        rows = enrich(cicero, self.input, self.output, address_field='address',
+                      fields=['last_name', 'office.district.district_type'],
+                      params={'district_type': 'STATE_LOWER'}, chunk_size=4)
+        self.assertEqual(rows, 6)
+        output = self.read_output()
+        self.assertEqual(output[0]['name'], 'row0')
+        self.assertEqual(output[0]['last_name'], 'Biden')
+        self.assertEqual(output[0]['office.district.district_type'],
+                         'NATIONAL_EXEC')
+        self.assertEqual(len(output), 18)  # 3 officials per row
+        self.assertIn('search_loc=0+Main+St', cicero.requested_urls[0])
+        self.assertIn('district_type=STATE_LOWER', cicero.requested_urls[0])
+        self.assertIn('lat=40', cicero.requested_urls[-1])
+
+    def test_checkpoint_resume(self):
+        checkpoint = os.path.join(self.dir, 'checkpoint')
+        options = dict(address_field='address', chunk_size=2, max_workers=1,
+                       checkpoint=checkpoint)
+        self.assertRaises(NetworkError, enrich, _FailingConnection(3),
+                          self.input, self.output, **options)
+        self.assertEqual(len(self.read_output()), 6)  # first chunk only
+
+        cicero = OfflineCiceroConnection()
+        self.assertEqual(enrich(cicero, self.input, self.output, **options), 6)
+        self.assertEqual(len(cicero.requested_urls), 4)
+        self.assertEqual([row['name'] for row in self.read_output()[::3]],
+                         ['row0', 'row1', 'row2', 'row3', 'row4', 'coords'])
+
+    def test_errors_are_written(self):
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 400
+        cicero = OfflineCiceroConnection(error=CiceroError(error_dict))
+        enrich(cicero, self.input, self.output, address_field='address')
+        output = self.read_output()
+        self.assertEqual(len(output), 6)
+        self.assertEqual(output[0]['cicero_error'],
+                         'Invalid query parameter: bogus')
+        self.assertIsNone(output[0]['last_name'])
+
+    def test_expired_token_stops_the_run(self):
+        checkpoint = os.path.join(self.dir, 'checkpoint')
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 401
+        cicero = OfflineCiceroConnection(error=CiceroError(error_dict))
+        self.assertRaises(CiceroError, enrich, cicero, self.input, self.output,
+                          address_field='address', chunk_size=2,
+                          checkpoint=checkpoint)
+        self.assertEqual(self.read_output(), [])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_row_without_address(self):
+        with open(self.input, 'a') as f:
+            f.write('nowhere,,,\n')
+        cicero = OfflineCiceroConnection()
+        self.assertEqual(enrich(cicero, self.input, self.output,
+                                address_field='address', chunk_size=4), 7)
+        output = self.read_output()
+        self.assertEqual(output[-1]['name'], 'nowhere')
+        self.assertEqual(output[-1]['cicero_error'], 'no address or lat/lon')
+        self.assertEqual(len(cicero.requested_urls), 6)
+
+
+class CiceroJournalTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'batch.journal')
+        self.queries = [{'search_loc': '%d Main St' % i} for i in range(3)]
+        self.fields = ['id', 'last_name']
+
+    def batch(self, cicero, **options):
+        with Journal(self.path) as journal:
+            results = cicero.batch_request(OFFICIAL_ENDPOINT, self.queries,
+                                           journal=journal, **options)
+            return journal, results
+
+    def test_replay(self):
+        journal, first = self.batch(OfflineCiceroConnection(),
+                                    fields=self.fields)
+        self.assertEqual(journal.completed, 3)
+
+        cicero = OfflineCiceroConnection()
+        journal, again = self.batch(cicero, fields=self.fields)
+        self.assertEqual(cicero.requested_urls, [])
+        self.assertEqual(journal.replayed, 3)
+        self.assertEqual(again, first)
+
+        self.queries.append({'search_loc': '3 Main St'})
+        journal, results = self.batch(cicero)
+        self.assertEqual(len(cicero.requested_urls), 1)
+        self.assertIsInstance(results[3], RootCiceroObject)
+
+    def test_pending_and_errors(self):
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 400
+        cicero = OfflineCiceroConnection(error=CiceroError(error_dict))
+        self.queries = self.queries[:1]
+        self.batch(cicero, keys=['row0'])
+        cicero.error = NetworkError('down', 'test')
+        self.queries = [{'search_loc': '1 Main St'}]
+        journal, results = self.batch(cicero, keys=['row1'])
+        self.assertIsInstance(results[0], NetworkError)
+        with open(self.path, 'a') as f:
+            f.write('{"key": "row2", "sta')  # cut short by a crash
+
+        cicero = OfflineCiceroConnection()
+        self.queries = [{'search_loc': '0 Main St'}]
+        journal, results = self.batch(cicero, keys=['row0'])
+        self.assertEqual(journal.pending(), ['row1'])
+        self.assertEqual(results[0].error_list,
+                         [u'Invalid query parameter: bogus'])
+        self.assertEqual(cicero.requested_urls, [])
+
+    def test_tuple_keys(self):
+        keys = [('file.csv', i) for i in range(3)]
+        self.batch(OfflineCiceroConnection(), keys=keys[:2])
+        cicero = OfflineCiceroConnection()
+        journal, results = self.batch(cicero, keys=keys)
+        self.assertEqual(len(cicero.requested_urls), 1)
+        self.assertEqual(journal.replayed, 2)
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.completed, 3)
+
+    def test_append_after_partial_line(self):
+        self.batch(OfflineCiceroConnection(), keys=['row0', 'row1', 'row2'])
+        with open(self.path, 'a') as f:
+            f.write('{"key": "row3", "sta')  # cut short by a crash
+
+        cicero = OfflineCiceroConnection()
+        cicero.error = NetworkError('down', 'test')
+        self.queries = [{'search_loc': '3 Main St'}]
+        self.batch(cicero, keys=['row3'])
+        with Journal(self.path) as journal:
+            self.assertEqual(journal.pending(), ['row3'])
+            self.assertEqual(journal.completed, 3)
+
+    def test_connection_caches(self):
+        cicero = OfflineCiceroConnection()
+        cicero.cache = ResponseCache()
+        cicero.negative_cache = ResponseCache()
+        self.queries = [{'search_loc': '1 Main St'}] * 20
+        journal, results = self.batch(cicero, keys=list(range(20)),
+                                      max_workers=1)
+        self.assertEqual(len(cicero.requested_urls), 1)
+        self.assertIs(results[19], results[0])
+        self.assertIsInstance(results[0], RootCiceroObject)
+
+        journal, rows = self.batch(cicero, keys=list(range(20, 40)),
+                                   fields=self.fields)
+        self.assertEqual(len(cicero.requested_urls), 1)
+        self.assertEqual(rows[0][0], (48853, u'Biden'))
+
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 400
+        cicero.error = CiceroError(error_dict)
+        self.queries = [{'search_loc': 'bogus'}] * 5
+        journal, results = self.batch(cicero, keys=list(range(40, 45)),
+                                      max_workers=1)
+        self.assertEqual(len(cicero.requested_urls), 2)
+        self.assertEqual([r.status_code for r in results], [400] * 5)
+
+    def test_expired_token_is_not_journaled(self):
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 401
+        cicero = OfflineCiceroConnection(error=CiceroError(error_dict))
+        journal, results = self.batch(cicero)
+        self.assertEqual(results[0].status_code, 401)
+        self.assertEqual(journal.completed, 0)
+
+        cicero = OfflineCiceroConnection()
+        journal, results = self.batch(cicero)
+        self.assertEqual(len(cicero.requested_urls), 3)
+        self.assertIsInstance(results[0], RootCiceroObject)
+
+
+class CiceroShardedConnectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.shards = [OfflineCiceroConnection() for _ in range(3)]
+        for i, shard in enumerate(self.shards):
+            shard.user_id = 100 + i
+            shard.token = 'TOKEN%d' % i
+
+    def counts(self):
+        return [len(shard.requested_urls) for shard in self.shards]
+
+    def test_weighted_round_robin(self):
+        cicero = ShardedCiceroConnection(self.shards, weights=[3, 2, 1])
+        for _ in range(12):
+            cicero.get_official(last_name='Smith')
+        self.assertEqual(self.counts(), [6, 4, 2])
+        self.assertEqual(cicero.requests, [6, 4, 2])
+        url = self.shards[1].requested_urls[0]
+        self.assertIn('?user=101&token=TOKEN1&f=json&last_name=Smith', url)
+        self.assertEqual(cicero.get_version().response.results.version, u'3.1')
+
+    def test_failover(self):
+        cicero = ShardedCiceroConnection(self.shards)
+        self.shards[0].error = NetworkError('down', 'test')
+        for _ in range(6):
+            cicero.get_official(last_name='Smith')
+        counts = self.counts()
+        self.assertEqual(counts[0], 1)  # then cooling down
+        self.assertEqual(sum(counts), 7)
+
+        error_dict = json.loads(load_fixture('error'))
+        error_dict['status_code'] = 400
+        self.shards[1].error = self.shards[2].error = CiceroError(error_dict)
+        before = self.counts()
+        self.assertRaises(CiceroError, cicero.get_official, bogus=1)
+        self.assertEqual(sum(self.counts()), sum(before) + 1)  # no failover
+        for shard in self.shards:
+            shard.error = NetworkError('down', 'test')
+        self.assertRaises(NetworkError, cicero.get_official, last_name='Smith')
+
+    def test_credit_weights_and_batch(self):
+        self.shards[2].error = NetworkError('down', 'test')
+        cicero = ShardedCiceroConnection(self.shards, strategy='credits')
+        self.assertEqual(cicero.weights, [4500, 4500, 0])
+        results = cicero.batch_request(
+            OFFICIAL_ENDPOINT, [{'last_name': 'Smith'}] * 4, max_workers=1)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(self.counts(), [3, 3, 1])
+
+
+class CiceroProjectionTests(unittest.TestCase):
+
+    fields = ['id', 'last_name', 'office.district.district_type',
+              'office.chamber.name', 'office.missing.field']
+
+    def test_matches_flatten(self):
+        for name in ('official', 'official_geocoded', 'nonlegislative_district',
+                     'election_event'):
+            json_dict = json.loads(load_fixture(name))
+            self.assertEqual(project(json_dict, self.fields),
+                             flatten(RootCiceroObject(json_dict), self.fields))
+        json_dict = json.loads(load_fixture('official'))
+        self.assertEqual(project(json_dict, ['id', 'party'])[1],
+                         (65321, u'Democratic'))
+        self.assertEqual(project(json_dict, ['id', 'nickname'])[0], (48853, None))
+
+    def test_flatten_data_keys(self):
+        root = RootCiceroObject(json.loads(load_fixture('nonlegislative_district')))
+        self.assertEqual(flatten(root, ['data.geoid', 'data.pop', 'data.items',
+                                        'label.upper']),
+                         [(None, None, None, None)] * 2 +
+                         [(u'42101000200', 2940, None, None)])
+
+    def test_paths_through_lists(self):
+        fields = ['id', 'addresses.city', 'committees.name', 'first_name.upper']
+        for name in ('official', 'official_geocoded'):
+            json_dict = json.loads(load_fixture(name))
+            rows = project(json_dict, fields)
+            self.assertEqual(rows, flatten(RootCiceroObject(json_dict), fields))
+            self.assertEqual(set(row[1:] for row in rows),
+                             set([(None, None, None)]))
+        fields = ['id', 'data.geoid', 'data.pop', 'data.items']
+        json_dict = json.loads(load_fixture('nonlegislative_district'))
+        self.assertEqual(project(json_dict, fields),
+                         flatten(RootCiceroObject(json_dict), fields))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'batch.journal')
+        with Journal(path) as journal:
+            rows = OfflineCiceroConnection().batch_request(
+                OFFICIAL_ENDPOINT, [{'last_name': 'Smith'}], journal=journal,
+                fields=['id', 'addresses.city'])
+        self.assertEqual(rows[0][0], (48853, None))
+
+    def test_batch_does_not_load_numpy(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        output = subprocess.check_output(
+            [sys.executable, '-c', "import sys, cicero.cicero_batch\n"
+                                   "print('numpy' in sys.modules)"], cwd=root)
+        self.assertEqual(output.strip(), b'False')
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_project_array(self):
+        rows = project_array(json.loads(load_fixture('official')), self.fields,
+                             dtypes={'id': 'i8'})
+        self.assertEqual(list(rows['id']), [48853, 65321, 65599])
+        self.assertEqual(rows['office.chamber.name'][1], u'House')
+
+
+class CiceroIdentifierIndexTests(unittest.TestCase):
+
+    def test_identifiers_by_type(self):
+        root = RootCiceroObject(json.loads(load_fixture('official')))
+        biden = root.response.results.officials[0]
+        self.assertEqual(sorted(biden.identifiers_by_type),
+                         [u'BIOGUIDE', u'TWITTER'])
+        self.assertEqual([i.identifier_value
+                          for i in biden.find_identifier('BIOGUIDE')],
+                         [u'B000444'])
+        self.assertEqual(biden.find_identifier('FEC'), [])
+
+    def test_reverse_index_hook(self):
+        index = IdentifierIndex()
+        cicero = OfflineCiceroConnection()
+        cicero.cache = ResponseCache()
+        cicero.add_hook(index)
+        cicero.get_official(search_loc="340 N 12th St Philadelphia")
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.get('BIOGUIDE', 'B000444').last_name, u'Biden')
+        self.assertIsNone(index.get('BIOGUIDE', 'nobody'))
+        self.assertIn(('VOTESMART', '9157'), index)
+        self.assertEqual([(v, o and o.id) for v, o in
+                          index.join('TWITTER', ['SenFarnese', 'nobody'])],
+                         [('SenFarnese', 65599), ('nobody', None)])
+
+        index = IdentifierIndex()
+        cicero.add_hook(index)
+        cicero.get_official(search_loc="340 N 12th St Philadelphia")
+        self.assertEqual(len(index), 5)  # from the cached response
+
+    def test_readd_drops_stale_identifiers(self):
+        index = IdentifierIndex()
+        blob = json.loads(load_fixture('official'))
+        index.add(RootCiceroObject(blob))
+        self.assertEqual(index.get('TWITTER', 'VP').id, 48853)
+
+        identifiers = blob['response']['results']['officials'][0]['identifiers']
+        identifiers[0]['identifier_value'] = 'POTUS'
+        index.add(RootCiceroObject(blob))
+        self.assertNotIn(('TWITTER', 'VP'), index)
+        self.assertEqual(index.get('TWITTER', 'POTUS').id, 48853)
+        self.assertEqual(index.get('BIOGUIDE', 'B000444').id, 48853)
+
+
+class CiceroCommitteeIndexTests(unittest.TestCase):
+
+    def test_incremental_membership(self):
+        index = CommitteeIndex()
+        cicero = OfflineCiceroConnection()
+        cicero.add_hook(index)
+        cicero.get_official(state='PA')
+        self.assertEqual(list(index), [701])
+        self.assertEqual(index.get(701).description, u'Appropriations')
+        self.assertIs(index.get_by_sk(7001), index.get(701))
+        self.assertEqual([o.id for o in index.members(701)], [65321])
+        self.assertEqual(index.sizes(), {701: 1})
+
+        blob = json.loads(load_fixture('official'))
+        officials = blob['response']['results']['officials']
+        officials[2]['committees'] = officials[1]['committees']
+        officials[1]['committees'] = []
+        index.add(RootCiceroObject(blob))
+        self.assertEqual([o.id for o in index.members(701)], [65599])
+        self.assertEqual(index.committees_of(65321), [])
+        self.assertEqual([c.id for c in index.committees_of(65599)], [701])
+
+
+class CiceroLabelTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = RootCiceroObject(json.loads(load_fixture('official')))
+        self.officials = self.root.response.results.officials
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_mailing_address(self):
+        for official in self.officials:
+            for address in official.addresses:
+                for county in (False, True):
+                    expected = address.get_formatted_mailing_address(county)
+                    self.assertEqual(format_label(address, county), expected)
+                    self.assertEqual(format_label(dict(address.__dict__),
+                                                  county), expected)
+        self.assertEqual(format_label({'city': 'Harrisburg', 'state': 'PA'}),
+                         u'Harrisburg, PA ')
+
+    def test_write_labels(self):
+        path = os.path.join(self.directory, 'labels.txt')
+        self.assertEqual(write_labels(self.officials, path, buffer_size=2), 4)
+        with open(path) as f:
+            blocks = f.read().split('\n\n')
+        self.assertEqual(blocks[1], u"Michael O'Brien\n" +
+                         self.officials[1].addresses[0].get_formatted_mailing_address())
+
+        path = os.path.join(self.directory, 'labels.csv')
+        addresses = self.officials[1].addresses
+        self.assertEqual(write_labels(self.officials[1:2] + addresses, path,
+                                      county=True, output_format='csv'), 4)
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['official_id', 'name', 'label'])
+        self.assertEqual(rows[1][:2], ['65321', "Michael O'Brien"])
+        self.assertEqual(rows[3], ['', '', addresses[0].get_formatted_mailing_address(True)])
+
+
+class CiceroDistrictColumnsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = DistrictColumns()
+        cicero = OfflineCiceroConnection()
+        cicero.add_hook(self.columns)
+        cicero.get_nonlegislative_district(lat=40, lon=-75.1)
+        self.columns.add_district({'id': 1, 'district_type': 'CENSUS',
+                                   'subtype': 'TRACT', 'district_id': '1',
+                                   'label': 'Tract 1', 'state': 'PA',
+                                   'data': {'aland': 12.5, 'geoid': '42101000100',
+                                            'id': 7}})
+
+    def test_groups_and_schema(self):
+        self.assertEqual(self.columns.groups(),
+                         [('CENSUS', 'TRACT'), ('WATERSHED', 'HUC4'),
+                          ('WATERSHED', 'HUC6')])
+        self.assertEqual(len(self.columns), 4)
+        self.assertEqual(dict(self.columns.schema('CENSUS', 'TRACT')),
+                         {'id': 'int', 'district_id': 'str', 'label': 'str',
+                          'state': 'str', 'aland': 'float', 'awater': 'int',
+                          'geoid': 'str', 'pop': 'int', 'data.id': 'int'})
+
+    def test_columns(self):
+        column = self.columns.column
+        self.assertEqual(column('CENSUS', 'TRACT', 'aland'), [363815.0, 12.5])
+        self.assertEqual(column('CENSUS', 'TRACT', 'pop'), [2940, None])
+        self.assertEqual(column('CENSUS', 'TRACT', 'data.id'), [None, 7])
+        self.assertEqual(column('WATERSHED', 'HUC6', 'huc'), [u'020402'])
+
+        # a district already added is skipped
+        self.columns.add_district({'id': 1, 'district_type': 'CENSUS',
+                                   'subtype': 'TRACT', 'data': {}})
+        self.assertEqual(column('CENSUS', 'TRACT', 'id'), [712001, 1])
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_to_numpy(self):
+        arrays = self.columns.to_numpy('CENSUS', 'TRACT')
+        self.assertEqual(arrays['aland'].sum(), 363827.5)
+        self.assertEqual(arrays['pop'].sum(), 2940)
+        self.assertEqual(list(arrays['pop'].mask), [False, True])
+
+    def test_does_not_load_numpy(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        output = subprocess.check_output(
+            [sys.executable, '-c', "import sys, cicero.cicero_columnar\n"
+                                   "print('numpy' in sys.modules)"], cwd=root)
+        self.assertEqual(output.strip(), b'False')
+
+    def test_concurrent_adds(self):
+        columns = DistrictColumns()
+
+        def add(thread):
+            for i in range(3000):
+                data = {'geoid': '%d-%d' % (thread, i)}
+                if i % 2:
+                    data['pop'] = i  # a column new to some threads
+                columns.add_district({'id': thread * 10000 + i,
+                                      'district_type': 'CENSUS',
+                                      'subtype': 'TRACT', 'data': data})
+
+        threads = [threading.Thread(target=add, args=(t,)) for t in range(8)]
+        if hasattr(sys, 'setswitchinterval'):
+            # switch threads often, as a busy batch_request() would
+            self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+            sys.setswitchinterval(1e-6)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(columns), 24000)
+        ids = columns.column('CENSUS', 'TRACT', 'id')
+        geoids = columns.column('CENSUS', 'TRACT', 'geoid')
+        self.assertEqual(len(geoids), 24000)
+        self.assertEqual(['%d-%d' % divmod(i, 10000) for i in ids], geoids)
+
+
+class CiceroUsageHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'usage.json')
+        self.cicero = OfflineCiceroConnection()
+        self.now = cicero_usage._now
+
+    def tearDown(self):
+        cicero_usage._now = self.now
+        shutil.rmtree(self.directory)
+
+    def test_finished_months_cached(self):
+        history = UsageHistory(self.cicero, self.path)
+        months = history.get('2013-10', '2013-12')
+        self.assertEqual([(m.year, m.month, m.credits_used) for m in months],
+                         [(2013, 11, 150)])
+        self.assertIn('/2013-10/to/2013-12?', self.cicero.requested_urls[0])
+        history.get('2013-11')
+        self.assertEqual(history.requests, 1)
+
+        history = UsageHistory(self.cicero, self.path)
+        series = history.series('2013')
+        self.assertEqual(history.requests, 1)  # only 2013-01 to 2013-09
+        self.assertIn('/2013-01/to/2013-09?', self.cicero.requested_urls[1])
+        self.assertEqual(len(series.months), 12)
+        self.assertEqual(list(series.credits_used),
+                         [0] * 10 + [150, 0])
+        self.assertEqual(series.by_type['official'][10], 50)
+        self.assertEqual(series.by_type['legislative_district'][10], 100)
+
+    def test_current_month_fetched(self):
+        cicero_usage._now = lambda: time.mktime((2013, 11, 15, 12, 0, 0, 0, 0, 0))
+        history = UsageHistory(self.cicero)
+        self.assertEqual(len(history.get('2013-10', '2013')), 1)
+        self.assertEqual(len(history.get('2013-10', '2013')), 1)
+        self.assertEqual(history.requests, 2)
+        self.assertIn('/2013-10/to/2013-11?', self.cicero.requested_urls[0])
+        self.assertIn('/2013-11?', self.cicero.requested_urls[1])
+
+
+class CiceroRevalidationTests(unittest.TestCase):
+
+    def test_unchanged_body_not_parsed_again(self):
+        cicero = OfflineCiceroConnection()
+        cicero.revalidate = ResponseCache()
+        first = cicero.get_official(id=65321)
+        self.assertIs(cicero.get_official(id=65321), first)
+        self.assertIsNot(cicero.get_official(id=65599), first)
+
+        cicero.blob = load_fixture('official_geocoded')
+        changed = cicero.get_official(id=65321)
+        self.assertIsNot(changed, first)
+        self.assertIs(cicero.get_official(id=65321), changed)
+        self.assertEqual(len(cicero.requested_urls), 5)
+
+
+class CiceroNegativeCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        empty = {'response': {'errors': [], 'messages': [],
+                              'results': {'candidates': []}}}
+        self.cicero = OfflineCiceroConnection(blob=json.dumps(empty))
+        self.cicero.cache = ResponseCache()
+        self.cicero.negative_cache = ResponseCache(ttl=60)
+
+    def test_empty_results(self):
+        query = {'search_loc': 'Barcelona', 'type': 'NATIONAL_EXEC'}
+        first = self.cicero.get_legislative_district(**query)
+        self.assertIs(self.cicero.get_legislative_district(**query), first)
+        self.assertEqual(len(self.cicero.requested_urls), 1)
+        self.assertEqual(len(self.cicero.cache), 0)
+        self.assertEqual(len(self.cicero.negative_cache), 1)
+
+        self.cicero.blob = None
+        self.cicero.get_official(search_loc='340 N 12th St Philadelphia')
+        self.assertEqual(len(self.cicero.cache), 1)
+        self.assertEqual(len(self.cicero.negative_cache), 1)
+
+    def test_client_errors(self):
+        events = []
+        self.cicero.add_hook(events.append)
+        self.cicero.error = CiceroError({
+            'response': {'errors': ['Invalid query parameter: bogus']},
+            'status_code': 400})
+        for _ in range(2):
+            with self.assertRaises(CiceroError) as raised:
+                self.cicero.get_official(bogus=1)
+            self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(len(self.cicero.requested_urls), 1)
+        self.assertTrue(events[1].cache_hit)
+        self.assertEqual(events[1].error.error_list,
+                         ['Invalid query parameter: bogus'])
+
+        # an expired token isn't the query's fault
+        self.cicero.error = CiceroError({'response': {'errors': []},
+                                         'status_code': 401})
+        for _ in range(2):
+            self.assertRaises(CiceroError, self.cicero.get_official, id=1)
+        self.assertEqual(len(self.cicero.requested_urls), 3)
+
+
+class CiceroAdaptiveConcurrencyTests(unittest.TestCase):
+
+    def round(self, limiter, congested=False):
+        # as many requests as the limit allows, in flight together
+        tokens = [limiter.acquire() for _ in range(limiter.limit)]
+        for token in tokens:
+            limiter.release(token, congested)
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AIMDLimiter(initial=4, maximum=6)
+        self.round(limiter)
+        self.assertEqual(limiter.limit, 4)
+        self.round(limiter)
+        self.assertEqual(limiter.limit, 5)
+        for _ in range(20):
+            self.round(limiter)
+        self.assertEqual(limiter.limit, 6)
+
+        # a burst of failures in flight together is one cut
+        self.round(limiter, congested=True)
+        self.assertEqual(limiter.limit, 3)
+        limiter.release(limiter.acquire(), congested=True)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertTrue(limiter.error_rate > 0)
+
+    def test_no_increase_below_the_limit(self):
+        limiter = AIMDLimiter(initial=4)
+        for _ in range(100):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 4)
+
+        limiters = EndpointLimiters()
+        cicero = OfflineCiceroConnection()
+        cicero.batch_request(OFFICIAL_ENDPOINT, [{'last_name': 'Smith'}] * 500,
+                             max_workers=4, limiter=limiters)
+        self.assertEqual(limiters.limits(), {OFFICIAL_ENDPOINT: 4})
+
+    def test_batch_request(self):
+        cicero = _SlowConnection()
+        cicero.delays = [0.01] * 20  # so requests overlap
+        limiters = EndpointLimiters(initial=2, maximum=4)
+        metrics = MetricsRegistry()
+        metrics.track_concurrency(limiters)
+        cicero.add_hook(metrics)
+        queries = [{'search_loc': '%d Main St' % i} for i in range(20)]
+
+        cicero.batch_request(OFFICIAL_ENDPOINT, queries, limiter=limiters)
+        self.assertEqual(limiters.limits(), {OFFICIAL_ENDPOINT: 4})
+        self.assertEqual(
+            metrics.snapshot()['OFFICIAL_ENDPOINT']['concurrency_limit'], 4)
+        self.assertIn('cicero_concurrency_limit{endpoint="OFFICIAL_ENDPOINT"} 4',
+                      metrics.prometheus_text())
+
+        cicero.error = CiceroError({'response': {'errors': []},
+                                    'status_code': 503})
+        cicero.batch_request(OFFICIAL_ENDPOINT, queries, max_workers=1,
+                             limiter=limiters)
+        self.assertEqual(limiters.limits(), {OFFICIAL_ENDPOINT: 1})
+
+        # errors that aren't congestion leave the limit to grow
+        cicero.error = CiceroError({'response': {'errors': []},
+                                    'status_code': 400})
+        cicero.batch_request(OFFICIAL_ENDPOINT, queries, limiter=limiters)
+        self.assertTrue(limiters.limits()[OFFICIAL_ENDPOINT] > 1)
+
+
+class _SlowConnection(OfflineCiceroConnection):
+    # answers each request after the next of .delays seconds, or at once,
+    # failing with the next of .failures, if it isn't None
+
+    delays = ()
+    failures = ()
+
+    def _request_raw(self, request_url, validators=None):
+        delays, failures = list(self.delays), list(self.failures)
+        self.delays, self.failures = delays[1:], failures[1:]
+        try:
+            blob = OfflineCiceroConnection._request_raw(self, request_url,
+                                                        validators)
+        finally:
+            if delays:
+                time.sleep(delays[0])
+        if failures and failures[0] is not None:
+            raise failures[0]
+        return blob
+
+
+class _TaggingConnection(_SlowConnection):
+    # answers with a new ETag every request, recording the ETag each was
+    # sent with in .sent_tags
+
+    def _request_raw(self, request_url, validators=None):
+        tag = '"%d"' % len(self.requested_urls)
+        self.sent_tags.append((validators or {}).get('etag'))
+        blob = _SlowConnection._request_raw(self, request_url, validators)
+        validators['etag'] = tag
+        return blob
+
+
+class CiceroHedgingTests(unittest.TestCase):
+
+    def connection(self, **options):
+        cicero = _SlowConnection()
+        cicero.hedge = HedgePolicy(min_samples=3, **options)
+        self.events = []
+        self.metrics = MetricsRegistry()
+        cicero.add_hook(self.events.append)
+        cicero.add_hook(self.metrics)
+        for _ in range(3):
+            cicero.get_version()
+        return cicero
+
+    def test_slow_request_is_hedged(self):
+        cicero = self.connection(budget=1.0)
+        self.assertTrue(cicero.hedge.delay(VERSION_ENDPOINT) < 0.5)
+
+        cicero.delays = [2.0]
+        start = time.time()
+        root = cicero.get_version()
+        self.assertTrue(time.time() - start < 2.0)
+        self.assertEqual(root.response.results.version,
+                         self.events[0].result.response.results.version)
+        self.assertEqual(len(cicero.requested_urls), 5)
+        self.assertTrue(self.events[-1].hedged)
+        self.assertTrue(self.events[-1].hedge_won)
+        self.assertFalse(self.events[0].hedged)
+        self.assertEqual((cicero.hedge.hedges, cicero.hedge.hedge_wins), (1, 1))
+
+        version = self.metrics.snapshot()['VERSION_ENDPOINT']
+        self.assertEqual((version['hedges'], version['hedge_wins']), (1, 1))
+        self.assertIn('cicero_hedges_total{endpoint="VERSION_ENDPOINT"} 1',
+                      self.metrics.prometheus_text())
+
+    def test_budget(self):
+        cicero = self.connection(budget=0)
+        cicero.delays = [0.2]
+        cicero.get_version()
+        self.assertEqual(len(cicero.requested_urls), 4)
+        self.assertFalse(self.events[-1].hedged)
+        self.assertEqual(cicero.hedge.hedges, 0)
+
+    def test_endpoints(self):
+        self.assertNotIn(OFFICIAL_ENDPOINT, FREE_ENDPOINTS)
+        cicero = self.connection(budget=1.0)
+        for _ in range(3):
+            cicero.get_official(search_loc='Philadelphia')
+        cicero.delays = [0.2]
+        cicero.get_official(search_loc='Philadelphia')
+        self.assertEqual(len(cicero.requested_urls), 7)
+        self.assertEqual(cicero.hedge.requests, 3)
+
+        cicero = self.connection(budget=1.0,
+                                 endpoints=FREE_ENDPOINTS + (OFFICIAL_ENDPOINT,))
+        for _ in range(3):
+            cicero.get_official(search_loc='Philadelphia')
+        cicero.delays = [2.0]
+        cicero.get_official(search_loc='Philadelphia')
+        self.assertEqual(len(cicero.requested_urls), 8)
+        self.assertTrue(self.events[-1].hedge_won)
+
+    def test_attempts_keep_their_own_validators(self):
+        cicero = _TaggingConnection()
+        cicero.sent_tags = []
+        cicero.revalidate = ResponseCache()
+        cicero.hedge = HedgePolicy(min_samples=3, budget=1.0)
+        for _ in range(3):
+            cicero.get_version()
+        cicero.delays = [0.3]
+        cicero.get_version()  # sends "3", slowly, then "4", which wins
+        time.sleep(0.5)  # for the slow attempt to finish too
+        cicero.get_version()
+        self.assertEqual(cicero.sent_tags[:5], [None, '"0"', '"1"', '"2"', '"2"'])
+        # the winner's ETag, even if the last request was hedged too
+        self.assertEqual(set(cicero.sent_tags[5:]), set(['"4"']))
+
+    def test_failed_attempt(self):
+        error = CiceroError({'response': {'errors': ['slow']},
+                             'status_code': 500})
+        cicero = self.connection(budget=1.0)
+        cicero.delays = [0.2]
+        cicero.failures = [error]
+        self.assertTrue(isinstance(cicero.get_version(), RootCiceroObject))
+        self.assertTrue(self.events[-1].hedge_won)
+
+        cicero.delays = [0.2]
+        cicero.failures = [error, error]
+        self.assertRaises(CiceroError, cicero.get_version)
+        self.assertTrue(self.events[-1].hedged)
+        self.assertFalse(self.events[-1].hedge_won)
+
+
 def main():
     unittest.main()
 
@@ -1,3 +1,4 @@
+from __future__ import print_function
 from cicero import *
 
 USERNAME = "example" #put your cicero API username here
@@ -17,7 +18,7 @@ philly_officials = cicero.get_official(search_loc="340 N 12th St, Philadelphia,
 
 #Access official info using dot notation
 
-print philly_officials.response.results.candidates[0].officials[0].last_name
+print(philly_officials.response.results.candidates[0].officials[0].last_name)
 #will print the last name of the first official (officials are returned
 #by Cicero in alphabetical order by last_name) for Philadelphia, currently
 #"Biden" for US Vice President Joe Biden.
@@ -28,13 +29,13 @@ print philly_officials.response.results.candidates[0].officials[0].last_name
 
 #For example (enclosed in parentheses for newlines/readability),
 
-print (CiceroRestConnection(USERNAME, PASSWORD)
+print(CiceroRestConnection(USERNAME, PASSWORD)
         .get_official(search_loc="340 N 12th St, Philadelphia, PA USA",
                       district_type="STATE_LOWER")
         .response
         .results
         .candidates[0]
         .officials[0]
-        .last_name )
+        .last_name)
 
 #should print "O'Brien", the last name of Azavea's current PA state representative.
@@ -8,17 +8,23 @@ setup(
     maintainer='Andrew Thompson',
     maintainer_email='athompson@azavea.com',
     packages=find_packages(),
+    package_data={'cicero.test': ['fixtures/*.json']},
     url=['http://github.com/azavea/python-cicero'],
     license='LICENSE.txt',
     description='Python wrapper for Azavea\'s Cicero API',
     long_description=open('README.rst').read(),
     install_requires=[],
-    extras_require = { 'docs': ["pycco"],},
+    extras_require = { 'docs': ["pycco"], 'parquet': ["pyarrow"],},
     test_suite = "cicero.test.tests",
+    entry_points={
+        'console_scripts': ['cicero-batch = cicero.cicero_cli:main'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'License :: OSI Approved :: Apache Software License',
         'Topic :: Scientific/Engineering :: GIS',
-        'Programming Language :: Python :: 2.7'
+        'Programming Language :: Python :: 2',
+        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
     ],
 )